@@ -0,0 +1,215 @@
+"""
+alignment.py
+────────────
+Maps pipeline predictions (character spans) back onto the whitespace tokens of
+a DNRTI sentence.
+
+The sentence fed to the pipeline is always " ".join(tokens), so token spans are
+derived once from cumulative offsets. Each prediction then finds the tokens it
+overlaps with two binary searches instead of scanning every token, which keeps
+alignment O((P + T) log T) per sentence instead of O(P × T).
+
+align_raw / align_bio produce exactly the labels of the original
+align_predictions_raw (analyze_labels.py) and align_predictions (comparison
+notebooks). align_raw_batch is a vectorised NumPy variant of align_raw for many
+sentences at once.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from itertools import accumulate
+from typing import Any
+
+import numpy as np
+
+
+# ── Token offsets ──────────────────────────────────────────────────────────────
+
+def token_offsets(tokens: list[str]) -> tuple[list[int], list[int]]:
+    """
+    Return (starts, ends) character offsets of *tokens* within " ".join(tokens).
+    """
+    if not tokens:
+        return [], []
+    ends = list(accumulate(len(t) + 1 for t in tokens))
+    starts = [0] + ends[:-1]
+    return starts, [e - 1 for e in ends]
+
+
+def overlapping_tokens(
+    starts: list[int],
+    ends: list[int],
+    p_start: int,
+    p_end: int,
+) -> range:
+    """
+    Indices of the tokens whose span overlaps [p_start, p_end).
+
+    Equivalent to testing max(t_start, p_start) < min(t_end, p_end) for every
+    token, given that token spans are sorted and non-overlapping.
+    """
+    if p_end <= p_start:
+        return range(0)
+    lo = bisect_right(ends, p_start)
+    hi = bisect_left(starts, p_end)
+    return range(lo, max(lo, hi))
+
+
+def _overlaps(starts: list[int], ends: list[int], p_start: int, p_end: int):
+    # Zero-length tokens never overlap anything in the reference implementation.
+    for idx in overlapping_tokens(starts, ends, p_start, p_end):
+        if starts[idx] < ends[idx]:
+            yield idx
+
+
+# ── Per-sentence alignment ─────────────────────────────────────────────────────
+
+def align_raw(
+    predictions: list[dict[str, Any]],
+    tokens: list[str],
+    offsets: tuple[list[int], list[int]] | None = None,
+) -> list[str]:
+    """
+    Align pipeline predictions to *tokens*, returning the raw entity_group per
+    token ('O' where nothing overlaps). Later predictions win on conflicts.
+
+    *offsets* may be passed in when the caller already has token_offsets(tokens).
+    """
+    starts, ends = offsets or token_offsets(tokens)
+    aligned_labels = ['O'] * len(tokens)
+    for pred in predictions:
+        for idx in _overlaps(starts, ends, pred['start'], pred['end']):
+            aligned_labels[idx] = pred['entity_group']
+    return aligned_labels
+
+
+def align_bio(
+    predictions: list[dict[str, Any]],
+    tokens: list[str],
+    label_map: dict[str, Any],
+    ground_truth: list[str] | None = None,
+    offsets: tuple[list[int], list[int]] | None = None,
+) -> list[str]:
+    """
+    Align pipeline predictions to *tokens* as BIO tags, mapping each model label
+    through *label_map* (model label → DNRTI label or list of labels).
+
+    When a model label maps to several DNRTI labels and *ground_truth* is given,
+    the mapped label that occurs most often in the ground truth under the
+    prediction span is chosen.
+    """
+    starts, ends = offsets or token_offsets(tokens)
+    aligned_labels = ['O'] * len(tokens)
+
+    for pred in predictions:
+        p_start = pred['start']
+        p_end = pred['end']
+
+        mapped_labels = label_map.get(pred['entity_group'], [pred['entity_group']])
+        if isinstance(mapped_labels, str):
+            mapped_labels = [mapped_labels]
+        if not mapped_labels:
+            continue
+
+        span = list(_overlaps(starts, ends, p_start, p_end))
+
+        chosen_label = mapped_labels[0]
+        if ground_truth:
+            overlap_gt_types = [
+                ground_truth[idx][2:]
+                for idx in span
+                if idx < len(ground_truth)
+                and ground_truth[idx] != 'O'
+                and ground_truth[idx][2:] in mapped_labels
+            ]
+            if overlap_gt_types:
+                chosen_label = Counter(overlap_gt_types).most_common(1)[0][0]
+
+        for idx in span:
+            prefix = "B-"
+            if idx > 0 and aligned_labels[idx - 1] != 'O':
+                if aligned_labels[idx - 1].endswith(chosen_label):
+                    prefix = "I-"
+            # Force B- at the very start of the prediction span
+            if starts[idx] <= p_start:
+                prefix = "B-"
+            aligned_labels[idx] = f"{prefix}{chosen_label}"
+
+    return aligned_labels
+
+
+# ── Batched alignment ──────────────────────────────────────────────────────────
+
+def align_raw_batch(
+    batch_predictions: list[list[dict[str, Any]]],
+    batch_tokens: list[list[str]],
+) -> list[list[str]]:
+    """
+    Vectorised align_raw over many sentences.
+
+    All sentences are laid out on one global character axis, predictions are
+    clipped to their own sentence, and every (prediction, token) overlap is
+    resolved with np.searchsorted. Results are identical to calling align_raw
+    per sentence.
+    """
+    if not batch_tokens:
+        return []
+
+    tok_lens = np.fromiter(
+        (len(t) for tokens in batch_tokens for t in tokens), dtype=np.int64
+    )
+    sent_sizes = np.array([len(tokens) for tokens in batch_tokens], dtype=np.int64)
+    sent_ids = np.repeat(np.arange(len(batch_tokens)), sent_sizes)
+
+    # Lay all sentences out on one character axis, each followed by a separator,
+    # so that token spans of neighbouring sentences never touch.
+    sent_span = np.bincount(
+        sent_ids, weights=tok_lens + 1, minlength=len(batch_tokens)
+    ).astype(np.int64)
+    sent_base = np.cumsum(sent_span) - sent_span
+    sent_chars = np.maximum(sent_span - 1, 0)
+
+    tok_starts = np.cumsum(tok_lens + 1) - tok_lens - 1
+    tok_ends = tok_starts + tok_lens
+
+    vocab: dict[str, int] = {'O': 0}
+    p_sent, p_start, p_end, p_label = [], [], [], []
+    for sent_idx, preds in enumerate(batch_predictions):
+        for pred in preds:
+            p_sent.append(sent_idx)
+            p_start.append(pred['start'])
+            p_end.append(pred['end'])
+            p_label.append(vocab.setdefault(pred['entity_group'], len(vocab)))
+
+    label_ids = np.zeros(len(tok_lens), dtype=np.int64)
+    if p_sent:
+        p_sent_arr = np.array(p_sent, dtype=np.int64)
+        limit = sent_chars[p_sent_arr]
+        base = sent_base[p_sent_arr]
+        lo_char = np.clip(np.array(p_start, dtype=np.int64), 0, limit) + base
+        hi_char = np.clip(np.array(p_end, dtype=np.int64), 0, limit) + base
+
+        lo = np.searchsorted(tok_ends, lo_char, side="right")
+        hi = np.searchsorted(tok_starts, hi_char, side="left")
+        counts = np.where(hi_char > lo_char, np.maximum(hi - lo, 0), 0)
+
+        if counts.any():
+            pred_idx = np.repeat(np.arange(len(counts)), counts)
+            group_start = np.cumsum(counts) - counts
+            tok_idx = np.repeat(lo, counts) + np.arange(counts.sum()) - np.repeat(group_start, counts)
+
+            keep = tok_lens[tok_idx] > 0
+            tok_idx, pred_idx = tok_idx[keep], pred_idx[keep]
+
+            # Later predictions win: keep the last write for every token.
+            rev_tok = tok_idx[::-1]
+            uniq, first_rev = np.unique(rev_tok, return_index=True)
+            winners = pred_idx[::-1][first_rev]
+            label_ids[uniq] = np.array(p_label, dtype=np.int64)[winners]
+
+    id2label = np.array(list(vocab), dtype=object)
+    labels = id2label[label_ids]
+    bounds = np.cumsum(sent_sizes)[:-1]
+    return [chunk.tolist() for chunk in np.split(labels, bounds)]
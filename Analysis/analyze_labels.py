@@ -1,13 +1,18 @@
+import argparse
 import os
 import json
-import pandas as pd
+import time
 import seaborn as sns
 import matplotlib.pyplot as plt
-from collections import defaultdict, Counter
 from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
 import torch
+from torch.utils.data import Dataset
 from tqdm import tqdm
 
+from alignment import align_raw
+from confusion import ConfusionCounts
+from dnrti import load_dnrti_file
+
 # Set device
 if torch.cuda.is_available():
     device = 0
@@ -17,58 +22,64 @@ else:
     device = -1
 print(f"Using device: {device}")
 
-def load_dnrti_file(file_path):
-    data = []
-    if not os.path.exists(file_path):
-        print(f"Warning: {file_path} not found.")
-        return data
-        
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-        tokens = []
-        labels = []
-        for line in f:
-            line = line.strip()
-            if not line:
-                if tokens:
-                    data.append({'tokens': tokens, 'labels': labels})
-                    tokens = []
-                    labels = []
-            else:
-                parts = line.split()
-                if len(parts) >= 2:
-                    tokens.append(parts[0])
-                    labels.append(parts[-1])
-        if tokens:
-             data.append({'tokens': tokens, 'labels': labels})
-    return data
-
-def align_predictions_raw(predictions, token_list):
+# Sentences per forward pass in run_analysis
+BATCH_SIZE = 32
+
+class SentenceDataset(Dataset):
     """
-    Aligns pipeline predictions to original tokens, returning RAW labels.
+    Serves sentences to the pipeline in a fixed order so that it can batch them.
     """
-    aligned_labels = ['O'] * len(token_list)
-    
-    # Create character spans for tokens
-    token_spans = []
-    current_char = 0
-    for token in token_list:
-        start = current_char
-        end = start + len(token)
-        token_spans.append((start, end))
-        current_char = end + 1 # +1 for space
-        
-    for pred in predictions:
-        p_start = pred['start']
-        p_end = pred['end']
-        entity_group = pred['entity_group']
-        
-        for idx, (t_start, t_end) in enumerate(token_spans):
-            if max(t_start, p_start) < min(t_end, p_end):
-                aligned_labels[idx] = entity_group
-                
-    return aligned_labels
+    def __init__(self, sentences):
+        self.sentences = sentences
+
+    def __len__(self):
+        return len(self.sentences)
+
+    def __getitem__(self, idx):
+        return self.sentences[idx]
+
+def predict_batched(nlp, sentences, batch_size=BATCH_SIZE, lengths=None):
+    """
+    Runs the pipeline over all sentences in length-sorted batches and yields
+    (sentence index, predictions) pairs as soon as each sentence is done.
 
-def run_analysis(model_path, model_name, train_data, sample_size=2000):
+    Sorting by token length keeps sentences of similar size in the same batch,
+    so little compute is spent on padding. Callers that need the original
+    order can place each result by its index. Pass *lengths* when token counts
+    are already known (e.g. from the DNRTI tokenizer cache).
+    """
+    if lengths is None:
+        lengths = [len(ids) for ids in nlp.tokenizer(sentences, add_special_tokens=False)["input_ids"]]
+    order = sorted(range(len(sentences)), key=lambda i: lengths[i])
+    dataset = SentenceDataset([sentences[i] for i in order])
+
+    done = 0
+    try:
+        for preds in tqdm(nlp(dataset, batch_size=batch_size), total=len(dataset)):
+            yield order[done], preds
+            done += 1
+    except Exception as e:
+        print(f"Batched inference failed after {done} sentences ({e}), falling back to one sentence at a time.")
+        for i in tqdm(order[done:]):
+            try:
+                yield i, nlp(sentences[i])
+            except Exception as e:
+                print(f"Error processing sentence {i}: {e}")
+
+def save_heatmap(counts, model_name, output_file):
+    """
+    Plots the entity part of the confusion counts (everything but O/O).
+    """
+    matrix = counts.entity_matrix()
+    plt.figure(figsize=(14, 10))
+    sns.heatmap(matrix, annot=True, fmt="d", cmap="YlGnBu")
+    plt.title(f"Correlation Heatmap: {model_name} Predicted vs DNRTI True Labels (Sample of {counts.sentences} sentences)")
+    plt.xlabel("DNRTI Label (Ground Truth)")
+    plt.ylabel(f"{model_name} Label (Predicted)")
+    plt.savefig(output_file, bbox_inches='tight')
+    plt.close()
+
+def run_analysis(model_path, model_name, train_data, sample_size=2000, batch_size=BATCH_SIZE):
     print(f"\n--- Analyzing {model_name} ---")
     print(f"Loading {model_name} from {model_path}...")
     
@@ -78,41 +89,49 @@ def run_analysis(model_path, model_name, train_data, sample_size=2000):
     # It ensures subwords are correctly merged into the parent token label.
     nlp = pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="first", device=device)
 
-    correlations = []
-    print(f"Processing {sample_size} sentences...")
+    sentences = [" ".join(train_data[i]['tokens']) for i in range(sample_size)]
+    lengths = None
+    if hasattr(train_data, "encode") and tokenizer.is_fast:
+        # Token counts come from the per-tokenizer cache instead of re-tokenising.
+        lengths = train_data.encode(tokenizer).lengths[:sample_size]
+    print(f"Processing {sample_size} sentences (batch size {batch_size})...")
 
-    for i in tqdm(range(sample_size)):
+    # Pairs are counted as predictions stream in, so memory does not grow with sample_size.
+    counts = ConfusionCounts()
+    start_time = time.perf_counter()
+    for i, preds in predict_batched(nlp, sentences, batch_size, lengths):
         tokens = train_data[i]['tokens']
         true_labels = train_data[i]['labels']
         
         # Strip B-/I- prefixes from true labels
         true_labels_raw = [l[2:] if l != 'O' else 'O' for l in true_labels]
         
-        # Run prediction
-        sentence = " ".join(tokens)
-        try:
-            preds = nlp(sentence)
-        except Exception as e:
-            print(f"Error processing sentence {i}: {e}")
-            continue
-        
         # Align
-        pred_labels_raw = align_predictions_raw(preds, tokens)
+        pred_labels_raw = align_raw(preds, tokens)
         
-        # Record pairs
-        for p, t in zip(pred_labels_raw, true_labels_raw):
-            correlations.append({'Predicted': p, 'True': t})
-
-    df_corr = pd.DataFrame(correlations)
+        counts.update(pred_labels_raw, true_labels_raw)
+    duration = time.perf_counter() - start_time
+    print(
+        f"{model_name} throughput: {counts.sentences / duration:.1f} sentences/s, "
+        f"{counts.total / duration:.0f} words/s ({duration:.1f}s total)"
+    )
     
     # Save results
-    output_file = f"label_correlation_{model_name.lower()}.csv"
-    df_corr.to_csv(output_file, index=False)
-    print(f"Saved correlations to {output_file}")
+    output_file = f"label_correlation_{model_name.lower()}.npz"
+    counts.save(output_file)
+    print(f"Saved correlation counts ({counts.total} token pairs) to {output_file}")
+
+    heatmap_file = os.path.join("Images", f"heatmap_{model_name.lower()}.png")
+    save_heatmap(counts, model_name, heatmap_file)
+    print(f"Saved heatmap to {heatmap_file}")
     
-    return df_corr
+    return counts
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Correlate model labels with DNRTI labels.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Sentences per forward pass")
+    args = parser.parse_args()
+
     train_data = load_dnrti_file("../DNRTI/train.txt")
     print(f"Loaded {len(train_data)} sentences from ../DNRTI/train.txt")
     
@@ -125,6 +144,6 @@ if __name__ == "__main__":
     ]
     
     for m in models:
-        run_analysis(m["path"], m["name"], train_data, sample_size)
+        run_analysis(m["path"], m["name"], train_data, sample_size, args.batch_size)
     
     print("\nAll analyses complete.")
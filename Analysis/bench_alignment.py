@@ -0,0 +1,133 @@
+"""
+Benchmarks the interval-based alignment in alignment.py against the original
+quadratic token scan, and checks that both produce identical labels.
+
+Run from the Analysis folder:
+    python bench_alignment.py --tokens 50 500 2000
+"""
+
+import argparse
+import random
+import string
+import time
+from collections import Counter
+
+from alignment import align_bio, align_raw, align_raw_batch
+
+LABEL_MAP = {"APT": ["HackOrg"], "MAL": ["Tool"], "TOOL": ["Tool"], "IDTY": ["Idus", "Org"], "IP": []}
+GROUPS = list(LABEL_MAP) + ["LOC"]
+DNRTI_TYPES = ["HackOrg", "Tool", "Idus", "Org", "Area"]
+
+
+# ── Reference (quadratic) implementations, as previously copied in the notebooks ──
+
+def _spans(token_list):
+    token_spans = []
+    current_char = 0
+    for token in token_list:
+        start = current_char
+        end = start + len(token)
+        token_spans.append((start, end))
+        current_char = end + 1
+    return token_spans
+
+def reference_align_raw(predictions, token_list):
+    aligned_labels = ['O'] * len(token_list)
+    token_spans = _spans(token_list)
+    for pred in predictions:
+        for idx, (t_start, t_end) in enumerate(token_spans):
+            if max(t_start, pred['start']) < min(t_end, pred['end']):
+                aligned_labels[idx] = pred['entity_group']
+    return aligned_labels
+
+def reference_align_bio(predictions, token_list, label_map, ground_truth=None):
+    aligned_labels = ['O'] * len(token_list)
+    token_spans = _spans(token_list)
+    for pred in predictions:
+        p_start, p_end = pred['start'], pred['end']
+        mapped_labels = label_map.get(pred['entity_group'], [pred['entity_group']])
+        if isinstance(mapped_labels, str):
+            mapped_labels = [mapped_labels]
+        if not mapped_labels:
+            continue
+        chosen_label = mapped_labels[0]
+        if ground_truth:
+            overlap_gt_types = []
+            for idx, (t_start, t_end) in enumerate(token_spans):
+                if max(t_start, p_start) < min(t_end, p_end):
+                    if idx < len(ground_truth) and ground_truth[idx] != 'O':
+                        gt_type = ground_truth[idx][2:]
+                        if gt_type in mapped_labels:
+                            overlap_gt_types.append(gt_type)
+            if overlap_gt_types:
+                chosen_label = Counter(overlap_gt_types).most_common(1)[0][0]
+        for idx, (t_start, t_end) in enumerate(token_spans):
+            if max(t_start, p_start) < min(t_end, p_end):
+                prefix = "B-"
+                if idx > 0 and aligned_labels[idx-1] != 'O':
+                    if aligned_labels[idx-1].endswith(chosen_label):
+                        prefix = "I-"
+                if t_start <= p_start:
+                    prefix = "B-"
+                aligned_labels[idx] = f"{prefix}{chosen_label}"
+    return aligned_labels
+
+
+# ── Synthetic documents ────────────────────────────────────────────────────────
+
+def make_document(rng, n_tokens, entity_rate=0.15):
+    tokens = ["".join(rng.choices(string.ascii_letters, k=rng.randint(1, 10))) for _ in range(n_tokens)]
+    labels = [rng.choice(["O", "B-" + rng.choice(DNRTI_TYPES)]) for _ in range(n_tokens)]
+    spans = _spans(tokens)
+    preds = []
+    for idx in range(n_tokens):
+        if rng.random() < entity_rate:
+            width = rng.randint(1, 3)
+            last = min(idx + width, n_tokens) - 1
+            # Jitter the boundaries to exercise partial overlaps.
+            start = spans[idx][0] + rng.randint(-1, 1)
+            end = spans[last][1] + rng.randint(-1, 1)
+            preds.append({'entity_group': rng.choice(GROUPS), 'start': start, 'end': end})
+    return tokens, labels, preds
+
+
+def _time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tokens", type=int, nargs="+", default=[50, 500, 2000])
+    parser.add_argument("--docs", type=int, default=10, help="Documents per size")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'tokens':>8} | {'quadratic':>10} | {'bisect':>10} | {'numpy batch':>11} | {'speed-up':>8}")
+    print("-" * 62)
+    for n_tokens in args.tokens:
+        docs = [make_document(rng, n_tokens) for _ in range(args.docs)]
+        all_tokens = [d[0] for d in docs]
+        all_preds = [d[2] for d in docs]
+
+        for tokens, labels, preds in docs:
+            assert align_raw(preds, tokens) == reference_align_raw(preds, tokens)
+            assert align_bio(preds, tokens, LABEL_MAP, labels) == reference_align_bio(preds, tokens, LABEL_MAP, labels)
+        assert align_raw_batch(all_preds, all_tokens) == [reference_align_raw(p, t) for p, t in zip(all_preds, all_tokens)]
+
+        t_ref = _time(lambda: [reference_align_raw(p, t) for p, t in zip(all_preds, all_tokens)], args.repeat)
+        t_new = _time(lambda: [align_raw(p, t) for p, t in zip(all_preds, all_tokens)], args.repeat)
+        t_vec = _time(lambda: align_raw_batch(all_preds, all_tokens), args.repeat)
+        print(f"{n_tokens:>8} | {t_ref:>9.4f}s | {t_new:>9.4f}s | {t_vec:>10.4f}s | {t_ref / t_new:>7.1f}x")
+
+    print("\nAll outputs identical to the reference implementation.")
+
+
+if __name__ == "__main__":
+    main()
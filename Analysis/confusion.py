@@ -0,0 +1,100 @@
+"""
+confusion.py
+────────────
+Constant-memory (Predicted, True) label counting for the label-correlation
+analysis.
+
+Instead of recording one row per token and cross-tabulating afterwards, counts
+are accumulated directly into an integer matrix indexed by label id. The matrix
+only grows with the label vocabulary, never with the number of sentences, and
+is persisted as a small NPZ file holding the counts plus both label lists.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+
+class ConfusionCounts:
+    """Sparse-vocabulary confusion matrix: rows are predicted, columns true labels."""
+
+    def __init__(self) -> None:
+        self.pred_labels: list[str] = []
+        self.true_labels: list[str] = []
+        self._pred_ids: dict[str, int] = {}
+        self._true_ids: dict[str, int] = {}
+        self.counts = np.zeros((0, 0), dtype=np.int64)
+        self.sentences = 0
+
+    # ── Accumulation ──────────────────────────────────────────────────────────
+
+    def _ids(self, labels: list[str], vocab: dict[str, int], names: list[str]) -> np.ndarray:
+        ids = np.empty(len(labels), dtype=np.int64)
+        for i, label in enumerate(labels):
+            idx = vocab.get(label)
+            if idx is None:
+                idx = vocab[label] = len(names)
+                names.append(label)
+            ids[i] = idx
+        return ids
+
+    def update(self, predicted: list[str], true: list[str]) -> None:
+        """Count every (predicted[i], true[i]) pair of one sentence."""
+        n = min(len(predicted), len(true))
+        p_ids = self._ids(predicted[:n], self._pred_ids, self.pred_labels)
+        t_ids = self._ids(true[:n], self._true_ids, self.true_labels)
+
+        rows, cols = self.counts.shape
+        if len(self.pred_labels) > rows or len(self.true_labels) > cols:
+            self.counts = np.pad(
+                self.counts,
+                ((0, len(self.pred_labels) - rows), (0, len(self.true_labels) - cols)),
+            )
+        np.add.at(self.counts, (p_ids, t_ids), 1)
+        self.sentences += 1
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    # ── Views ─────────────────────────────────────────────────────────────────
+
+    def to_frame(self) -> pd.DataFrame:
+        """Counts as a DataFrame (index: Predicted, columns: True), labels sorted."""
+        df = pd.DataFrame(self.counts, index=self.pred_labels, columns=self.true_labels)
+        df.index.name, df.columns.name = "Predicted", "True"
+        return df.sort_index().sort_index(axis=1)
+
+    def entity_matrix(self) -> pd.DataFrame:
+        """
+        Same table as pd.crosstab over all pairs where either side is not 'O':
+        the (O, O) cell is dropped along with any row or column left empty.
+        """
+        df = self.to_frame()
+        if "O" in df.index and "O" in df.columns:
+            df.loc["O", "O"] = 0
+        return df.loc[df.sum(axis=1) > 0, df.sum(axis=0) > 0]
+
+    # ── Persistence ───────────────────────────────────────────────────────────
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(
+            path,
+            counts=self.counts,
+            pred_labels=np.array(self.pred_labels, dtype=str),
+            true_labels=np.array(self.true_labels, dtype=str),
+            sentences=self.sentences,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> ConfusionCounts:
+        with np.load(path) as data:
+            obj = cls()
+            obj.pred_labels = data["pred_labels"].tolist()
+            obj.true_labels = data["true_labels"].tolist()
+            obj.counts = data["counts"].astype(np.int64)
+            obj.sentences = int(data["sentences"])
+        obj._pred_ids = {label: i for i, label in enumerate(obj.pred_labels)}
+        obj._true_ids = {label: i for i, label in enumerate(obj.true_labels)}
+        return obj
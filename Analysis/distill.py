@@ -0,0 +1,273 @@
+"""
+distill.py
+──────────
+Distils NER/SecureBert-NER into a smaller student model for faster serving.
+
+The student copies the teacher's tokenizer and id2label, has fewer layers
+and/or a smaller hidden size, and is trained on the teacher's softened
+token-level predictions over unlabelled report text — no annotations needed.
+When the hidden size is unchanged, the student starts from the teacher's
+embeddings and an evenly spaced subset of its layers.
+
+After training, the student and teacher are compared on held-out text
+(entity-level agreement and per-chunk latency). The result is saved to a
+directory that SecureBertNERProvider loads as-is: set NER_MODEL_PATH to it.
+
+Run from the Analysis folder:
+    python distill.py reports/ --out ../NER/SecureBert-NER-fast --layers 6
+    python distill.py reports/ --out /tmp/tiny --layers 2 --hidden 128 --max-steps 20   # smoke test
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import glob
+import json
+import os
+import random
+import time
+from typing import Any
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from transformers import (
+    AutoModelForTokenClassification,
+    AutoTokenizer,
+    get_linear_schedule_with_warmup,
+    pipeline,
+)
+
+TEACHER_PATH = "../NER/SecureBert-NER"
+OUTPUT_PATH = "../NER/SecureBert-NER-fast"
+
+
+# ── Data ───────────────────────────────────────────────────────────────────────
+
+def load_corpus(path: str) -> list[str]:
+    """Every .txt report under *path* (or the single file *path*)."""
+    files = [path] if os.path.isfile(path) else sorted(glob.glob(os.path.join(path, "**", "*.txt"), recursive=True))
+    texts = []
+    for file in files:
+        with open(file, encoding="utf-8", errors="replace") as f:
+            text = f.read().strip()
+        if text:
+            texts.append(text)
+    return texts
+
+
+def encode_windows(tokenizer: Any, texts: list[str], max_length: int, stride: int) -> list[dict[str, torch.Tensor]]:
+    """Cut every text into overlapping model windows of at most *max_length* tokens."""
+    enc = tokenizer(
+        texts,
+        truncation=True,
+        max_length=max_length,
+        stride=stride,
+        return_overflowing_tokens=True,
+    )
+    return [
+        {"input_ids": torch.tensor(ids), "attention_mask": torch.tensor(mask)}
+        for ids, mask in zip(enc["input_ids"], enc["attention_mask"])
+    ]
+
+
+def _collate(batch: list[dict[str, torch.Tensor]], pad_id: int) -> dict[str, torch.Tensor]:
+    width = max(len(b["input_ids"]) for b in batch)
+    input_ids = torch.full((len(batch), width), pad_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(batch), width), dtype=torch.long)
+    for i, b in enumerate(batch):
+        n = len(b["input_ids"])
+        input_ids[i, :n] = b["input_ids"]
+        attention_mask[i, :n] = b["attention_mask"]
+    return {"input_ids": input_ids, "attention_mask": attention_mask}
+
+
+# ── Student ────────────────────────────────────────────────────────────────────
+
+def build_student(teacher: Any, layers: int, hidden: int | None) -> Any:
+    """
+    Student with *layers* encoder layers and *hidden* size (default: the
+    teacher's). Same vocabulary and id2label/label2id as the teacher.
+    """
+    config = copy.deepcopy(teacher.config)
+    config.num_hidden_layers = layers
+    same_width = hidden is None or hidden == teacher.config.hidden_size
+    if not same_width:
+        config.hidden_size = hidden
+        config.num_attention_heads = max(1, hidden // 64)
+        config.intermediate_size = hidden * 4
+    student = AutoModelForTokenClassification.from_config(config)
+
+    if same_width:
+        # DistilBERT-style init: embeddings, evenly spaced layers and the head.
+        t_base = getattr(teacher, teacher.base_model_prefix)
+        s_base = getattr(student, student.base_model_prefix)
+        s_base.embeddings.load_state_dict(t_base.embeddings.state_dict())
+        picks = np.linspace(0, teacher.config.num_hidden_layers - 1, layers).round().astype(int)
+        for s_layer, t_idx in zip(s_base.encoder.layer, picks):
+            s_layer.load_state_dict(t_base.encoder.layer[int(t_idx)].state_dict())
+        student.classifier.load_state_dict(teacher.classifier.state_dict())
+    return student
+
+
+# ── Training ───────────────────────────────────────────────────────────────────
+
+def distill(
+    teacher: Any,
+    student: Any,
+    windows: list[dict[str, torch.Tensor]],
+    pad_id: int,
+    epochs: int = 3,
+    batch_size: int = 8,
+    lr: float = 1e-4,
+    temperature: float = 2.0,
+    alpha: float = 0.5,
+    max_steps: int | None = None,
+    device: str = "cpu",
+) -> None:
+    """
+    Train *student* to match *teacher*: loss = α·T²·KL(soft teacher ‖ soft
+    student) + (1-α)·CE(student, teacher argmax), over non-padding tokens.
+    """
+    teacher.to(device).eval()
+    student.to(device).train()
+    steps_per_epoch = (len(windows) + batch_size - 1) // batch_size
+    total_steps = min(max_steps or epochs * steps_per_epoch, epochs * steps_per_epoch)
+    optimizer = torch.optim.AdamW(student.parameters(), lr=lr)
+    scheduler = get_linear_schedule_with_warmup(optimizer, int(0.1 * total_steps), total_steps)
+
+    step = 0
+    rng = random.Random(0)
+    for epoch in range(epochs):
+        order = list(range(len(windows)))
+        rng.shuffle(order)
+        for start in range(0, len(order), batch_size):
+            batch = _collate([windows[i] for i in order[start:start + batch_size]], pad_id)
+            batch = {k: v.to(device) for k, v in batch.items()}
+            mask = batch["attention_mask"].bool()
+
+            with torch.no_grad():
+                t_logits = teacher(**batch).logits[mask]
+            s_logits = student(**batch).logits[mask]
+
+            soft = F.kl_div(
+                F.log_softmax(s_logits / temperature, dim=-1),
+                F.softmax(t_logits / temperature, dim=-1),
+                reduction="batchmean",
+            ) * temperature ** 2
+            hard = F.cross_entropy(s_logits, t_logits.argmax(dim=-1))
+            loss = alpha * soft + (1 - alpha) * hard
+
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(student.parameters(), 1.0)
+            optimizer.step()
+            scheduler.step()
+            optimizer.zero_grad()
+
+            step += 1
+            if step % 50 == 0 or step == total_steps:
+                print(f"epoch {epoch + 1} step {step}/{total_steps} loss {loss.item():.4f}")
+            if step >= total_steps:
+                return
+
+
+# ── Evaluation against the teacher ─────────────────────────────────────────────
+
+def _timed_predictions(nlp: Any, texts: list[str]) -> tuple[list[list[dict]], np.ndarray]:
+    nlp(texts[0])  # warm-up
+    preds, times = [], []
+    for text in texts:
+        t0 = time.perf_counter()
+        preds.append(nlp(text))
+        times.append(time.perf_counter() - t0)
+    return preds, np.array(times)
+
+
+def compare_to_teacher(teacher_path: str, student_path: str, texts: list[str]) -> dict[str, Any]:
+    """Entity-level agreement of the student with the teacher, and latency of both."""
+    results: dict[str, Any] = {}
+    outputs = {}
+    for name, path in (("teacher", teacher_path), ("student", student_path)):
+        nlp = pipeline("ner", model=path, tokenizer=path, aggregation_strategy="simple", device=-1)
+        preds, times = _timed_predictions(nlp, texts)
+        outputs[name] = [{(e["start"], e["end"], e["entity_group"]) for e in p} for p in preds]
+        results[f"{name}_latency"] = {
+            "mean_s": float(times.mean()),
+            "p50_s": float(np.percentile(times, 50)),
+            "p95_s": float(np.percentile(times, 95)),
+        }
+
+    tp = sum(len(t & s) for t, s in zip(outputs["teacher"], outputs["student"]))
+    n_student = sum(len(s) for s in outputs["student"])
+    n_teacher = sum(len(t) for t in outputs["teacher"])
+    precision = tp / n_student if n_student else 1.0
+    recall = tp / n_teacher if n_teacher else 1.0
+    results["agreement"] = {
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        "teacher_entities": n_teacher,
+        "student_entities": n_student,
+    }
+    results["speedup"] = results["teacher_latency"]["mean_s"] / results["student_latency"]["mean_s"]
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Distil SecureBERT-NER into a smaller student model.")
+    parser.add_argument("corpus", help="Directory (or file) of unlabelled .txt report text")
+    parser.add_argument("--teacher", default=TEACHER_PATH)
+    parser.add_argument("--out", default=OUTPUT_PATH)
+    parser.add_argument("--layers", type=int, default=6)
+    parser.add_argument("--hidden", type=int, default=None, help="Student hidden size (default: teacher's)")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--lr", type=float, default=1e-4)
+    parser.add_argument("--temperature", type=float, default=2.0)
+    parser.add_argument("--alpha", type=float, default=0.5)
+    parser.add_argument("--max-length", type=int, default=256)
+    parser.add_argument("--max-steps", type=int, default=None)
+    parser.add_argument("--eval-fraction", type=float, default=0.1)
+    args = parser.parse_args()
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    tokenizer = AutoTokenizer.from_pretrained(args.teacher)
+    teacher = AutoModelForTokenClassification.from_pretrained(args.teacher)
+
+    texts = load_corpus(args.corpus)
+    if len(texts) < 2:
+        raise SystemExit(f"Need at least two reports in {args.corpus}")
+    random.Random(42).shuffle(texts)
+    n_eval = max(1, int(len(texts) * args.eval_fraction))
+    eval_texts, train_texts = texts[:n_eval], texts[n_eval:]
+
+    windows = encode_windows(tokenizer, train_texts, args.max_length, stride=args.max_length // 8)
+    print(f"Training on {len(windows)} windows from {len(train_texts)} reports ({device})")
+
+    student = build_student(teacher, args.layers, args.hidden)
+    distill(
+        teacher, student, windows, tokenizer.pad_token_id,
+        epochs=args.epochs, batch_size=args.batch_size, lr=args.lr,
+        temperature=args.temperature, alpha=args.alpha,
+        max_steps=args.max_steps, device=device,
+    )
+
+    student.to("cpu").save_pretrained(args.out)
+    tokenizer.save_pretrained(args.out)
+    print(f"Saved student to {args.out}")
+
+    # Evaluate on model-sized pieces of the held-out reports.
+    eval_chunks = [
+        tokenizer.decode(w["input_ids"], skip_special_tokens=True)
+        for w in encode_windows(tokenizer, eval_texts, args.max_length, stride=0)
+    ][:200]
+    report = compare_to_teacher(args.teacher, args.out, eval_chunks)
+    report["student_config"] = {"layers": args.layers, "hidden": student.config.hidden_size}
+    with open(os.path.join(args.out, "distill_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
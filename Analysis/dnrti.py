@@ -0,0 +1,246 @@
+"""
+dnrti.py
+────────
+Shared DNRTI loader with a memory-mappable binary cache.
+
+The first time a split (train.txt / test.txt / valid.txt) is read, it is parsed
+once and stored as flat NumPy arrays under <data_dir>/.cache/:
+
+    token_ids.npy   int32  token id per word (into vocab.npy)
+    label_ids.npy   int16  BIO label id per word (into labels.npy)
+    offsets.npy     int64  sentence i spans words offsets[i]:offsets[i + 1]
+    vocab.npy / labels.npy  fixed-width unicode id → string tables
+
+Tokenizer outputs for " ".join(tokens) are cached the same way, one directory
+per tokenizer hash, next to the split they were computed from. Later runs load
+every array with mmap_mode="r", so nothing is parsed or copied until a sentence
+is actually accessed. Cache directories are named after the SHA-256 of the
+source file (and of the tokenizer), so editing either one invalidates them.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import Any
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "DNRTI")
+SPLITS = ("train.txt", "test.txt", "valid.txt")
+
+_CACHE_DIRNAME = ".cache"
+_ENCODE_BATCH = 1024
+
+
+# ── Helpers ────────────────────────────────────────────────────────────────────
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def tokenizer_hash(tokenizer: Any) -> str:
+    """Stable fingerprint of a HuggingFace tokenizer's vocabulary and pipeline."""
+    digest = hashlib.sha256(type(tokenizer).__name__.encode())
+    if getattr(tokenizer, "is_fast", False):
+        digest.update(tokenizer.backend_tokenizer.to_str().encode())
+    else:
+        digest.update(repr(sorted(tokenizer.get_vocab().items())).encode())
+    return digest.hexdigest()[:16]
+
+
+def _write_arrays(directory: str, arrays: dict[str, np.ndarray]) -> None:
+    """Write *arrays* as .npy files and move the folder into place atomically."""
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    try:
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), arr)
+        try:
+            os.replace(tmp, directory)
+        except OSError:
+            # Another process finished the same cache entry first.
+            if not os.path.isdir(directory):
+                raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _load_arrays(directory: str, names: tuple[str, ...]) -> dict[str, np.ndarray]:
+    return {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in names}
+
+
+def _parse(file_path: str) -> dict[str, np.ndarray]:
+    vocab: dict[str, int] = {}
+    label_vocab: dict[str, int] = {}
+    token_ids: list[int] = []
+    label_ids: list[int] = []
+    offsets = [0]
+
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                if len(token_ids) > offsets[-1]:
+                    offsets.append(len(token_ids))
+            elif len(parts) >= 2:
+                token_ids.append(vocab.setdefault(parts[0], len(vocab)))
+                label_ids.append(label_vocab.setdefault(parts[-1], len(label_vocab)))
+    if len(token_ids) > offsets[-1]:
+        offsets.append(len(token_ids))
+
+    return {
+        "token_ids": np.array(token_ids, dtype=np.int32),
+        "label_ids": np.array(label_ids, dtype=np.int16),
+        "offsets": np.array(offsets, dtype=np.int64),
+        "vocab": np.array(list(vocab), dtype=str),
+        "labels": np.array(list(label_vocab), dtype=str),
+    }
+
+
+# ── Tokenizer outputs ──────────────────────────────────────────────────────────
+
+class TokenizedSplit:
+    """
+    Cached tokenizer output for every sentence of a split.
+
+    input_ids[offsets[i]:offsets[i + 1]] are the ids (with special tokens) of
+    sentence i, and char_spans holds the matching (start, end) character
+    offsets into " ".join(tokens).
+    """
+
+    _ARRAYS = ("input_ids", "char_spans", "offsets")
+
+    def __init__(self, directory: str) -> None:
+        arrays = _load_arrays(directory, self._ARRAYS)
+        self.input_ids = arrays["input_ids"]
+        self.char_spans = arrays["char_spans"]
+        self.offsets = arrays["offsets"]
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """Number of model tokens (including special tokens) per sentence."""
+        return np.diff(self.offsets)
+
+    def ids(self, idx: int) -> np.ndarray:
+        return self.input_ids[self.offsets[idx]:self.offsets[idx + 1]]
+
+    def spans(self, idx: int) -> np.ndarray:
+        return self.char_spans[self.offsets[idx]:self.offsets[idx + 1]]
+
+
+# ── DNRTI split ────────────────────────────────────────────────────────────────
+
+class DNRTISplit:
+    """
+    One DNRTI file backed by memory-mapped arrays.
+
+    Indexing returns the same {'tokens': [...], 'labels': [...]} dicts the old
+    per-notebook load_dnrti_file produced, decoded on demand.
+    """
+
+    _ARRAYS = ("token_ids", "label_ids", "offsets", "vocab", "labels")
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        arrays = _load_arrays(directory, self._ARRAYS)
+        self.token_ids = arrays["token_ids"]
+        self.label_ids = arrays["label_ids"]
+        self.offsets = arrays["offsets"]
+        self.vocab = arrays["vocab"]
+        self.label_vocab = arrays["labels"]
+
+    @classmethod
+    def open(cls, file_path: str, cache_dir: str | None = None) -> DNRTISplit:
+        """Load *file_path* from the cache, building the cache entry if needed."""
+        cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(file_path)), _CACHE_DIRNAME)
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        directory = os.path.join(cache_dir, f"{name}-{_file_hash(file_path)}")
+        if not os.path.isdir(directory):
+            _write_arrays(directory, _parse(file_path))
+        return cls(directory)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def tokens(self, idx: int) -> list[str]:
+        return self.vocab[self.token_ids[self.offsets[idx]:self.offsets[idx + 1]]].tolist()
+
+    def labels(self, idx: int) -> list[str]:
+        return self.label_vocab[self.label_ids[self.offsets[idx]:self.offsets[idx + 1]]].tolist()
+
+    def __getitem__(self, idx: int) -> dict[str, list[str]]:
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        return {'tokens': self.tokens(idx), 'labels': self.labels(idx)}
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def sentences(self) -> list[str]:
+        """Every sentence as the space-joined string the pipelines are fed."""
+        return [" ".join(self.tokens(i)) for i in range(len(self))]
+
+    def encode(self, tokenizer: Any) -> TokenizedSplit:
+        """
+        Return cached tokenizer output for this split, computing it once per
+        distinct tokenizer. Requires a fast (Rust) tokenizer for offsets.
+        """
+        if not getattr(tokenizer, "is_fast", False):
+            raise ValueError("DNRTISplit.encode needs a fast tokenizer (offset mapping).")
+        directory = os.path.join(self.directory, f"tok-{tokenizer_hash(tokenizer)}")
+        if not os.path.isdir(directory):
+            sentences = self.sentences()
+            ids: list[np.ndarray] = []
+            spans: list[np.ndarray] = []
+            lengths = [0]
+            for start in range(0, len(sentences), _ENCODE_BATCH):
+                enc = tokenizer(
+                    sentences[start:start + _ENCODE_BATCH],
+                    return_offsets_mapping=True,
+                    truncation=False,
+                )
+                for input_ids, mapping in zip(enc["input_ids"], enc["offset_mapping"]):
+                    ids.append(np.asarray(input_ids, dtype=np.int32))
+                    spans.append(np.asarray(mapping, dtype=np.int32).reshape(-1, 2))
+                    lengths.append(len(input_ids))
+            _write_arrays(directory, {
+                "input_ids": np.concatenate(ids) if ids else np.zeros(0, dtype=np.int32),
+                "char_spans": np.concatenate(spans) if spans else np.zeros((0, 2), dtype=np.int32),
+                "offsets": np.cumsum(lengths, dtype=np.int64),
+            })
+        return TokenizedSplit(directory)
+
+
+# ── Public API ─────────────────────────────────────────────────────────────────
+
+def load_dnrti_file(file_path: str) -> DNRTISplit | list:
+    """
+    Drop-in replacement for the load_dnrti_file previously copied into every
+    script and notebook. Returns an indexable DNRTISplit (or [] if missing).
+    """
+    if not os.path.exists(file_path):
+        print(f"Warning: {file_path} not found.")
+        return []
+    return DNRTISplit.open(file_path)
+
+
+def load_dnrti(data_dir: str = DATA_DIR, splits: tuple[str, ...] = SPLITS) -> list[dict[str, list[str]]]:
+    """All sentences of *splits* as a list of {'tokens', 'labels'} dicts."""
+    data: list[dict[str, list[str]]] = []
+    for filename in splits:
+        data.extend(load_dnrti_file(os.path.join(data_dir, filename)))
+    return data
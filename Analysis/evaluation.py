@@ -0,0 +1,481 @@
+"""
+evaluation.py
+─────────────
+Importable multi-model evaluation harness (extracted from comparison_v3.ipynb).
+
+Each model runs in its own process with a fixed intra-op thread count (and, on
+Linux, its own disjoint set of CPU cores), so CyNER and SecureBERT are evaluated
+concurrently instead of one after the other. Inside a worker, sentences are
+sorted by length and sent through the pipeline in batches; every finished batch
+is appended to a JSONL checkpoint, so an interrupted run resumes where it
+stopped.
+
+Scoring happens in the parent and produces the same results dict the notebook
+used (seqeval report, unique-entity metrics, BIO error counts, examples), plus a
+latency distribution: warm-up calls are excluded, and p50/p95/p99 per-sentence
+latency is reported per sentence-length bucket.
+
+Run from the Analysis folder:
+    python evaluation.py --batch-size 16 --checkpoint-dir checkpoints
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from seqeval.metrics import classification_report
+
+from alignment import align_bio
+
+MODELS_CONFIG = {
+    "CyNER": "../NER/CyNER",
+    "SecureBERT": "../NER/SecureBert-NER",
+}
+
+# Maps Model Entity Groups -> DNRTI Label Categories (one model label can map
+# to several DNRTI labels; an empty list means the label is skipped).
+LABEL_MAP: dict[str, list[str]] = {
+    # SecureBERT mappings
+    "ACT": ["OffAct", "Way"],
+    "APT": ["HackOrg"],
+    "EMAIL": [],
+    "DOM": [],
+    "ENCR": [],
+    "FILE": ["SamFile"],
+    "IDTY": ["Idus", "Org"],
+    "IP": [],
+    "LOC": ["Area"],
+    "MAL": ["Tool"],
+    "MD5": [],
+    "OS": [],
+    "PROT": [],
+    "SECTEAM": ["SecTeam"],
+    "SHA2": [],
+    "TIME": ["Time"],
+    "TOOL": ["Tool"],
+    "VULID": ["Exp"],
+    "VULNAME": ["Exp"],
+
+    # CyNER mappings
+    "Malware": ["Tool"],
+    "Organization": ["HackOrg", "SecTeam"],
+    "System": ["Tool"],
+    "Vulnerability": ["Exp"],
+    "Indicator": [],
+}
+
+BATCH_SIZE = 16
+WARMUP_BATCHES = 2
+LENGTH_BUCKETS = (10, 20, 40, 80)
+
+
+# ── Label helpers (as in comparison_v3) ────────────────────────────────────────
+
+def map_entity(entity_group: str, label_map: dict[str, Any] = LABEL_MAP) -> list[str]:
+    """Returns a list of possible DNRTI labels for this model label."""
+    res = label_map.get(entity_group, [entity_group])
+    if isinstance(res, str):
+        return [res]
+    return res
+
+
+def supported_labels(model_path: str, label_map: dict[str, Any] = LABEL_MAP) -> set[str]:
+    """DNRTI labels a model can predict, derived from its config.json id2label."""
+    from transformers import AutoConfig
+
+    supported: set[str] = set()
+    for label in AutoConfig.from_pretrained(model_path).id2label.values():
+        if label == 'O':
+            continue
+        raw = label[2:] if label.startswith(('B-', 'I-')) else label
+        supported.update(map_entity(raw, label_map))
+    return supported
+
+
+def filter_ground_truth(labels: list[str], supported_types: set[str]) -> list[str]:
+    """Converts labels not supported by the model to 'O'."""
+    return [l if l != 'O' and l[2:] in supported_types else 'O' for l in labels]
+
+
+def extract_unique_entities(tokens: list[str], labels: list[str]) -> set[tuple[str, str]]:
+    """Extracts set of (Entity Text, Entity Type) tuples."""
+    entities = set()
+    current_entity: list[str] = []
+    current_type = None
+
+    for token, label in zip(tokens, labels):
+        if label.startswith("B-"):
+            if current_entity:
+                entities.add((" ".join(current_entity), current_type))
+            current_entity = [token]
+            current_type = label[2:]
+        elif label.startswith("I-") and current_type == label[2:]:
+            current_entity.append(token)
+        else:
+            if current_entity:
+                entities.add((" ".join(current_entity), current_type))
+            current_entity = []
+            current_type = None
+
+    if current_entity:
+        entities.add((" ".join(current_entity), current_type))
+    return entities
+
+
+# ── Checkpointing ──────────────────────────────────────────────────────────────
+
+def _dataset_hash(texts: list[list[str]]) -> str:
+    digest = hashlib.sha256()
+    for tokens in texts:
+        digest.update("\x1f".join(tokens).encode())
+        digest.update(b"\x1e")
+    return digest.hexdigest()[:12]
+
+
+def _model_hash(model_path: str) -> str:
+    """
+    Fingerprint of a model directory: the contents of its small files (config,
+    tokenizer, label maps) and the size and mtime of its weight files.
+    """
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(model_path):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            digest.update(os.path.relpath(path, model_path).encode() + b"\x1f")
+            if stat.st_size <= 1 << 20:
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+            else:
+                digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+            digest.update(b"\x1e")
+    return digest.hexdigest()[:12]
+
+
+def _load_checkpoint(path: str | None) -> dict[int, dict[str, Any]]:
+    done: dict[int, dict[str, Any]] = {}
+    if not path or not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                break  # torn final line from an interrupted write
+            done[row["idx"]] = row
+    return done
+
+
+def _to_json(pred: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "entity_group": pred["entity_group"],
+        "word": pred.get("word", ""),
+        "score": float(pred.get("score", 0.0)),
+        "start": int(pred["start"]),
+        "end": int(pred["end"]),
+    }
+
+
+# ── Worker (one process per model) ─────────────────────────────────────────────
+
+def _pin(threads: int, cores: list[int] | None) -> None:
+    import torch
+
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # already initialised in this process
+
+
+def predict_model(
+    model_path: str,
+    texts: list[list[str]],
+    batch_size: int = BATCH_SIZE,
+    threads: int | None = None,
+    cores: list[int] | None = None,
+    checkpoint_path: str | None = None,
+    warmup_batches: int = WARMUP_BATCHES,
+) -> tuple[list[list[dict[str, Any]]], list[float | None], list[int], float]:
+    """
+    Run one model over *texts* and return (predictions, per-sentence latency,
+    failed sentence indices, inference seconds).
+
+    Inference seconds is this model's own wall time over the sentences it
+    ran in this call. Warm-up and model loading are excluded, and so are
+    sentences restored from a checkpoint.
+
+    Latency is the wall time of the sentence's batch divided by its size.
+    Sentences restored from a checkpoint keep the latency recorded when they
+    ran (None if the row has none). When a batch raises, its sentences are
+    retried one at a time. A sentence that still fails is reported in the
+    failed list with no predictions and is left out of the checkpoint, so the
+    next run tries it again.
+    """
+    import torch
+    from transformers import AutoModelForTokenClassification, AutoTokenizer, pipeline
+
+    if threads:
+        _pin(threads, cores)
+    device = 0 if torch.cuda.is_available() else -1
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModelForTokenClassification.from_pretrained(model_path)
+    nlp = pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple", device=device)
+
+    done = _load_checkpoint(checkpoint_path)
+    predictions: list[list[dict[str, Any]]] = [[] for _ in texts]
+    latencies: list[float | None] = [None] * len(texts)
+    for idx, row in done.items():
+        if idx < len(texts):
+            predictions[idx] = row["preds"]
+            latencies[idx] = row.get("latency")
+
+    sentences = [" ".join(tokens) for tokens in texts]
+    todo = sorted((i for i in range(len(texts)) if i not in done), key=lambda i: len(texts[i]))
+    if not todo:
+        return predictions, latencies, [], 0.0
+
+    # Warm-up: first calls pay for lazy initialisation and are not timed.
+    for start in range(0, min(len(todo), warmup_batches * batch_size), batch_size):
+        nlp([sentences[i] for i in todo[start:start + batch_size]], batch_size=batch_size)
+
+    failed: list[int] = []
+    run_start = time.perf_counter()
+    ckpt = open(checkpoint_path, "a", encoding="utf-8") if checkpoint_path else None
+    try:
+        for start in range(0, len(todo), batch_size):
+            batch = todo[start:start + batch_size]
+            t0 = time.perf_counter()
+            try:
+                outputs = nlp([sentences[i] for i in batch], batch_size=batch_size)
+                per_sentence = (time.perf_counter() - t0) / len(batch)
+                timed = [(i, preds, per_sentence) for i, preds in zip(batch, outputs)]
+            except Exception:
+                timed = []
+                for i in batch:
+                    t1 = time.perf_counter()
+                    try:
+                        timed.append((i, nlp(sentences[i]), time.perf_counter() - t1))
+                    except Exception as exc:
+                        print(f"{model_path}: sentence {i} failed: {exc}")
+                        failed.append(i)
+
+            for i, preds, per_sentence in timed:
+                predictions[i] = [_to_json(p) for p in preds]
+                latencies[i] = per_sentence
+                if ckpt:
+                    ckpt.write(json.dumps({"idx": i, "preds": predictions[i], "latency": per_sentence}) + "\n")
+            if ckpt:
+                ckpt.flush()
+    finally:
+        if ckpt:
+            ckpt.close()
+    return predictions, latencies, failed, time.perf_counter() - run_start
+
+
+# ── Scoring ────────────────────────────────────────────────────────────────────
+
+def latency_summary(
+    latencies: list[float | None],
+    lengths: list[int],
+    buckets: tuple[int, ...] = LENGTH_BUCKETS,
+) -> pd.DataFrame:
+    """p50/p95/p99 per-sentence latency (seconds) per sentence-length bucket."""
+    edges = list(buckets)
+    names = [f"1-{edges[0]}"] + [f"{a + 1}-{b}" for a, b in zip(edges, edges[1:])] + [f">{edges[-1]}"]
+    timed = [(lat, n) for lat, n in zip(latencies, lengths) if lat is not None]
+    lat = np.array([t[0] for t in timed], dtype=float)
+    bucket_idx = np.searchsorted(edges, np.array([t[1] for t in timed], dtype=int), side="left")
+
+    rows = []
+    for b, name in enumerate(names):
+        sample = lat[bucket_idx == b]
+        if len(sample) == 0:
+            continue
+        p50, p95, p99 = np.percentile(sample, [50, 95, 99])
+        rows.append({"Length": name, "Sentences": len(sample), "Mean": sample.mean(),
+                     "p50": p50, "p95": p95, "p99": p99})
+    if len(lat):
+        p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+        rows.append({"Length": "all", "Sentences": len(lat), "Mean": lat.mean(),
+                     "p50": p50, "p95": p95, "p99": p99})
+    return pd.DataFrame(rows, columns=["Length", "Sentences", "Mean", "p50", "p95", "p99"])
+
+
+def score_model(
+    predictions: list[list[dict[str, Any]]],
+    texts: list[list[str]],
+    labels: list[list[str]],
+    supported_types: set[str],
+    label_map: dict[str, Any] = LABEL_MAP,
+) -> dict[str, Any]:
+    """Token-level, unique-entity and BIO error metrics, as in comparison_v3."""
+    all_preds, all_trues_filtered = [], []
+    examples: dict[str, list] = {'success': [], 'failure': []}
+    unique_tp = unique_fp = unique_fn = 0
+    bio_stats: Counter = Counter()
+
+    for tokens, orig_labels, preds in zip(texts, labels, predictions):
+        true_labels_filtered = filter_ground_truth(orig_labels, supported_types)
+        pred_labels = align_bio(preds, tokens, label_map, ground_truth=true_labels_filtered)
+        all_preds.append(pred_labels)
+        all_trues_filtered.append(true_labels_filtered)
+
+        true_entities = extract_unique_entities(tokens, true_labels_filtered)
+        pred_entities = extract_unique_entities(tokens, pred_labels)
+        unique_tp += len(true_entities & pred_entities)
+        unique_fp += len(pred_entities - true_entities)
+        unique_fn += len(true_entities - pred_entities)
+
+        for p, t in zip(pred_labels, true_labels_filtered):
+            if p == t:
+                bio_stats["Correct"] += 1
+            elif t == 'O':
+                bio_stats["False Positive"] += 1
+            elif p == 'O':
+                bio_stats["False Negative"] += 1
+            else:
+                bio_stats["Wrong Label"] += 1
+
+        if len(examples['success']) < 3:
+            if pred_labels == true_labels_filtered and any(l != 'O' for l in true_labels_filtered):
+                examples['success'].append((tokens, true_labels_filtered, pred_labels))
+        if len(examples['failure']) < 3 and pred_labels != true_labels_filtered:
+            examples['failure'].append((tokens, true_labels_filtered, pred_labels))
+
+    report = classification_report(all_trues_filtered, all_preds, output_dict=True, zero_division=0)
+    uniq_prec = unique_tp / (unique_tp + unique_fp) if (unique_tp + unique_fp) > 0 else 0
+    uniq_rec = unique_tp / (unique_tp + unique_fn) if (unique_tp + unique_fn) > 0 else 0
+    uniq_f1 = 2 * (uniq_prec * uniq_rec) / (uniq_prec + uniq_rec) if (uniq_prec + uniq_rec) > 0 else 0
+
+    return {
+        "report": report,
+        "unique_metrics": {
+            "precision": uniq_prec,
+            "recall": uniq_rec,
+            "f1": uniq_f1,
+            "counts": (unique_tp, unique_fp, unique_fn),
+        },
+        "bio_stats": bio_stats,
+        "examples": examples,
+    }
+
+
+# ── Orchestration ──────────────────────────────────────────────────────────────
+
+def _core_sets(n_models: int, threads: int) -> list[list[int] | None]:
+    if not hasattr(os, "sched_getaffinity"):
+        return [None] * n_models
+    cores = sorted(os.sched_getaffinity(0))
+    if len(cores) < n_models * threads:
+        return [None] * n_models
+    return [cores[i * threads:(i + 1) * threads] for i in range(n_models)]
+
+
+def evaluate_models(
+    models: dict[str, str],
+    texts: list[list[str]],
+    labels: list[list[str]],
+    label_map: dict[str, Any] = LABEL_MAP,
+    batch_size: int = BATCH_SIZE,
+    threads: int | None = None,
+    checkpoint_dir: str | None = None,
+    parallel: bool = True,
+) -> dict[str, dict[str, Any]]:
+    """
+    Evaluate every model in *models* (name → path) on the same sentences.
+
+    With *parallel* each model gets its own process with *threads* intra-op
+    threads (default: the available cores split evenly) pinned to a disjoint
+    core set. Returns {name: results} in the comparison_v3 results format.
+    """
+    names = [n for n, p in models.items() if os.path.exists(p)]
+    for missing in set(models) - set(names):
+        print(f"Error: Path {models[missing]} does not exist.")
+    if not names:
+        return {}
+
+    threads = threads or max(1, (os.cpu_count() or 1) // len(names))
+    cores = _core_sets(len(names), threads)
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+    tag = _dataset_hash(texts)
+
+    def _args(i: int, name: str) -> tuple:
+        # Keyed by data, model files and batch size, so a changed model or a
+        # different batching never reuses stale predictions or latencies.
+        key = f"{tag}-{_model_hash(models[name])}-b{batch_size}"
+        ckpt = os.path.join(checkpoint_dir, f"{name.lower()}-{key}.jsonl") if checkpoint_dir else None
+        return (models[name], texts, batch_size, threads, cores[i], ckpt)
+
+    outputs: dict[str, tuple[list, list, list, float]] = {}
+    if parallel and len(names) > 1:
+        with ProcessPoolExecutor(max_workers=len(names), mp_context=mp.get_context("spawn")) as pool:
+            futures = {name: pool.submit(predict_model, *_args(i, name)) for i, name in enumerate(names)}
+            outputs = {name: fut.result() for name, fut in futures.items()}
+    else:
+        for i, name in enumerate(names):
+            outputs[name] = predict_model(*_args(i, name))
+
+    lengths = [len(tokens) for tokens in texts]
+    results: dict[str, dict[str, Any]] = {}
+    for name in names:
+        predictions, latencies, failed, duration = outputs[name]
+        if failed:
+            print(f"Warning: {name} failed on {len(failed)} sentences; they are scored as having no entities.")
+        res = score_model(predictions, texts, labels, supported_labels(models[name], label_map), label_map)
+        res["failed"] = failed
+        lat_table = latency_summary(latencies, lengths)
+        res["duration"] = duration
+        res["latency"] = float(lat_table["Mean"].iloc[-1]) if len(lat_table) else float("nan")
+        res["latency_buckets"] = lat_table
+        results[name] = res
+    return results
+
+
+def main() -> None:
+    from sklearn.model_selection import train_test_split
+
+    from dnrti import load_dnrti
+
+    parser = argparse.ArgumentParser(description="Evaluate NER models on the DNRTI validation split.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads per model")
+    parser.add_argument("--checkpoint-dir", default="checkpoints")
+    parser.add_argument("--sequential", action="store_true", help="Evaluate models one after the other")
+    args = parser.parse_args()
+
+    full_data = load_dnrti()
+    texts = [d['tokens'] for d in full_data]
+    labels = [d['labels'] for d in full_data]
+    _, eval_texts, _, eval_labels = train_test_split(texts, labels, test_size=0.1, random_state=42)
+    print(f"Evaluation set size: {len(eval_texts)}")
+
+    results = evaluate_models(
+        MODELS_CONFIG, eval_texts, eval_labels,
+        batch_size=args.batch_size, threads=args.threads,
+        checkpoint_dir=args.checkpoint_dir, parallel=not args.sequential,
+    )
+    for name, res in results.items():
+        print(f"\n{'='*20}\nMODEL: {name}\n{'='*20}")
+        print(f"F1 (Token-based):     {res['report']['macro avg']['f1-score']:.4f}")
+        print(f"F1 (Unique Entities): {res['unique_metrics']['f1']:.4f}")
+        print("Latency per sentence (s):")
+        print(res["latency_buckets"].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
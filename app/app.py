@@ -75,16 +75,17 @@ if analyse_clicked and uploaded_file is not None:
         pct = int(current / total * 100)
         progress.progress(pct, text=f"Extracting entities… chunk {current}/{total}")
 
-    raw_entities = ner.extract(raw_text, on_chunk=_update_progress)
+    # The backend aggregates next to the model and returns only the summary table.
+    result = ner.summarize(raw_text, on_chunk=_update_progress)
     progress.progress(100, text="Done!")
     progress.empty()
 
-    if not raw_entities:
+    if not result["summary"]:
         st.info("No named entities were detected in the provided text.")
         st.stop()
 
-    st.session_state["df"] = entity_processor.aggregate(raw_entities)
-    st.session_state["stats"] = entity_processor.summary_stats(st.session_state["df"])
+    st.session_state["df"] = entity_processor.summary_frame(result["summary"])
+    st.session_state["stats"] = result["stats"]
     st.session_state["file_name"] = uploaded_file.name
 
 # ── Display results (persists across reruns thanks to session_state) ──────────
@@ -0,0 +1,85 @@
+"""
+bench_cascade.py
+────────────────
+Sweeps cascade thresholds on a folder of reports. Both models run once on
+every chunk (timed per chunk). Each threshold is then evaluated offline:
+which chunks escalate, the time the cascade would take (first stage on all
+chunks plus the full model on escalated ones), and entity agreement with
+full-model-only output.
+
+Run with:
+    python app/bench_cascade.py reports/ --first-stage NER/SecureBert-NER-fast \
+        --thresholds 0.5 0.7 0.8 0.9 --class-thresholds APT=0.95,MAL=0.9
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import time
+
+from cascade import ModelCascade, entity_keys, load_first_stage
+from config import CASCADE_MODEL_PATH, MODEL_PATH
+from decoding import TokenClassifier
+from ner_service import _chunk_text
+
+
+def _timed(model, chunks: list[str]) -> tuple[list[list[dict]], list[float]]:
+    outputs, seconds = [], []
+    for chunk in chunks:
+        t0 = time.perf_counter()
+        outputs.append(model(chunk))
+        seconds.append(time.perf_counter() - t0)
+    return outputs, seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Escalation rate, time saved and agreement of the model cascade.")
+    parser.add_argument("corpus", help="Directory of .txt reports")
+    parser.add_argument("--first-stage", default=CASCADE_MODEL_PATH, help='Model directory or "quantized"')
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.5, 0.7, 0.8, 0.9, 0.95])
+    parser.add_argument("--class-thresholds", default="", help='Per-class overrides, e.g. "APT=0.95,MAL=0.9"')
+    args = parser.parse_args()
+    per_class = {
+        name.strip(): float(score)
+        for name, _, score in (p.partition("=") for p in args.class_thresholds.split(",") if p.strip())
+    }
+
+    chunks: list[str] = []
+    for path in sorted(glob.glob(os.path.join(args.corpus, "*.txt"))):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            chunks.extend(_chunk_text(f.read()))
+
+    full = TokenClassifier(MODEL_PATH)
+    first = load_first_stage(args.first_stage, MODEL_PATH)
+    full(chunks[0])
+    first(chunks[0])  # warm-up
+    full_out, full_s = _timed(full, chunks)
+    first_out, first_s = _timed(first, chunks)
+    reference = [entity_keys(out) for out in full_out]
+
+    print(f"{len(chunks)} chunks; full model alone {sum(full_s):.2f}s, first stage alone {sum(first_s):.2f}s")
+    print(f"{'threshold':>9} | {'escalated':>9} | {'time':>7} | {'saved':>6} | {'P':>6} | {'R':>6} | {'F1':>6}")
+    print("-" * 66)
+    for threshold in args.thresholds:
+        cascade = ModelCascade(None, None, threshold=threshold, thresholds=per_class)
+        escalated = [cascade.needs_full(out) is not None for out in first_out]
+        seconds = sum(first_s) + sum(s for s, e in zip(full_s, escalated) if e)
+        tp = fp = fn = 0
+        for ref, fast_out, full_o, e in zip(reference, first_out, full_out, escalated):
+            got = entity_keys(full_o if e else fast_out)
+            tp += len(got & ref)
+            fp += len(got - ref)
+            fn += len(ref - got)
+        p = tp / (tp + fp) if tp + fp else 1.0
+        r = tp / (tp + fn) if tp + fn else 1.0
+        f1 = 2 * p * r / (p + r) if p + r else 0.0
+        print(
+            f"{threshold:>9.2f} | {sum(escalated) / len(chunks):>8.1%} | {seconds:>6.2f}s | "
+            f"{1 - seconds / sum(full_s):>6.1%} | {p:.4f} | {r:.4f} | {f1:.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+bench_decoding.py
+─────────────────
+Compares the HuggingFace "ner" pipeline (aggregation_strategy="simple") with
+TokenClassifier on the same chunks: end-to-end time, post-processing time
+after the forward pass, and agreement of the entity spans.
+
+Run with:
+    python app/bench_decoding.py --chunks 64
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+import torch
+from transformers import pipeline
+
+from bench_ioc import make_report
+from config import MODEL_PATH
+from decoding import TokenClassifier
+from ner_service import _chunk_text
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark vectorised NER decoding against the HF pipeline.")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--chunks", type=int, default=64)
+    args = parser.parse_args()
+
+    chunks = _chunk_text(make_report(args.chunks * 1800))[: args.chunks]
+    clf = TokenClassifier(args.model, device="cpu")
+    nlp = pipeline("ner", model=clf.model, tokenizer=clf.tokenizer, aggregation_strategy="simple", device=-1)
+    clf(chunks[:2])
+    nlp(chunks[0])
+
+    t0 = time.perf_counter()
+    old = [nlp(c) for c in chunks]
+    t_pipeline = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    new = clf(chunks)
+    t_ours = time.perf_counter() - t0
+
+    # Post-processing alone, on precomputed model outputs.
+    enc = clf.tokenizer(chunks, truncation=True, max_length=clf.max_length, padding=True,
+                        return_offsets_mapping=True, return_special_tokens_mask=True, return_tensors="pt")
+    offsets = enc.pop("offset_mapping").numpy()
+    real = enc.pop("special_tokens_mask").numpy() == 0
+    with torch.inference_mode():
+        logits = clf.model(**enc).logits
+    probs = logits.softmax(dim=-1).numpy()
+    t0 = time.perf_counter()
+    clf.decode(chunks, probs, offsets, real)
+    t_decode = time.perf_counter() - t0
+
+    t_post = 0.0
+    for chunk in chunks:
+        outputs = [nlp.forward(inputs) for inputs in nlp.preprocess(chunk, **nlp._preprocess_params)]
+        t0 = time.perf_counter()
+        nlp.postprocess(outputs, **nlp._postprocess_params)
+        t_post += time.perf_counter() - t0
+
+    old_spans = {(i, e["start"], e["end"], e["entity_group"]) for i, ents in enumerate(old) for e in ents}
+    new_spans = {(i, e["start"], e["end"], e["entity_group"]) for i, ents in enumerate(new) for e in ents}
+    overlap = len(old_spans & new_spans) / max(1, len(old_spans | new_spans))
+    mean_chars = np.mean([len(c) for c in chunks])
+
+    print(f"{len(chunks)} chunks (~{mean_chars:.0f} chars)")
+    print(f"  pipeline end-to-end      {t_pipeline:8.3f}s")
+    print(f"  TokenClassifier          {t_ours:8.3f}s  ({t_pipeline / t_ours:.2f}×)")
+    print(f"  pipeline postprocess     {t_post * 1000:8.1f}ms")
+    print(f"  vectorised decode        {t_decode * 1000:8.1f}ms  ({t_post / t_decode:.0f}×)")
+    print(f"  span agreement (Jaccard) {overlap:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
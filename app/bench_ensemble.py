@@ -0,0 +1,57 @@
+"""
+bench_ensemble.py
+─────────────────
+Latency of the CyNER + SecureBERT ensemble on a folder of reports: the models
+run one after the other versus fanned out concurrently on their own cores.
+The fan-out should take about as long as the slower model alone.
+
+Run with:
+    python app/bench_ensemble.py reports/ --threads 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import time
+
+from config import ENSEMBLE_THREADS
+from ensemble import EnsembleNERProvider
+from ner_service import _chunk_text
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sequential vs concurrent multi-model extraction latency.")
+    parser.add_argument("corpus", help="Directory of .txt reports")
+    parser.add_argument("--threads", type=int, default=ENSEMBLE_THREADS, help="Intra-op threads per model")
+    args = parser.parse_args()
+
+    provider = EnsembleNERProvider(threads=args.threads)
+    texts = []
+    for path in sorted(glob.glob(os.path.join(args.corpus, "*.txt"))):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            texts.append(f.read())
+    provider.extract(texts[0][:2000])  # warm-up
+
+    sequential = {name: 0.0 for name in provider._pools}
+    concurrent = 0.0
+    for text in texts:
+        chunks = _chunk_text(text)
+        for name, pool in provider._pools.items():
+            t0 = time.perf_counter()
+            pool.map(chunks)
+            sequential[name] += time.perf_counter() - t0
+        t0 = time.perf_counter()
+        provider.extract(text)
+        concurrent += time.perf_counter() - t0
+    provider.close()
+
+    for name, seconds in sequential.items():
+        print(f"{name:>12}: {seconds:.2f}s alone")
+    print(f"{'sequential':>12}: {sum(sequential.values()):.2f}s")
+    print(f"{'fan-out':>12}: {concurrent:.2f}s (slowest model alone: {max(sequential.values()):.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+bench_packing.py
+────────────────
+Padded vs packed inference on short inputs. The inputs are sentences from a
+folder of reports, or from a CoNLL file such as DNRTI's test.txt (one
+"token label" per line, blank line between sentences). Both modes run the
+same TokenClassifier settings. The script checks that the entities match,
+with start, end and class equal and the worst score difference reported,
+and prints sentences per second for each mode.
+
+Run with:
+    python app/bench_packing.py reports/ --limit 2000
+    python app/bench_packing.py --conll DNRTI/test.txt
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import re
+import time
+
+from cascade import entity_keys
+from config import MODEL_PATH
+from decoding import TokenClassifier
+
+
+def _sentences(corpus: str | None, conll: str | None) -> list[str]:
+    if conll:
+        sentences, words = [], []
+        with open(conll, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if line.strip():
+                    words.append(line.split()[0])
+                elif words:
+                    sentences.append(" ".join(words))
+                    words = []
+        return sentences + ([" ".join(words)] if words else [])
+    sentences = []
+    for path in sorted(glob.glob(os.path.join(corpus, "*.txt"))):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            sentences.extend(s.strip() for s in re.split(r"(?<=[.!?])\s+", f.read()) if s.strip())
+    return sentences
+
+
+def _timed(clf: TokenClassifier, sentences: list[str]):
+    clf.predict(sentences[: clf.batch_size])  # warm-up
+    t0 = time.perf_counter()
+    out = clf.predict(sentences)
+    return out, time.perf_counter() - t0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Throughput and entity parity of packed vs padded inference.")
+    parser.add_argument("corpus", nargs="?", help="Directory of .txt reports, split into sentences")
+    parser.add_argument("--conll", help="CoNLL file to read sentences from instead")
+    parser.add_argument("--limit", type=int, default=0, help="Use at most this many sentences")
+    parser.add_argument("--batch-size", type=int, default=8, help="Rows (padded) / windows (packed) per forward pass")
+    parser.add_argument("--model", default=MODEL_PATH)
+    args = parser.parse_args()
+    if not args.corpus and not args.conll:
+        parser.error("give a corpus directory or --conll")
+
+    sentences = _sentences(args.corpus, args.conll)
+    if args.limit:
+        sentences = sentences[: args.limit]
+    padded = TokenClassifier(args.model, batch_size=args.batch_size)
+    packed = TokenClassifier(args.model, batch_size=args.batch_size, pack=True)
+    windows = len(packed._pack([len(ids) + 2 for ids in packed.tokenizer(sentences, truncation=True)["input_ids"]]))
+
+    ref, t_padded = _timed(padded, sentences)
+    out, t_packed = _timed(packed, sentences)
+
+    mismatched = sum(entity_keys(a) != entity_keys(b) for a, b in zip(ref, out))
+    worst = max(
+        (abs(x["score"] - y["score"]) for a, b in zip(ref, out) for x, y in zip(a, b)),
+        default=0.0,
+    )
+    print(f"{len(sentences)} sentences in {windows} packed windows; {sum(map(len, ref))} entities")
+    print(f"{'padded':>8}: {t_padded:.2f}s  {len(sentences) / t_padded:,.1f} sentences/s")
+    print(f"{'packed':>8}: {t_packed:.2f}s  {len(sentences) / t_packed:,.1f} sentences/s ({t_padded / t_packed:.2f}x)")
+    print(f"entity parity: {len(sentences) - mismatched}/{len(sentences)} sentences identical; worst score diff {worst:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+bench_scheduler.py
+──────────────────
+Compares scheduling policies on a mixed load: one bulk client submits a large
+report while an interactive client sends short alerts. The model is simulated
+(service time proportional to chunk length), so only scheduling is measured.
+
+Run with:
+    python app/bench_scheduler.py --bulk-chunks 200 --alerts 40
+"""
+
+from __future__ import annotations
+
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from scheduler import POLICIES, ChunkScheduler
+
+_CHUNK = "x" * 1800
+_ALERT = "y" * 200
+
+
+def _simulated_model(seconds_per_kchar: float):
+    def run_batch(texts: list[str]) -> list[list]:
+        time.sleep(sum(len(t) for t in texts) / 1000 * seconds_per_kchar)
+        return [[] for _ in texts]
+    return run_batch
+
+
+def run(policy: str, bulk_chunks: int, alerts: int, spk: float, weights: dict[str, float]) -> dict[str, float]:
+    sched = ChunkScheduler(_simulated_model(spk), workers=1, batch_size=1, policy=policy, weights=weights)
+    alert_latencies: list[float] = []
+    bulk_latency: list[float] = []
+
+    def bulk() -> None:
+        t0 = time.perf_counter()
+        for fut in sched.submit([_CHUNK] * bulk_chunks, client="batch", priority="bulk"):
+            fut.result()
+        bulk_latency.append(time.perf_counter() - t0)
+
+    def alert() -> None:
+        t0 = time.perf_counter()
+        sched.submit([_ALERT], client="analyst", priority="interactive")[0].result()
+        alert_latencies.append(time.perf_counter() - t0)
+
+    # Open loop: alerts arrive at a steady rate while the bulk report runs.
+    bulk_seconds = bulk_chunks * len(_CHUNK) / 1000 * spk
+    gap = bulk_seconds * 0.8 / alerts
+    threads = [threading.Thread(target=bulk)]
+    threads[0].start()
+    for _ in range(alerts):
+        time.sleep(gap)
+        threads.append(threading.Thread(target=alert))
+        threads[-1].start()
+    for t in threads:
+        t.join()
+    lat = np.array(alert_latencies)
+    return {
+        "alert_p50": float(np.percentile(lat, 50)),
+        "alert_p95": float(np.percentile(lat, 95)),
+        "bulk_total": bulk_latency[0],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare chunk scheduling policies on a simulated model.")
+    parser.add_argument("--bulk-chunks", type=int, default=200)
+    parser.add_argument("--alerts", type=int, default=40)
+    parser.add_argument("--seconds-per-kchar", type=float, default=0.01)
+    args = parser.parse_args()
+    weights = {"interactive": 4, "bulk": 1}
+
+    print(f"{'policy':>9} | {'alert p50':>9} | {'alert p95':>9} | {'bulk total':>10}")
+    print("-" * 48)
+    for policy in POLICIES:
+        r = run(policy, args.bulk_chunks, args.alerts, args.seconds_per_kchar, weights)
+        print(f"{policy:>9} | {r['alert_p50']:>8.3f}s | {r['alert_p95']:>8.3f}s | {r['bulk_total']:>9.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+bench_tokenise.py
+─────────────────
+Share of extraction latency spent tokenising, on a folder of reports, before
+and after tokenising once per document.
+
+  per chunk   each chunk string is tokenised in its model batch (the old path)
+  once        the document is encoded once with encode_spans() and the chunks
+              carry their token slices into the model batch
+
+Both paths use the same chunk spans. The only difference is that "once" splits a
+chunk longer than the model window instead of truncating it, so it can feed
+the model more tokens. The script also reports the token counts, how many
+entities each path finds, and whether "once" keeps every entity of
+"per chunk".
+
+Run with:
+    python app/bench_tokenise.py reports/ --repeat 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import time
+
+import torch
+
+from cascade import entity_keys
+from config import MODEL_PATH
+from decoding import TokenClassifier
+from ner_service import _chunk_spans, _rebase
+
+
+def _per_chunk(clf: TokenClassifier, batch: list[str]) -> tuple[list[list[dict]], float, int]:
+    """
+    The path before encode_spans: tokenise the batch's chunk strings with
+    padding and special tokens, then run the model. Returns the entities,
+    the tokenising seconds and the number of content tokens.
+    """
+    t0 = time.perf_counter()
+    enc = clf.tokenizer(
+        batch,
+        truncation=True,
+        max_length=clf.max_length,
+        padding=True,
+        return_offsets_mapping=True,
+        return_special_tokens_mask=True,
+        return_tensors="pt",
+    )
+    offsets = enc.pop("offset_mapping").numpy()
+    real = enc.pop("special_tokens_mask").numpy() == 0
+    seconds = time.perf_counter() - t0
+    with torch.inference_mode():
+        logits = clf.model(**enc.to(clf.device)).logits
+    probs = logits.float().softmax(dim=-1).cpu().numpy()
+    return clf.decode(batch, probs, offsets, real), seconds, int(real.sum())
+
+
+def _once(clf: TokenClassifier, batch: list[str]) -> tuple[list[list[dict]], float, int]:
+    """predict() on EncodedChunks; its _encode step is timed on its own."""
+    t0 = time.perf_counter()
+    ids, _ = clf._encode(batch)
+    seconds = time.perf_counter() - t0
+    return clf.predict(batch), seconds, sum(map(len, ids))
+
+
+def _run(clf: TokenClassifier, texts: list[str], once: bool) -> tuple[float, float, int, set]:
+    """(tokenise seconds, total seconds, model tokens, entity keys) over all *texts*."""
+    tokenise = total = 0.0
+    tokens = 0
+    keys: set = set()
+    for doc, text in enumerate(texts):
+        t0 = time.perf_counter()
+        spans = _chunk_spans(text)
+        if once:
+            spans, chunks = clf.encode_spans(text, spans)
+            tokenise += time.perf_counter() - t0
+        else:
+            chunks = [text[s:e] for s, e in spans]
+        outputs = []
+        for i in range(0, len(chunks), clf.batch_size):
+            out, seconds, n = (_once if once else _per_chunk)(clf, chunks[i:i + clf.batch_size])
+            outputs.extend(out)
+            tokenise += seconds
+            tokens += n
+        total += time.perf_counter() - t0
+        for (start, _), entities in zip(spans, outputs):
+            keys |= {(doc, *k) for k in entity_keys(_rebase(entities, start))}
+    return tokenise, total, tokens, keys
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tokenisation share of latency: per chunk vs once per document.")
+    parser.add_argument("corpus", help="Directory of .txt reports")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--model", default=MODEL_PATH)
+    args = parser.parse_args()
+
+    texts = []
+    for path in sorted(glob.glob(os.path.join(args.corpus, "*.txt"))):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            texts.append(f.read())
+    clf = TokenClassifier(args.model)
+    clf(texts[0][:2000])  # warm-up
+
+    results = {}
+    for name, once in (("per chunk", False), ("once", True)):
+        best = min((_run(clf, texts, once) for _ in range(args.repeat)), key=lambda r: r[1])
+        results[name] = best
+        tokenise, total, tokens, keys = best
+        print(
+            f"{name:>10}: tokenise {tokenise * 1000:8.1f} ms of {total * 1000:8.1f} ms ({tokenise / total:.1%}); "
+            f"{tokens} tokens to the model, {len(keys)} entities"
+        )
+    kept = len(results["per chunk"][3] & results["once"][3])
+    print(f"'once' keeps {kept}/{len(results['per chunk'][3])} entities of 'per chunk'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+cancellation.py
+───────────────
+Cooperative cancellation for long extractions.
+
+A CancelToken travels with one extraction request. The provider checks it
+between chunks and batches. The token fires when its deadline passes, when
+its probe reports that the client has gone away, or when cancel() is called.
+Once it fires, the remaining chunks of the request are dropped instead of
+being run and thrown away.
+
+CANCEL_STATS counts cancelled requests and the chunks they wasted (computed,
+then discarded) or saved (never run), so that abandoned work shows up in
+/stats.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections.abc import Callable
+
+
+class Cancelled(Exception):
+    """Raised by CancelToken.check(); *reason* says why, e.g. "deadline" or "disconnect"."""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(f"request cancelled: {reason}")
+        self.reason = reason
+
+
+class CancelToken:
+    """
+    *timeout* seconds from now become the deadline (None = no deadline).
+    *probe* is called on every check and should return True once the caller
+    has gone away (e.g. the HTTP client disconnected); *probe_reason* is then
+    the cancellation reason.
+    """
+
+    def __init__(
+        self,
+        timeout: float | None = None,
+        probe: Callable[[], bool] | None = None,
+        probe_reason: str = "disconnect",
+    ) -> None:
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self._probe = probe
+        self._probe_reason = probe_reason
+        self.reason: str | None = None
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        if self.reason is None:
+            self.reason = reason
+
+    @property
+    def cancelled(self) -> bool:
+        if self.reason is None:
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                self.reason = "deadline"
+            elif self._probe is not None and self._probe():
+                self.reason = self._probe_reason
+        return self.reason is not None
+
+    def remaining(self) -> float | None:
+        """Seconds left until the deadline, or None without one."""
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+    def check(self) -> None:
+        if self.cancelled:
+            raise Cancelled(self.reason)
+
+
+class CancelStats:
+    """Thread-safe counters of cancelled requests and their chunks."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counts: dict[str, int] = {
+            "requests_cancelled": 0,
+            "chunks_completed": 0,
+            "chunks_wasted": 0,
+            "chunks_dropped": 0,
+        }
+        self._reasons: dict[str, int] = {}
+
+    def chunk_done(self, n: int = 1) -> None:
+        with self._lock:
+            self._counts["chunks_completed"] += n
+
+    def request_cancelled(self, reason: str, wasted: int, dropped: int) -> None:
+        """*wasted* chunks were run for nothing; *dropped* chunks were never run."""
+        with self._lock:
+            self._counts["requests_cancelled"] += 1
+            self._counts["chunks_wasted"] += wasted
+            self._counts["chunks_dropped"] += dropped
+            self._reasons[reason] = self._reasons.get(reason, 0) + 1
+
+    def snapshot(self) -> dict[str, object]:
+        with self._lock:
+            return {**self._counts, "by_reason": dict(self._reasons)}
+
+
+CANCEL_STATS = CancelStats()
@@ -0,0 +1,166 @@
+"""
+cascade.py
+──────────
+Confidence-based model cascade: a cheap first-stage model scores every chunk,
+and only the chunks it is unsure about are re-run on the full model.
+
+A chunk is escalated when any entity found by the first stage scores below
+the threshold for its class (CASCADE_THRESHOLDS, else CASCADE_THRESHOLD).
+Otherwise the first stage's entities are kept. The first stage is a separate
+model directory (e.g. the student from Analysis/distill.py) or "quantized",
+an int8 dynamically quantised copy of the full model.
+
+A CASCADE_SHADOW_RATE fraction of the chunks that were not escalated also
+runs on the full model. That output is only used to measure agreement (entity
+precision / recall / F1 against full-model-only). Stats report the escalation
+rate, that agreement and an estimate of the time saved: what the full model
+would have taken on all chunks, from its measured time per character on the
+escalated and shadow chunks.
+bench_cascade.py measures all of this offline on a folder of reports.
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+from config import MODEL_PATH
+
+Batch = Callable[[list[str]], list[list[dict[str, Any]]]]
+
+
+def load_first_stage(path: str, full_model_path: str = MODEL_PATH) -> Any:
+    """TokenClassifier for *path*, or an int8 copy of the full model for "quantized"."""
+    from decoding import TokenClassifier
+
+    if path != "quantized":
+        return TokenClassifier(path)
+    import torch
+
+    clf = TokenClassifier(full_model_path)
+    clf.model = torch.ao.quantization.quantize_dynamic(clf.model, {torch.nn.Linear}, dtype=torch.qint8)
+    return clf
+
+
+def entity_keys(entities: list[dict[str, Any]]) -> set[tuple[int, int, str]]:
+    return {(e.get("start", 0), e.get("end", 0), e.get("entity_group", "")) for e in entities}
+
+
+class ModelCascade:
+    """
+    *first_stage* and *full* map a batch of chunks to their entity lists.
+    *thresholds* maps entity class → minimum score; other classes use
+    *threshold*.
+    """
+
+    def __init__(
+        self,
+        first_stage: Batch,
+        full: Batch,
+        threshold: float = 0.8,
+        thresholds: dict[str, float] | None = None,
+        shadow_rate: float = 0.0,
+    ) -> None:
+        self._first_stage = first_stage
+        self._full = full
+        self.threshold = threshold
+        self.thresholds = dict(thresholds or {})
+        self.shadow_rate = shadow_rate
+        self._lock = threading.Lock()
+        self._counts = {
+            "chunks": 0, "escalated": 0, "chars": 0, "escalated_chars": 0,
+            "shadow_chunks": 0, "shadow_chars": 0, "tp": 0, "fp": 0, "fn": 0,
+        }
+        self._escalated_by_class: dict[str, int] = {}
+        self._seconds = {"first_stage": 0.0, "full": 0.0, "shadow": 0.0}
+
+    def needs_full(self, entities: list[dict[str, Any]]) -> str | None:
+        """The class of the first entity scoring below its threshold, or None."""
+        for ent in entities:
+            group = ent.get("entity_group", "")
+            if float(ent.get("score", 0.0)) < self.thresholds.get(group, self.threshold):
+                return group
+        return None
+
+    def __call__(self, chunks: list[str]) -> list[list[dict[str, Any]]]:
+        t0 = time.perf_counter()
+        try:
+            outputs = self._first_stage(chunks)
+            reasons = [self.needs_full(ents) for ents in outputs]
+        except Exception:
+            outputs = [[] for _ in chunks]
+            reasons = ["error"] * len(chunks)
+        t1 = time.perf_counter()
+
+        escalate = [i for i, reason in enumerate(reasons) if reason is not None]
+        shadow = [
+            i for i, reason in enumerate(reasons)
+            if reason is None and self.shadow_rate > 0 and random.random() < self.shadow_rate
+        ]
+        full_seconds = 0.0
+        if escalate:
+            t2 = time.perf_counter()
+            for i, out in zip(escalate, self._full([chunks[i] for i in escalate])):
+                outputs[i] = out
+            full_seconds = time.perf_counter() - t2
+        agreement = [0, 0, 0]
+        shadow_seconds = 0.0
+        if shadow:
+            t3 = time.perf_counter()
+            shadow_outputs = self._full([chunks[i] for i in shadow])
+            shadow_seconds = time.perf_counter() - t3
+            for i, out in zip(shadow, shadow_outputs):
+                fast, ref = entity_keys(outputs[i]), entity_keys(out)
+                agreement[0] += len(fast & ref)
+                agreement[1] += len(fast - ref)
+                agreement[2] += len(ref - fast)
+
+        with self._lock:
+            c = self._counts
+            c["chunks"] += len(chunks)
+            c["escalated"] += len(escalate)
+            c["chars"] += sum(len(t) for t in chunks)
+            c["escalated_chars"] += sum(len(chunks[i]) for i in escalate)
+            c["shadow_chunks"] += len(shadow)
+            c["shadow_chars"] += sum(len(chunks[i]) for i in shadow)
+            c["tp"] += agreement[0]
+            c["fp"] += agreement[1]
+            c["fn"] += agreement[2]
+            for i in escalate:
+                self._escalated_by_class[reasons[i]] = self._escalated_by_class.get(reasons[i], 0) + 1
+            self._seconds["first_stage"] += t1 - t0
+            self._seconds["full"] += full_seconds
+            self._seconds["shadow"] += shadow_seconds
+        return outputs
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            c = dict(self._counts)
+            by_class = dict(self._escalated_by_class)
+            first, full, shadow = self._seconds["first_stage"], self._seconds["full"], self._seconds["shadow"]
+        # Full-model-only time, extrapolated from its seconds per character on
+        # the escalated and shadow chunks.
+        measured = c["escalated_chars"] + c["shadow_chars"]
+        full_only = (full + shadow) / measured * c["chars"] if measured else None
+        tp, fp, fn = c["tp"], c["fp"], c["fn"]
+        precision = tp / (tp + fp) if tp + fp else 1.0
+        recall = tp / (tp + fn) if tp + fn else 1.0
+        return {
+            "chunks": c["chunks"],
+            "escalated": c["escalated"],
+            "escalation_rate": c["escalated"] / c["chunks"] if c["chunks"] else 0.0,
+            "escalated_by_class": by_class,
+            "first_stage_s": first,
+            "full_s": full,
+            "est_full_only_s": full_only,
+            "est_saved_fraction": 1 - (first + full) / full_only if full_only else None,
+            "shadow_chunks": c["shadow_chunks"],
+            "agreement": {
+                "precision": precision,
+                "recall": recall,
+                "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            },
+        }
@@ -0,0 +1,84 @@
+"""
+check_decoding.py
+─────────────────
+Regression checks for the word and span boundaries of decoding.py, on inputs
+where offsets alone mislead: multi-line indicator lists (newline tokens sit
+flush against their neighbours) and whitespace-only or double-spaced text
+(whitespace tokens with zero-width offsets).
+
+The checks do not depend on what the model predicts: decode() is fed label
+probabilities that tag every token with one entity type, so each line of a
+list must come out as its own entity, and no entity may be empty. The
+model's real predictions are checked for empty entities too, and _cut() for
+pieces that start mid-word. Exits non-zero on failure, for use in CI.
+
+Run with:
+    python app/check_decoding.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+
+import numpy as np
+
+from config import MODEL_PATH
+from decoding import TokenClassifier, encode_spans
+
+INDICATOR_LIST = "APT28\nMimikatz\n10.0.0.1\r\nevil-domain.com\n\n  CVE-2017-0199\t\tcmd.exe"
+WHITESPACE_INPUTS = ("   ", "\n\n", "a  b", "APT28 \n\n  Mimikatz  ")
+
+
+def _tag_all(clf: TokenClassifier, text: str) -> list[dict]:
+    """decode() of *text* with every token labelled as the first entity type (no B- tags)."""
+    enc = clf.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+    n = len(enc["input_ids"])
+    label = next(i for i in range(len(clf._label_type)) if clf._label_type[i] >= 0 and not clf._label_begin[i])
+    probs = np.zeros((1, n, len(clf._label_type)), dtype=np.float32)
+    probs[0, :, label] = 1.0
+    offsets = np.asarray(enc["offset_mapping"], dtype=np.int64).reshape(1, n, 2)
+    return clf.decode([text], probs, offsets, np.ones((1, n), dtype=bool))[0]
+
+
+def _lines(text: str) -> list[str]:
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def check(clf: TokenClassifier) -> list[str]:
+    failures = []
+    for text in (INDICATOR_LIST, *WHITESPACE_INPUTS):
+        tagged = [e["word"] for e in _tag_all(clf, text)]
+        if tagged != _lines(text):
+            failures.append(f"{text!r} tagged: {tagged} != {_lines(text)}")
+        empty = [e for e in clf(text) if e["start"] >= e["end"] or not e["word"].strip()]
+        if empty:
+            failures.append(f"{text!r} predicted empty entities: {empty}")
+
+    # No indicator of the list is longer than 7 tokens, so no piece may start mid-word.
+    text = "\n".join([INDICATOR_LIST] * 20)
+    spans, _ = encode_spans(clf.tokenizer, text, [(0, len(text))], 7)
+    for start, _ in spans[1:]:
+        if not text[start - 1].isspace() and not text[start].isspace():
+            failures.append(f"_cut split a word: {text[start - 8:start]!r} | {text[start:start + 8]!r}")
+    gaps = [text[e:s] for (_, e), (s, _) in zip(spans, spans[1:])]
+    if any(gap.strip() for gap in gaps) or "".join(text[s:e] for s, e in spans).split() != text.split():
+        failures.append("_cut pieces lose or repeat text")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Word and span boundary checks for vectorised decoding.")
+    parser.add_argument("--model", default=MODEL_PATH)
+    args = parser.parse_args()
+
+    failures = check(TokenClassifier(args.model, device="cpu"))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print("decoding boundaries: ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+check_frontend_imports.py
+─────────────────────────
+Guards the Streamlit frontend's import path: importing the modules app.py uses
+must not load torch or transformers, and must stay within a time and memory
+budget. Each run starts a fresh interpreter, so modules already imported here
+do not hide a regression. Exits non-zero on failure, for use in CI.
+
+Run with:
+    python app/check_frontend_imports.py --max-seconds 2 --max-rss-mb 250
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+FRONTEND_MODULES = ("config", "styles", "ner_service", "entity_processor", "charts", "components")
+HEAVY_MODULES = ("torch", "transformers")
+
+_PROBE = """
+import importlib, json, resource, sys, time
+t0 = time.perf_counter()
+for name in {modules!r}:
+    importlib.import_module(name)
+seconds = time.perf_counter() - t0
+print(json.dumps({{
+    "seconds": seconds,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def measure(modules: tuple[str, ...] = FRONTEND_MODULES) -> dict:
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(modules=modules, heavy=HEAVY_MODULES)],
+        cwd=app_dir,
+        env={**os.environ, "PYTHONPATH": app_dir},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check that the frontend imports no ML libraries.")
+    parser.add_argument("--max-seconds", type=float, default=3.0)
+    parser.add_argument("--max-rss-mb", type=float, default=300.0)
+    args = parser.parse_args()
+
+    r = measure()
+    print(f"import time: {r['seconds']:.2f}s   peak RSS: {r['rss_mb']:.0f} MB   heavy modules: {r['heavy'] or 'none'}")
+    failures = []
+    if r["heavy"]:
+        failures.append(f"frontend import loaded {', '.join(r['heavy'])}")
+    if r["seconds"] > args.max_seconds:
+        failures.append(f"import took {r['seconds']:.2f}s > {args.max_seconds}s")
+    if r["rss_mb"] > args.max_rss_mb:
+        failures.append(f"peak RSS {r['rss_mb']:.0f} MB > {args.max_rss_mb} MB")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ config.py
 Single source of truth for all application-level constants.
 
 To add a new entity class: add one entry to ENTITY_META.
-To change the NER model:   update MODEL_PATH.
+To change the NER model:   update MODEL_PATH (or set NER_MODEL_PATH).
 To tweak theming colors:   update BADGE_PALETTE or individual "color" values in ENTITY_META.
 """
 
@@ -22,11 +22,146 @@ if not os.path.exists(MODEL_PATH):
     # Fallback for older local structure if needed
     MODEL_PATH = os.path.join(os.path.dirname(__file__), "SecureBert-NER")
 
+# Serve a different model directory, e.g. the distilled student produced by
+# Analysis/distill.py (NER/SecureBert-NER-fast).
+MODEL_PATH = os.getenv("NER_MODEL_PATH", MODEL_PATH)
+
+# ── Model replicas ─────────────────────────────────────────────────────────────
+# NER_REPLICAS > 1 serves the model from a pool of processes, each pinned to its
+# own cores with NER_THREADS_PER_REPLICA intra-op threads (0 = cores / replicas).
+# Find a good split with: python app/replica_pool.py <reports dir>
+REPLICAS: int = int(os.getenv("NER_REPLICAS", "1"))
+THREADS_PER_REPLICA: int = int(os.getenv("NER_THREADS_PER_REPLICA", "0"))
+
+# ── Model ensemble ─────────────────────────────────────────────────────────────
+# POST /extract/ensemble runs every model in ENSEMBLE_MODELS on the same chunks,
+# each in its own process pinned to ENSEMBLE_THREADS cores (0 = cores / models /
+# pre-forked workers), and merges their entities. "union" keeps every entity;
+# "vote" keeps entities found by ENSEMBLE_MIN_VOTES models (or by all models
+# able to predict the label).
+CYNER_MODEL_PATH: str = os.getenv("CYNER_MODEL_PATH", os.path.join(_ROOT_DIR, "NER", "CyNER"))
+ENSEMBLE_MODELS: dict[str, str] = {"CyNER": CYNER_MODEL_PATH, "SecureBERT": MODEL_PATH}
+ENSEMBLE_THREADS: int = int(os.getenv("ENSEMBLE_THREADS", "0"))
+ENSEMBLE_POLICY: str = os.getenv("ENSEMBLE_POLICY", "union")
+ENSEMBLE_MIN_VOTES: int = int(os.getenv("ENSEMBLE_MIN_VOTES", "2"))
+
+# Harmonises model labels (as in Analysis/comparison_v3.ipynb): model label →
+# shared DNRTI labels. A label mapping to several shared labels takes the one
+# another model agrees on; a label with no shared equivalent ([] or absent)
+# keeps its own name.
+LABEL_MAP: dict[str, list[str]] = {
+    # SecureBERT mappings
+    "ACT": ["OffAct", "Way"],
+    "APT": ["HackOrg"],
+    "EMAIL": [],
+    "DOM": [],
+    "ENCR": [],
+    "FILE": ["SamFile"],
+    "IDTY": ["Idus", "Org"],
+    "IP": [],
+    "LOC": ["Area"],
+    "MAL": ["Tool"],
+    "MD5": [],
+    "OS": [],
+    "PROT": [],
+    "SECTEAM": ["SecTeam"],
+    "SHA2": [],
+    "TIME": ["Time"],
+    "TOOL": ["Tool"],
+    "VULID": ["Exp"],
+    "VULNAME": ["Exp"],
+
+    # CyNER mappings
+    "Malware": ["Tool"],
+    "Organization": ["HackOrg", "SecTeam"],
+    "System": ["Tool"],
+    "Vulnerability": ["Exp"],
+    "Indicator": [],
+}
+
+# ── Chunk scheduling ───────────────────────────────────────────────────────────
+# How chunks from concurrent requests share the model: "fair" (weighted fair
+# queuing per client), "srpt" (least remaining work first), "priority" (strict
+# by class weight) or "fifo". Requests pick a class with the X-Priority header;
+# weights are "class=weight" pairs, unknown classes weigh 1.
+SCHED_POLICY: str = os.getenv("SCHED_POLICY", "fair")
+SCHED_WEIGHTS: dict[str, float] = {
+    name.strip(): float(weight)
+    for name, _, weight in (
+        pair.partition("=")
+        for pair in os.getenv("SCHED_WEIGHTS", "interactive=4,default=2,bulk=1").split(",")
+        if pair.strip()
+    )
+}
+
+# ── Async jobs ─────────────────────────────────────────────────────────────────
+# POST /jobs queues extractions in this sqlite file; JOB_WORKERS threads per
+# server process run them in the background.
+JOBS_DB: str = os.getenv("JOBS_DB", os.path.join(_ROOT_DIR, "jobs.sqlite3"))
+JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "1"))
+# The frontend submits documents of at least this many chunks as a job.
+REMOTE_JOB_MIN_CHUNKS: int = int(os.getenv("REMOTE_JOB_MIN_CHUNKS", "5"))
+
+# ── Request profiling ──────────────────────────────────────────────────────────
+# A request is profiled when it sends X-Profile: 1 with X-Admin-Token equal to
+# PROFILE_ADMIN_TOKEN (unset = no admin access), or at random with probability
+# PROFILE_SAMPLE_RATE. The last PROFILE_KEEP profiles are kept in PROFILE_DIR.
+PROFILE_ADMIN_TOKEN: str = os.getenv("PROFILE_ADMIN_TOKEN", "")
+PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR: str = os.getenv("PROFILE_DIR", os.path.join(_ROOT_DIR, "profiles"))
+PROFILE_KEEP: int = int(os.getenv("PROFILE_KEEP", "50"))
+
 # ── Text chunking ──────────────────────────────────────────────────────────────
 # Conservative character limit per chunk so that the model's 512-token window
 # is never exceeded (assumes ~3–4 chars per token on average).
 MAX_CHUNK_CHARS: int = 1800
 
+# ── Sequence packing ───────────────────────────────────────────────────────────
+# Opt-in: short chunks (alerts, single sentences) share 512-position model
+# windows, kept apart by a block-diagonal attention mask, instead of each
+# being padded to the longest chunk of its batch.
+DECODE_PACK: bool = os.getenv("DECODE_PACK", "0") == "1"
+
+# ── IOC fast path ──────────────────────────────────────────────────────────────
+# When enabled, structured indicators (IP, hashes, URL, EMAIL, DOM, VULID) are
+# matched with compiled patterns and override the model for those spans.
+IOC_FAST_PATH: bool = os.getenv("IOC_FAST_PATH", "1") != "0"
+
+# ── Near-duplicate chunk reuse ─────────────────────────────────────────────────
+# Opt-in: chunks whose estimated Jaccard similarity to an already processed
+# chunk reaches the threshold only re-run the model on their changed parts.
+NEAR_DUP_CACHE: bool = os.getenv("NEAR_DUP_CACHE", "0") == "1"
+NEAR_DUP_THRESHOLD: float = float(os.getenv("NEAR_DUP_THRESHOLD", "0.8"))
+
+# ── Model cascade ──────────────────────────────────────────────────────────────
+# Opt-in: a cheap first-stage model runs on every chunk, and a chunk goes to the
+# full model only when one of its entities scores below its class threshold
+# (CASCADE_THRESHOLDS, "class=score" pairs, else CASCADE_THRESHOLD).
+# CASCADE_MODEL_PATH is a model directory (default: the distilled student) or
+# "quantized" for an int8 copy of the full model. CASCADE_SHADOW_RATE of the
+# non-escalated chunks also run on the full model, to measure agreement.
+NER_CASCADE: bool = os.getenv("NER_CASCADE", "0") == "1"
+CASCADE_MODEL_PATH: str = os.getenv("CASCADE_MODEL_PATH", os.path.join(_ROOT_DIR, "NER", "SecureBert-NER-fast"))
+CASCADE_THRESHOLD: float = float(os.getenv("CASCADE_THRESHOLD", "0.8"))
+CASCADE_THRESHOLDS: dict[str, float] = {
+    name.strip(): float(score)
+    for name, _, score in (
+        pair.partition("=")
+        for pair in os.getenv("CASCADE_THRESHOLDS", "").split(",")
+        if pair.strip()
+    )
+}
+CASCADE_SHADOW_RATE: float = float(os.getenv("CASCADE_SHADOW_RATE", "0"))
+
+# ── Approximate aggregation ────────────────────────────────────────────────────
+# With AGG_APPROX=1, entity counting uses fixed memory: a count-min sketch per
+# class (overcount ≤ AGG_EPSILON × mentions, with probability 1 − AGG_DELTA)
+# plus the AGG_TOP_K most frequent entities per class.
+AGG_APPROX: bool = os.getenv("AGG_APPROX", "0") == "1"
+AGG_TOP_K: int = int(os.getenv("AGG_TOP_K", "500"))
+AGG_EPSILON: float = float(os.getenv("AGG_EPSILON", "0.001"))
+AGG_DELTA: float = float(os.getenv("AGG_DELTA", "0.01"))
+
 # ── Entity metadata registry ───────────────────────────────────────────────────
 # Each key is the raw entity_group returned by the HuggingFace pipeline.
 # "label"  → human-readable description shown in the UI table.
@@ -0,0 +1,462 @@
+"""
+decoding.py
+───────────
+Token-classification inference with vectorised decoding, replacing the
+HuggingFace pipeline's aggregation_strategy="simple" post-processing.
+
+The pipeline decodes token by token and entity by entity in Python, and it
+rebuilds entity text from BPE pieces. That is where the "Ġ" markers, split
+words ("Turkmen istan") and leaked fragments come from. Here:
+
+  1. a batch of chunks is tokenised once with the fast tokenizer, keeping
+     its offset mapping (or not at all: see encode_spans below);
+  2. softmax and argmax run over the whole logits tensor;
+  3. tokens that cover only whitespace (newlines, runs of spaces) are
+     dropped; the remaining tokens with no gap between their offsets form
+     one word, so "APT28" or "CVE-2017-0199" is a single word but two lines
+     of an indicator list are not; every word takes the label (and score)
+     of its first sub-token, like aggregation_strategy="first";
+  4. consecutive words form a span while the entity type stays the same, no
+     B- tag starts a new one and no line break separates them;
+  5. the entity text is sliced from the source chunk with the span's offsets.
+
+Steps 3 and 4 are NumPy operations over every token of the batch at once.
+The output has the same dict shape as the pipeline:
+(entity_group, score, word, start, end).
+
+With pack=True, short inputs (alerts, evaluation sentences) share model
+windows instead of each getting its own padded row. Each input keeps its own
+[CLS] … [SEP], and its position ids restart at 0. A block-diagonal attention
+mask keeps it from attending to its neighbours, so its logits match
+unpacked inference. They are then split back per input for decoding.
+
+encode_spans() tokenises a whole document in one call and slices each chunk's
+token ids and offsets from that encoding as an EncodedChunk. That is a str,
+so it passes through the scheduler, the cascade and the replica pool
+unchanged. The classifier feeds its ids to the model without tokenising
+again and decodes spans with its offsets. Because the encoding gives the
+token count of every chunk, a chunk that would overflow the model window is
+split at a word boundary instead of being truncated. Plain strings passed to
+the classifier (by the ensemble, for instance) are split the same way.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+import torch
+from transformers import AutoModelForTokenClassification, AutoTokenizer
+
+DECODE_BATCH_SIZE = 8
+
+# Code points for which str.isspace() holds (none lies above U+3000).
+_WHITESPACE = np.array([c for c in range(0x3001) if chr(c).isspace()], dtype=np.uint32)
+_LINE_BREAKS = np.array([ord(c) for c in "\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029"], dtype=np.uint32)
+
+
+def _char_counts(text: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Running counts over *text*: non-whitespace characters and line breaks in
+    text[:k], for k = 0 … len(text).
+    """
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    solid = np.zeros(len(codes) + 1, dtype=np.int64)
+    breaks = np.zeros(len(codes) + 1, dtype=np.int64)
+    np.cumsum(~np.isin(codes, _WHITESPACE), out=solid[1:])
+    np.cumsum(np.isin(codes, _LINE_BREAKS), out=breaks[1:])
+    return solid, breaks
+
+
+# ── Document encoding ─────────────────────────────────────────────────────────
+
+class EncodedChunk(str):
+    """
+    A chunk of a document, carrying its token ids and chunk-relative offsets
+    sliced from the document's encoding by the tokenizer named *vocab*.
+    """
+
+    ids: list[int]
+    offsets: list[tuple[int, int]]
+    vocab: str
+
+
+def encode_spans(
+    tokenizer: Any,
+    text: str,
+    spans: list[tuple[int, int]],
+    max_tokens: int,
+) -> tuple[list[tuple[int, int]], list[EncodedChunk]]:
+    """
+    Encode *text* once and cut it into EncodedChunks along *spans*. A span
+    of more than *max_tokens* tokens is split at the last word boundary that
+    fits (see _cut). Returns the final (start, end) spans and their chunks.
+    """
+    enc = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+    return _cut(text, enc["input_ids"], enc["offset_mapping"], spans, max_tokens, tokenizer.name_or_path)
+
+
+def _cut(
+    text: str,
+    ids: list[int],
+    offsets: list[tuple[int, int]],
+    spans: list[tuple[int, int]],
+    max_tokens: int,
+    vocab: str,
+) -> tuple[list[tuple[int, int]], list[EncodedChunk]]:
+    """
+    EncodedChunks of *text* along *spans*, from the encoding (*ids*,
+    *offsets*) of the whole text. A piece that would exceed *max_tokens* ends
+    before the last token that starts a word, i.e. follows a gap in the
+    offsets or a whitespace token (as in decode), so words and indicators are
+    not cut in half. Only a single word longer than the window is cut
+    mid-word.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64).reshape(-1, 2)
+    starts, ends = offsets[:, 0], offsets[:, 1]
+    solid, _ = _char_counts(text)
+    blank = solid[np.minimum(ends, len(text))] == solid[np.minimum(starts, len(text))]
+    word_start = np.ones(len(ids), dtype=bool)
+    word_start[1:] = (starts[1:] > ends[:-1]) | blank[1:] | blank[:-1]
+
+    out_spans: list[tuple[int, int]] = []
+    chunks: list[EncodedChunk] = []
+    for start, end in spans:
+        # Tokens overlapping the span.
+        lo = int(np.searchsorted(ends, start, "right"))
+        hi = max(lo, int(np.searchsorted(starts, end, "left")))
+        a = lo
+        while True:
+            b = hi
+            if b - a > max_tokens:
+                b = a + max_tokens
+                cuts = np.flatnonzero(word_start[a + 1:b + 1])
+                if len(cuts):
+                    b = a + 1 + int(cuts[-1])
+            s = start if a == lo else int(starts[a])
+            e = end if b >= hi else int(ends[b - 1])
+            chunk = EncodedChunk(text[s:e])
+            chunk.ids = ids[a:b].tolist()
+            chunk.offsets = (np.clip(offsets[a:b], s, e) - s).tolist()
+            chunk.vocab = vocab
+            out_spans.append((s, e))
+            chunks.append(chunk)
+            if b >= hi:
+                break
+            a = b
+    return out_spans, chunks
+
+
+class TokenClassifier:
+    """
+    Callable like a "ner" pipeline: a string gives one entity list, a list
+    of strings gives one entity list per string.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        device: str | None = None,
+        batch_size: int = DECODE_BATCH_SIZE,
+        pack: bool = False,
+    ) -> None:
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        if not self.tokenizer.is_fast:
+            raise ValueError(f"{model_path}: offset-based decoding needs a fast tokenizer")
+        self.model = AutoModelForTokenClassification.from_pretrained(model_path).eval()
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.model.to(self.device)
+        self.batch_size = batch_size
+        self.pack = pack
+        self.max_length = min(self.tokenizer.model_max_length, self.model.config.max_position_embeddings - 2)
+
+        # The special tokens around one sequence, and (for packing) where the
+        # model's position ids start (RoBERTa-style embeddings count from
+        # padding_idx + 1).
+        tok = self.tokenizer
+        self._prefix = [tok.cls_token_id] if tok.cls_token_id is not None else []
+        self._suffix = [tok.sep_token_id] if tok.sep_token_id is not None else []
+        padding_idx = getattr(self.model.base_model.embeddings, "padding_idx", None)
+        self._position_start = padding_idx + 1 if padding_idx is not None else 0
+        self._pad_id = self.tokenizer.pad_token_id or 0
+        self._max_tokens = self.max_length - len(self._prefix) - len(self._suffix)
+
+        # Per label id: entity type index (-1 for "O") and whether it opens a span.
+        # Labels without a B-/I- prefix (e.g. "PROT") continue like I- tags,
+        # as in the pipeline.
+        id2label = self.model.config.id2label
+        self.types: list[str] = []
+        label_type, label_begin = [], []
+        for i in range(len(id2label)):
+            label = id2label[i]
+            name = label[2:] if label[:2] in ("B-", "I-") else label
+            if name == "O":
+                label_type.append(-1)
+            else:
+                if name not in self.types:
+                    self.types.append(name)
+                label_type.append(self.types.index(name))
+            label_begin.append(label.startswith("B-"))
+        self._label_type = np.array(label_type)
+        self._label_begin = np.array(label_begin)
+
+    def __call__(self, texts: str | list[str]) -> Any:
+        if isinstance(texts, str):
+            return self.predict([texts])[0]
+        return self.predict(texts)
+
+    def encode_spans(
+        self, text: str, spans: list[tuple[int, int]]
+    ) -> tuple[list[tuple[int, int]], list[EncodedChunk]]:
+        """encode_spans() with this classifier's tokenizer and window size."""
+        return encode_spans(self.tokenizer, text, spans, self._max_tokens)
+
+    def predict(self, texts: list[str]) -> list[list[dict[str, Any]]]:
+        pieces, owners = self._pieces(texts)
+        if self.pack:
+            outputs = self._predict_packed(pieces)
+        else:
+            outputs = []
+            for i in range(0, len(pieces), self.batch_size):
+                outputs.extend(self._predict_batch(pieces[i:i + self.batch_size]))
+        if len(pieces) == len(texts):
+            return outputs
+        # Some text was split: shift its pieces' entities back onto it.
+        results: list[list[dict[str, Any]]] = [[] for _ in texts]
+        for (i, offset), entities in zip(owners, outputs):
+            for ent in entities:
+                ent["start"] += offset
+                ent["end"] += offset
+            results[i].extend(entities)
+        return results
+
+    # ── Model ─────────────────────────────────────────────────────────────────
+
+    def _pieces(self, texts: list[str]) -> tuple[list[EncodedChunk], list[tuple[int, int]]]:
+        """
+        EncodedChunks of at most one window each, and per piece the index of
+        its text and its offset in it. EncodedChunks from this tokenizer that
+        fit are used as they are. Other texts are tokenised in one batch and,
+        like over-long chunks, cut at word boundaries rather than truncated.
+        """
+        vocab = self.tokenizer.name_or_path
+        plain = [i for i, t in enumerate(texts) if not (isinstance(t, EncodedChunk) and t.vocab == vocab)]
+        encoded: dict[int, tuple[Any, Any]] = {}
+        if plain:
+            enc = self.tokenizer(
+                [str(texts[i]) for i in plain],
+                add_special_tokens=False,
+                return_offsets_mapping=True,
+                verbose=False,
+            )
+            encoded = dict(zip(plain, zip(enc["input_ids"], enc["offset_mapping"])))
+
+        pieces: list[EncodedChunk] = []
+        owners: list[tuple[int, int]] = []
+        for i, text in enumerate(texts):
+            if i not in encoded and len(text.ids) <= self._max_tokens:
+                pieces.append(text)
+                owners.append((i, 0))
+                continue
+            ids, offsets = encoded[i] if i in encoded else (text.ids, text.offsets)
+            spans, chunks = _cut(str(text), ids, offsets, [(0, len(text))], self._max_tokens, vocab)
+            pieces.extend(chunks)
+            owners.extend((i, start) for start, _ in spans)
+        return pieces, owners
+
+    def _encode(self, chunks: list[EncodedChunk]) -> tuple[list[list[int]], list[list[tuple[int, int]]]]:
+        """Token ids and offsets of chunks from _pieces(), without special tokens."""
+        return [c.ids for c in chunks], [c.offsets for c in chunks]
+
+    def _predict_batch(self, texts: list[EncodedChunk]) -> list[list[dict[str, Any]]]:
+        ids, offsets = self._encode(texts)
+        n_prefix = len(self._prefix)
+        width = max(len(x) for x in ids) + n_prefix + len(self._suffix)
+        input_ids = np.full((len(texts), width), self._pad_id, dtype=np.int64)
+        attention = np.zeros((len(texts), width), dtype=np.int64)
+        offs = np.zeros((len(texts), width, 2), dtype=np.int64)
+        real = np.zeros((len(texts), width), dtype=bool)
+        for r, (x, o) in enumerate(zip(ids, offsets)):
+            row = self._prefix + x + self._suffix
+            input_ids[r, :len(row)] = row
+            attention[r, :len(row)] = 1
+            if x:
+                offs[r, n_prefix:n_prefix + len(x)] = o
+                real[r, n_prefix:n_prefix + len(x)] = True
+        with torch.inference_mode():
+            logits = self.model(
+                input_ids=torch.from_numpy(input_ids).to(self.device),
+                attention_mask=torch.from_numpy(attention).to(self.device),
+            ).logits
+        probs = logits.float().softmax(dim=-1).cpu().numpy()
+        return self.decode(texts, probs, offs, real)
+
+    # ── Packed model windows ──────────────────────────────────────────────────
+
+    def _pack(self, lengths: list[int]) -> list[list[int]]:
+        """First-fit decreasing: input indices per window of max_length positions."""
+        windows: list[list[int]] = []
+        free: list[int] = []
+        for i in sorted(range(len(lengths)), key=lambda i: -lengths[i]):
+            for w, room in enumerate(free):
+                if lengths[i] <= room:
+                    windows[w].append(i)
+                    free[w] -= lengths[i]
+                    break
+            else:
+                windows.append([i])
+                free.append(self.max_length - lengths[i])
+        return windows
+
+    def _predict_packed(self, texts: list[EncodedChunk]) -> list[list[dict[str, Any]]]:
+        if not texts:
+            return []
+        n_special = len(self._prefix) + len(self._suffix)
+        ids, offsets = self._encode(texts)
+        windows = self._pack([len(x) + n_special for x in ids])
+
+        results: list[list[dict[str, Any]]] = [[] for _ in texts]
+        for b in range(0, len(windows), self.batch_size):
+            group = windows[b:b + self.batch_size]
+            for i, entities in zip(
+                [i for window in group for i in window],
+                self._run_packed(group, texts, ids, offsets),
+            ):
+                results[i] = entities
+        return results
+
+    def _run_packed(
+        self,
+        windows: list[list[int]],
+        texts: list[str],
+        ids: list[list[int]],
+        offsets: list[list[tuple[int, int]]],
+    ) -> list[list[dict[str, Any]]]:
+        """Entities for the inputs of *windows*, in window order."""
+        width = max(sum(len(ids[i]) + len(self._prefix) + len(self._suffix) for i in w) for w in windows)
+        input_ids = np.full((len(windows), width), self._pad_id, dtype=np.int64)
+        positions = np.full((len(windows), width), self._position_start - 1, dtype=np.int64)
+        segment = np.full((len(windows), width), -1, dtype=np.int64)
+        placed: list[tuple[int, int, int]] = []  # (input, window, first content position)
+        for w, window in enumerate(windows):
+            at = 0
+            for s, i in enumerate(window):
+                row = self._prefix + ids[i] + self._suffix
+                input_ids[w, at:at + len(row)] = row
+                positions[w, at:at + len(row)] = np.arange(len(row)) + self._position_start
+                segment[w, at:at + len(row)] = s
+                placed.append((i, w, at + len(self._prefix)))
+                at += len(row)
+
+        # Block-diagonal: a token attends only within its own input (padding to padding).
+        seg = torch.from_numpy(segment)
+        mask = (seg[:, :, None] == seg[:, None, :])[:, None]
+        with torch.inference_mode():
+            logits = self.model(
+                input_ids=torch.from_numpy(input_ids).to(self.device),
+                attention_mask=mask.to(self.device),
+                position_ids=torch.from_numpy(positions).to(self.device),
+            ).logits
+        window_probs = logits.float().softmax(dim=-1).cpu().numpy()
+
+        # Back to one row per input, as decode() expects.
+        longest = max(len(ids[i]) for i, _, _ in placed) or 1
+        probs = np.zeros((len(placed), longest, window_probs.shape[-1]), dtype=window_probs.dtype)
+        offs = np.zeros((len(placed), longest, 2), dtype=np.int64)
+        real = np.zeros((len(placed), longest), dtype=bool)
+        for r, (i, w, at) in enumerate(placed):
+            n = len(ids[i])
+            if n:
+                probs[r, :n] = window_probs[w, at:at + n]
+                offs[r, :n] = offsets[i]
+                real[r, :n] = True
+        return self.decode([texts[i] for i, _, _ in placed], probs, offs, real)
+
+    # ── Decoding ──────────────────────────────────────────────────────────────
+
+    def decode(
+        self,
+        texts: list[str],
+        probs: np.ndarray,
+        offsets: np.ndarray,
+        real: np.ndarray,
+    ) -> list[list[dict[str, Any]]]:
+        """
+        Entity spans from label probabilities *probs* (batch × tokens × labels),
+        the offset mapping *offsets* (batch × tokens × 2) and the mask *real*
+        (batch × tokens; False for special and padding tokens).
+        """
+        results: list[list[dict[str, Any]]] = [[] for _ in texts]
+
+        # Every real token of the batch, in order, with the number of
+        # non-whitespace characters it covers and of line breaks before it.
+        seq, tok = np.nonzero(real)
+        start, end = offsets[seq, tok, 0], offsets[seq, tok, 1]
+        solid = np.empty(len(seq), dtype=np.int64)
+        breaks = np.empty((len(seq), 2), dtype=np.int64)
+        bounds = np.searchsorted(seq, np.arange(len(texts) + 1))
+        for s, (a, b) in enumerate(zip(bounds[:-1], bounds[1:])):
+            if a == b:
+                continue
+            text_solid, text_breaks = _char_counts(texts[s])
+            lo, hi = np.minimum(start[a:b], len(texts[s])), np.minimum(end[a:b], len(texts[s]))
+            solid[a:b] = text_solid[hi] - text_solid[lo]
+            breaks[a:b, 0], breaks[a:b, 1] = text_breaks[lo], text_breaks[hi]
+
+        # Tokens covering only whitespace (or nothing) are not part of any word.
+        keep = solid > 0
+        seq, tok, start, end, breaks = seq[keep], tok[keep], start[keep], end[keep], breaks[keep]
+        n = len(seq)
+        if not n:
+            return results
+
+        # Words: runs of tokens of one sequence with no gap between them.
+        same_seq = seq[1:] == seq[:-1]
+        new_word = np.ones(n, dtype=bool)
+        new_word[1:] = ~same_seq | (start[1:] != end[:-1])
+        new_line = np.zeros(n, dtype=bool)
+        new_line[1:] = same_seq & (breaks[1:, 0] > breaks[:-1, 1])
+        first = np.flatnonzero(new_word)
+        last = np.append(first[1:], n) - 1
+
+        first_probs = probs[seq[first], tok[first]]
+        word_label = first_probs.argmax(axis=-1)
+        word_score = first_probs.max(axis=-1)
+        word_seq = seq[first]
+        word_start = start[first]
+        word_end = end[last]
+        word_line = new_line[first]
+
+        # Spans: runs of entity words of one type, broken by B- tags and line breaks.
+        word_type = self._label_type[word_label]
+        is_entity = word_type >= 0
+        opens = is_entity & self._label_begin[word_label]
+        opens[0] = is_entity[0]
+        opens[1:] |= is_entity[1:] & (
+            (word_type[1:] != word_type[:-1]) | (word_seq[1:] != word_seq[:-1]) | word_line[1:]
+        )
+
+        ent = np.flatnonzero(is_entity)
+        if not len(ent):
+            return results
+        span_first = np.flatnonzero(opens[ent])
+        span_last = np.append(span_first[1:], len(ent)) - 1
+        span_score = np.add.reduceat(word_score[ent], span_first) / (span_last - span_first + 1)
+        span_seq = word_seq[ent[span_first]]
+        span_type = word_type[ent[span_first]]
+        span_start = word_start[ent[span_first]]
+        span_end = word_end[ent[span_last]]
+
+        for s, t, score, start, end in zip(
+            span_seq.tolist(), span_type.tolist(), span_score.tolist(),
+            span_start.tolist(), span_end.tolist(),
+        ):
+            results[s].append({
+                "entity_group": self.types[t],
+                "score": score,
+                "word": texts[s][start:end],
+                "start": start,
+                "end": end,
+            })
+        return results
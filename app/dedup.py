@@ -0,0 +1,221 @@
+"""
+dedup.py
+────────
+Near-duplicate chunk detection so that re-published report sections do not pay
+for full model inference again.
+
+Every processed chunk is summarised by a MinHash signature over word shingles
+and indexed with LSH banding. When a new chunk's estimated Jaccard similarity
+to a stored one reaches the threshold, the two texts are diffed word by word:
+entities inside unchanged stretches are copied over (shifted to their new
+offsets) and only the changed stretches, padded with some context, are sent
+to the model.
+
+Entity offsets stored here are chunk-relative, exactly as the pipeline returns
+them.
+"""
+
+from __future__ import annotations
+
+import difflib
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+import numpy as np
+
+_WORD_RE = re.compile(r"\S+")
+_MERSENNE = (1 << 61) - 1
+
+
+class NearDuplicateCache:
+    """
+    MinHash/LSH index of processed chunks and their model entities.
+
+    *threshold*   minimum estimated Jaccard similarity for reuse
+    *context*     words of unchanged text re-run on each side of a change
+    *max_changed* above this changed fraction the whole chunk is re-run
+    *capacity*    chunks kept before the oldest are evicted
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle: int = 3,
+        context: int = 12,
+        max_changed: float = 0.5,
+        capacity: int = 10_000,
+        seed: int = 1,
+    ) -> None:
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self._rows = num_perm // bands
+        self._bands = bands
+        self._shingle = shingle
+        self._context = context
+        self._max_changed = max_changed
+        self._capacity = capacity
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _MERSENNE, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE, size=num_perm, dtype=np.uint64)
+
+        self._entries: OrderedDict[int, tuple[str, np.ndarray, list[dict[str, Any]]]] = OrderedDict()
+        self._buckets: dict[tuple[int, bytes], list[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stats = {"chunks": 0, "exact": 0, "near": 0, "chars": 0, "chars_inferred": 0}
+
+    # ── MinHash / LSH ─────────────────────────────────────────────────────────
+
+    def _signature(self, words: list[str]) -> np.ndarray:
+        k = self._shingle
+        shingles = {" ".join(words[i:i + k]) for i in range(max(1, len(words) - k + 1))}
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles)
+        )
+        # (a·h + b) mod p per permutation; uint64 wrap-around is fine for hashing.
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % np.uint64(_MERSENNE)
+        return permuted.min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> list[tuple[int, bytes]]:
+        r = self._rows
+        return [(band, signature[band * r:(band + 1) * r].tobytes()) for band in range(self._bands)]
+
+    def _best_match(self, signature: np.ndarray) -> tuple[int | None, float]:
+        candidates: set[int] = set()
+        for key in self._band_keys(signature):
+            candidates.update(self._buckets.get(key, ()))
+        best, best_sim = None, 0.0
+        for cid in candidates:
+            sim = float(np.mean(self._entries[cid][1] == signature))
+            if sim > best_sim:
+                best, best_sim = cid, sim
+        return best, best_sim
+
+    def _store(self, text: str, signature: np.ndarray, entities: list[dict[str, Any]]) -> None:
+        cid = self._next_id
+        self._next_id += 1
+        self._entries[cid] = (text, signature, [dict(e) for e in entities])
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(cid)
+        while len(self._entries) > self._capacity:
+            old_id, (_, old_sig, _) = self._entries.popitem(last=False)
+            for key in self._band_keys(old_sig):
+                bucket = self._buckets.get(key)
+                if bucket:
+                    bucket.remove(old_id)
+                    if not bucket:
+                        del self._buckets[key]
+
+    # ── Diff-based reuse ──────────────────────────────────────────────────────
+
+    def _reuse(
+        self,
+        old_text: str,
+        old_entities: list[dict[str, Any]],
+        new_text: str,
+        predict: Callable[[str], list[dict[str, Any]]],
+    ) -> tuple[list[dict[str, Any]], int] | None:
+        """Entities for *new_text* from *old_text*'s, re-running only changes."""
+        old_words = list(_WORD_RE.finditer(old_text))
+        new_words = list(_WORD_RE.finditer(new_text))
+        matcher = difflib.SequenceMatcher(
+            None, [w.group() for w in old_words], [w.group() for w in new_words], autojunk=False
+        )
+
+        # Unchanged character stretches: (old_start, old_end, shift to new offsets)
+        same: list[tuple[int, int, int]] = []
+        covered = [False] * len(new_words)
+        for i, j, n in matcher.get_matching_blocks():
+            if n == 0:
+                continue
+            os_, oe = old_words[i].start(), old_words[i + n - 1].end()
+            ns, ne = new_words[j].start(), new_words[j + n - 1].end()
+            if old_text[os_:oe] != new_text[ns:ne]:
+                continue  # same words, different spacing: treat as changed
+            same.append((os_, oe, ns - os_))
+            covered[j:j + n] = [True] * n
+
+        changed = [j for j, c in enumerate(covered) if not c]
+        if len(changed) > self._max_changed * max(1, len(new_words)):
+            return None
+
+        # Windows of new text to re-run: each changed word ± context, merged.
+        windows: list[list[int]] = []
+        for j in changed:
+            lo, hi = max(0, j - self._context), min(len(new_words), j + self._context + 1)
+            if windows and lo <= windows[-1][1]:
+                windows[-1][1] = max(windows[-1][1], hi)
+            else:
+                windows.append([lo, hi])
+        spans = [(new_words[lo].start(), new_words[hi - 1].end()) for lo, hi in windows]
+
+        entities: list[dict[str, Any]] = []
+        for ent in old_entities:
+            s, e = ent.get("start", 0), ent.get("end", 0)
+            for os_, oe, shift in same:
+                if os_ <= s and e <= oe:
+                    ns, ne = s + shift, e + shift
+                    if not any(ws < ne and ns < we for ws, we in spans):
+                        entities.append({**ent, "start": ns, "end": ne})
+                    break
+
+        inferred = 0
+        for ws, we in spans:
+            inferred += we - ws
+            for ent in predict(new_text[ws:we]):
+                entities.append({**ent, "start": ent.get("start", 0) + ws, "end": ent.get("end", 0) + ws})
+
+        entities.sort(key=lambda e: e.get("start", 0))
+        return entities, inferred
+
+    # ── Public API ────────────────────────────────────────────────────────────
+
+    def run(self, text: str, predict: Callable[[str], list[dict[str, Any]]]) -> list[dict[str, Any]]:
+        """
+        Return model entities for chunk *text*, calling *predict* only on the
+        parts that are not near-duplicates of previously seen chunks.
+        """
+        words = _WORD_RE.findall(text)
+        signature = self._signature(words)
+        with self._lock:
+            match_id, sim = self._best_match(signature)
+            match = self._entries.get(match_id) if sim >= self.threshold else None
+
+        result = None
+        inferred = len(text)
+        if match is not None:
+            old_text, _, old_entities = match
+            if old_text == text:
+                result, inferred = [dict(e) for e in old_entities], 0
+            else:
+                reused = self._reuse(old_text, old_entities, text, predict)
+                if reused is not None:
+                    result, inferred = reused
+        if result is None:
+            result = predict(text)
+
+        with self._lock:
+            self._stats["chunks"] += 1
+            self._stats["chars"] += len(text)
+            self._stats["chars_inferred"] += inferred
+            if match is not None and inferred == 0:
+                self._stats["exact"] += 1
+            elif match is not None and inferred < len(text):
+                self._stats["near"] += 1
+            self._store(text, signature, result)
+        return result
+
+    def stats(self) -> dict[str, float]:
+        """Hit counts and the share of characters that skipped inference."""
+        with self._lock:
+            s = dict(self._stats)
+        s["skip_rate"] = 1 - s["chars_inferred"] / s["chars"] if s["chars"] else 0.0
+        return s
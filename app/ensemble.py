@@ -0,0 +1,240 @@
+"""
+ensemble.py
+───────────
+Runs several NER models (CyNER and SecureBERT by default) on the same report
+and merges their entities.
+
+The text is chunked once. Every chunk goes to every model at the same time,
+and each model runs in its own replica process pinned to its own cores, so a
+request takes about as long as the slowest model instead of the sum of all
+of them.
+
+Merging works on document offsets. Entities from different models whose spans
+overlap form a cluster. Each entity's label is harmonised through LABEL_MAP.
+If a model label maps to several shared labels, the one another model in the
+cluster agrees on wins. Each resulting label is then kept according to the
+policy:
+
+  union  every label found by any model
+  vote   labels found by at least *min_votes* models; a label only some
+         models can predict needs all of those (as in the notebook's
+         config-aware evaluation)
+
+A merged entity takes the span of its highest-scoring source entity, and the
+mean of the models' best scores as its score. It also lists the models that
+found it.
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, wait
+from typing import Any
+
+from cancellation import CANCEL_STATS, Cancelled, CancelToken
+from config import ENSEMBLE_MIN_VOTES, ENSEMBLE_MODELS, ENSEMBLE_POLICY, ENSEMBLE_THREADS, LABEL_MAP
+from ner_service import NERProvider, _chunk_spans, _rebase
+from replica_pool import ReplicaPool, available_cores, worker_slot
+
+POLICIES = ("union", "vote")
+
+
+# ── Label harmonisation ────────────────────────────────────────────────────────
+
+def map_label(label: str, label_map: dict[str, list[str]] = LABEL_MAP) -> list[str]:
+    """Shared labels for a model label; the label itself if it has none."""
+    return label_map.get(label) or [label]
+
+
+def model_labels(model_path: str, label_map: dict[str, list[str]] = LABEL_MAP) -> set[str]:
+    """Shared labels a model can predict, from its config.json id2label."""
+    from transformers import AutoConfig
+
+    labels: set[str] = set()
+    for label in AutoConfig.from_pretrained(model_path).id2label.values():
+        if label != "O":
+            labels.update(map_label(label[2:] if label[:2] in ("B-", "I-") else label, label_map))
+    return labels
+
+
+# ── Merging ────────────────────────────────────────────────────────────────────
+
+def _clusters(entities: list[tuple[str, dict[str, Any]]]) -> list[list[tuple[str, dict[str, Any]]]]:
+    """Group (model, entity) pairs whose spans overlap, transitively."""
+    clusters: list[list[tuple[str, dict[str, Any]]]] = []
+    end = -1
+    for item in sorted(entities, key=lambda x: x[1].get("start", 0)):
+        if clusters and item[1].get("start", 0) < end:
+            clusters[-1].append(item)
+            end = max(end, item[1].get("end", 0))
+        else:
+            clusters.append([item])
+            end = item[1].get("end", 0)
+    return clusters
+
+
+def combine(
+    text: str,
+    results: dict[str, list[dict[str, Any]]],
+    policy: str = ENSEMBLE_POLICY,
+    min_votes: int = ENSEMBLE_MIN_VOTES,
+    supported: dict[str, set[str]] | None = None,
+    label_map: dict[str, list[str]] = LABEL_MAP,
+) -> list[dict[str, Any]]:
+    """
+    Merge per-model entity lists (*results*: model name → entities with
+    document offsets into *text*). *supported* maps each model to the shared
+    labels it can predict; without it, every model counts for every label.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown ensemble policy {policy!r}; expected one of {POLICIES}")
+    models = list(results)
+    pairs = [(model, ent) for model, ents in results.items() for ent in ents]
+
+    merged: list[dict[str, Any]] = []
+    for cluster in _clusters(pairs):
+        candidates = [(model, ent, map_label(ent.get("entity_group", ""), label_map)) for model, ent in cluster]
+        support: dict[str, set[str]] = {}
+        for model, _, labels in candidates:
+            for label in labels:
+                support.setdefault(label, set()).add(model)
+
+        # label → model → best (score, entity) of that model for the label
+        by_label: dict[str, dict[str, tuple[float, dict[str, Any]]]] = {}
+        for model, ent, labels in candidates:
+            label = max(labels, key=lambda l: (len(support[l]), -labels.index(l)))
+            score = float(ent.get("score", 0.0))
+            best = by_label.setdefault(label, {})
+            if model not in best or score > best[model][0]:
+                best[model] = (score, ent)
+
+        for label, best in by_label.items():
+            if policy == "vote":
+                able = [m for m in models if supported is None or label in supported.get(m, ())]
+                if len(best) < min(min_votes, max(1, len(able))):
+                    continue
+            _, top = max(best.values(), key=lambda x: x[0])
+            start, end = top.get("start", 0), top.get("end", 0)
+            merged.append({
+                "entity_group": label,
+                "word": text[start:end],
+                "score": sum(s for s, _ in best.values()) / len(best),
+                "start": start,
+                "end": end,
+                "models": sorted(best),
+            })
+    merged.sort(key=lambda e: (e["start"], e["end"]))
+    return merged
+
+
+# ── Provider ───────────────────────────────────────────────────────────────────
+
+class EnsembleNERProvider(NERProvider):
+    """
+    One ReplicaPool per model in *models* (name → model path), each with
+    *threads* intra-op threads on its own cores (0 = cores / models, shared
+    out among pre-forked server workers). Every worker builds its own pools,
+    on the block of cores given by its worker_slot().
+    """
+
+    def __init__(
+        self,
+        models: dict[str, str] = ENSEMBLE_MODELS,
+        threads: int = ENSEMBLE_THREADS,
+        policy: str = ENSEMBLE_POLICY,
+        min_votes: int = ENSEMBLE_MIN_VOTES,
+        label_map: dict[str, list[str]] = LABEL_MAP,
+    ) -> None:
+        worker, workers = worker_slot()
+        threads = threads or max(1, len(available_cores()) // (len(models) * workers))
+        self.policy = policy
+        self.min_votes = min_votes
+        self.label_map = label_map
+        self.supported = {name: model_labels(path, label_map) for name, path in models.items()}
+        self._pools = {
+            name: ReplicaPool(path, replicas=1, threads=threads, first_core=(worker * len(models) + i) * threads)
+            for i, (name, path) in enumerate(models.items())
+        }
+
+    def extract(
+        self,
+        text: str,
+        on_chunk: Callable[[int, int], None] | None = None,
+        cancel: CancelToken | None = None,
+        policy: str | None = None,
+        min_votes: int | None = None,
+    ) -> list[dict[str, Any]]:
+        """Merged entities of all models, with document offsets and a "models" list each."""
+        return self.extract_timed(text, on_chunk, cancel, policy, min_votes)[0]
+
+    def extract_timed(
+        self,
+        text: str,
+        on_chunk: Callable[[int, int], None] | None = None,
+        cancel: CancelToken | None = None,
+        policy: str | None = None,
+        min_votes: int | None = None,
+    ) -> tuple[list[dict[str, Any]], dict[str, float]]:
+        """
+        As extract(), plus wall times in seconds: per model, until its last
+        chunk finished, and "total" including the merge.
+        """
+        spans = _chunk_spans(text)
+        chunks = [text[s:e] for s, e in spans]
+        t0 = time.perf_counter()
+        timings: dict[str, float] = {}
+
+        def _finished(name: str) -> Callable[[Future], None]:
+            def record(_: Future) -> None:
+                timings[name] = max(timings.get(name, 0.0), time.perf_counter() - t0)
+            return record
+
+        futures: dict[str, list[Future]] = {}
+        for name, pool in self._pools.items():
+            futures[name] = [pool.submit(c) for c in chunks]
+            for fut in futures[name]:
+                fut.add_done_callback(_finished(name))
+
+        results: dict[str, list[dict[str, Any]]] = {name: [] for name in self._pools}
+        done = 0
+        try:
+            for i, (start, _) in enumerate(spans):
+                for name, futs in futures.items():
+                    _wait(futs[i], cancel)
+                    try:
+                        results[name].extend(_rebase(futs[i].result(), start))
+                    except Exception:
+                        pass
+                done += 1
+                if on_chunk:
+                    on_chunk(done, len(spans))
+        except Cancelled as exc:
+            pending = [f for futs in futures.values() for f in futs[done:]]
+            started = sum(not f.cancel() for f in pending)
+            CANCEL_STATS.request_cancelled(exc.reason, wasted=started, dropped=len(pending) - started)
+            raise
+        finally:
+            CANCEL_STATS.chunk_done(done * len(futures))
+
+        merged = combine(
+            text,
+            results,
+            policy or self.policy,
+            min_votes or self.min_votes,
+            self.supported,
+            self.label_map,
+        )
+        timings["total"] = time.perf_counter() - t0
+        return merged, timings
+
+    def close(self) -> None:
+        for pool in self._pools.values():
+            pool.close()
+
+
+def _wait(fut: Future, cancel: CancelToken | None) -> None:
+    while cancel is not None:
+        cancel.check()
+        if wait([fut], timeout=0.1).done:
+            return
@@ -3,20 +3,33 @@ entity_processor.py
 ────────────────────
 Pure data-transformation layer: converts raw NER output into a structured
 DataFrame and provides filtering utilities.
+
+aggregate() counts every (class, entity) pair exactly. For corpus-scale
+ingestion, where the tail of unique hashes, URLs and IPs grows without bound,
+EntityCounter (aggregate(..., approximate=True)) keeps memory fixed: a
+count-min sketch per class plus the top-k entities per class (see
+"Approximate counting" below).
 """
 
 from __future__ import annotations
 
+import hashlib
+import heapq
+import itertools
+import math
 import re
+from array import array
 from collections import defaultdict
+from collections.abc import Iterator
 from typing import Any
 
 import pandas as pd
 
-from config import ENTITY_META
+from config import AGG_APPROX, AGG_DELTA, AGG_EPSILON, AGG_TOP_K, ENTITY_META
 
 _MIN_ENTITY_LENGTH = 2
 _MERGE_GAP = 3
+_COLUMNS = ["Class", "Description", "Entity", "Count"]
 
 # Entities whose class implies no internal spaces (IDs, hashes, filenames).
 _COLLAPSE_SPACE_CLASSES = {"VULID", "SHA1", "SHA2", "MD5", "FILE", "URL", "EMAIL", "IP", "DOM"}
@@ -39,7 +52,8 @@ _IOB_TAG_RE = re.compile(
 def _merge_adjacent(raw_entities: list[dict[str, Any]]) -> list[dict[str, Any]]:
     """
     Merge consecutive raw entity dicts that share the same entity_group and
-    whose character spans are adjacent.
+    whose character spans are adjacent. Offsets must be document-level (as the
+    providers return them), so that spans from different chunks compare.
     """
     if not raw_entities:
         return []
@@ -153,23 +167,204 @@ def _is_valid(word: str) -> bool:
     return True
 
 
+def _mentions(raw_entities: list[dict[str, Any]]) -> Iterator[tuple[str, str]]:
+    """(class, cleaned word) for every valid mention, after merging adjacent spans."""
+    for ent in _merge_adjacent(raw_entities):
+        group = ent.get("entity_group", "")
+        word = _clean_word(ent.get("word", ""), group)
+        if group and _is_valid(word):
+            yield group, word
+
+
+def _row(cls: str, entity: str, count: int) -> dict[str, Any]:
+    return {
+        "Class":       cls,
+        "Description": ENTITY_META.get(cls, {}).get("label", cls),
+        "Entity":      entity,
+        "Count":       count,
+    }
+
+
+# ── Approximate counting ───────────────────────────────────────────────────────
+
+class CountMinSketch:
+    """
+    Count-min sketch with conservative update. An estimate never undercounts,
+    and overcounts by at most epsilon × (total count) with probability
+    1 − delta, for width = ⌈e / epsilon⌉ and depth = ⌈ln(1 / delta)⌉.
+    """
+
+    def __init__(self, epsilon: float = AGG_EPSILON, delta: float = AGG_DELTA) -> None:
+        self.width = max(1, math.ceil(math.e / epsilon))
+        self.depth = max(1, math.ceil(math.log(1 / delta)))
+        self._table = array("q", bytes(8 * self.width * self.depth))
+
+    def _cells(self, key: str) -> list[int]:
+        # Double hashing: row i uses h1 + i·h2 from one 128-bit digest.
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [i * self.width + (h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, key: str, n: int = 1) -> int:
+        """Count *key* n more times; returns its new estimate."""
+        return self.raise_to(key, n, add=True)
+
+    def raise_to(self, key: str, count: int, add: bool = False) -> int:
+        """Make *key*'s estimate at least *count* (or its estimate + count, with *add*)."""
+        table = self._table
+        cells = self._cells(key)
+        if add:
+            count += min(table[c] for c in cells)
+        for c in cells:
+            if table[c] < count:
+                table[c] = count
+        return min(table[c] for c in cells)
+
+    def estimate(self, key: str) -> int:
+        return min(self._table[c] for c in self._cells(key))
+
+    @property
+    def nbytes(self) -> int:
+        return self._table.itemsize * len(self._table)
+
+
+class _Tracked:
+    __slots__ = ("count", "exact", "casings", "seq")
+
+    def __init__(self, count: int, exact: bool, seq: int) -> None:
+        self.count = count
+        self.exact = exact
+        self.casings: dict[str, int] = {}
+        self.seq = seq
+
+
+class _ClassCounter:
+    """Top-k entities of one class on top of a count-min sketch of all of them."""
+
+    def __init__(self, top_k: int, epsilon: float, delta: float) -> None:
+        self.top_k = top_k
+        self.sketch = CountMinSketch(epsilon, delta)
+        self.tracked: dict[str, _Tracked] = {}
+        self.total = 0
+        # One (count, key) per tracked key; counts only grow, so a stale entry
+        # is refreshed when it reaches the top.
+        self._heap: list[tuple[int, str]] = []
+        self._evicted = False
+
+    def _min(self) -> tuple[int, str]:
+        while True:
+            count, key = self._heap[0]
+            entry = self.tracked.get(key)
+            if entry is not None and entry.count == count:
+                return count, key
+            heapq.heappop(self._heap)
+            if entry is not None:
+                heapq.heappush(self._heap, (entry.count, key))
+
+    def add(self, key: str, word: str, seq: int) -> None:
+        # Tracked keys are counted in their entry only; the sketch catches up
+        # when they are evicted.
+        self.total += 1
+        entry = self.tracked.get(key)
+        if entry is None:
+            estimate = self.sketch.add(key)
+            if len(self.tracked) >= self.top_k:
+                lowest, lowest_key = self._min()
+                if estimate <= lowest:
+                    return
+                heapq.heappop(self._heap)
+                self.sketch.raise_to(lowest_key, lowest)
+                del self.tracked[lowest_key]
+                self._evicted = True
+                entry = _Tracked(estimate, False, seq)
+            else:
+                # Until the first eviction every key is tracked from its first
+                # mention, so its count is exact.
+                entry = _Tracked(1 if not self._evicted else estimate, not self._evicted, seq)
+            self.tracked[key] = entry
+            heapq.heappush(self._heap, (entry.count, key))
+        else:
+            entry.count += 1
+        entry.casings[word] = entry.casings.get(word, 0) + 1
+
+
+class EntityCounter:
+    """
+    Memory-bounded aggregation over any number of update() calls: per class,
+    a count-min sketch (*epsilon*, *delta*) of every entity plus the *top_k*
+    heaviest entities. Entities tracked since their first mention have exact
+    counts; the others (promoted from the sketch later) carry the sketch's
+    estimate. to_frame() has the same columns as aggregate() and lists the
+    tracked entities; estimate() answers for any entity.
+    """
+
+    def __init__(self, top_k: int = AGG_TOP_K, epsilon: float = AGG_EPSILON, delta: float = AGG_DELTA) -> None:
+        self.top_k = top_k
+        self.epsilon = epsilon
+        self.delta = delta
+        self._classes: dict[str, _ClassCounter] = {}
+        self._seq = itertools.count()
+
+    def update(self, raw_entities: list[dict[str, Any]]) -> None:
+        for cls, word in _mentions(raw_entities):
+            counter = self._classes.get(cls)
+            if counter is None:
+                counter = self._classes[cls] = _ClassCounter(self.top_k, self.epsilon, self.delta)
+            counter.add(word.lower(), word, next(self._seq))
+
+    def estimate(self, cls: str, entity: str) -> int:
+        counter = self._classes.get(cls)
+        if counter is None:
+            return 0
+        entry = counter.tracked.get(entity.lower())
+        return entry.count if entry is not None else counter.sketch.estimate(entity.lower())
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Top entities per class, most frequent first. df.attrs carries the
+        number of exact rows and of mentions not covered by any row.
+        """
+        entries = [
+            (cls, entry)
+            for cls, counter in self._classes.items()
+            for entry in counter.tracked.values()
+        ]
+        entries.sort(key=lambda x: (-x[1].count, x[1].seq))
+        rows = [_row(cls, max(e.casings, key=e.casings.get), e.count) for cls, e in entries]
+        df = pd.DataFrame(rows, columns=_COLUMNS)
+        df.attrs.update(
+            approximate=True,
+            exact_rows=sum(e.exact for _, e in entries),
+            tail_mentions=sum(c.total for c in self._classes.values()) - sum(e.count for _, e in entries),
+        )
+        return df
+
+    @property
+    def nbytes(self) -> int:
+        """Sketch memory; the tracked entries add at most top_k entries per class."""
+        return sum(c.sketch.nbytes for c in self._classes.values())
+
+
 # ── Public API ─────────────────────────────────────────────────────────────────
 
-def aggregate(raw_entities: list[dict[str, Any]]) -> pd.DataFrame:
+def aggregate(raw_entities: list[dict[str, Any]], approximate: bool = AGG_APPROX) -> pd.DataFrame:
     """
     Merge adjacent spans, clean entity text, then collapse into a
     deduplicated summary DataFrame with one row per (class, entity) pair.
     Case-insensitive deduplication: keeps the most common casing.
+
+    With *approximate*, counting goes through an EntityCounter: bounded
+    memory, only the top AGG_TOP_K entities per class are listed.
     """
-    merged = _merge_adjacent(raw_entities)
+    if approximate:
+        counter = EntityCounter()
+        counter.update(raw_entities)
+        return counter.to_frame()
 
     # First pass: count with original casing
     raw_counter: dict[tuple[str, str], int] = defaultdict(int)
-    for ent in merged:
-        group = ent.get("entity_group", "")
-        word = _clean_word(ent.get("word", ""), group)
-        if group and _is_valid(word):
-            raw_counter[(group, word)] += 1
+    for group, word in _mentions(raw_entities):
+        raw_counter[(group, word)] += 1
 
     # Second pass: case-insensitive merge (keep the casing with highest count)
     canonical: dict[tuple[str, str], str] = {}  # (class, lower) → best casing
@@ -181,15 +376,15 @@ def aggregate(raw_entities: list[dict[str, Any]]) -> pd.DataFrame:
             canonical[key] = word
 
     rows = [
-        {
-            "Class":       cls,
-            "Description": ENTITY_META.get(cls, {}).get("label", cls),
-            "Entity":      canonical[(cls, lower)],
-            "Count":       count,
-        }
+        _row(cls, canonical[(cls, lower)], count)
         for (cls, lower), count in sorted(counter.items(), key=lambda x: -x[1])
     ]
-    return pd.DataFrame(rows, columns=["Class", "Description", "Entity", "Count"])
+    return pd.DataFrame(rows, columns=_COLUMNS)
+
+
+def summary_frame(rows: list[dict[str, Any]]) -> pd.DataFrame:
+    """The aggregate() DataFrame rebuilt from its records, e.g. a backend summary."""
+    return pd.DataFrame(rows, columns=_COLUMNS)
 
 
 def filter_by_query(df: pd.DataFrame, query: str) -> pd.DataFrame:
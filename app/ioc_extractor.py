@@ -0,0 +1,123 @@
+"""
+ioc_extractor.py
+────────────────
+Deterministic fast path for structured indicator-of-compromise (IOC) classes.
+
+IP addresses, hashes, URLs, e-mail addresses, domains and CVE IDs follow fixed
+formats, so a single compiled regex (one named group per class) finds them in
+one left-to-right pass over the text — no tokenisation, no BPE fragments to
+glue back together. Defanged forms ("hxxp://", "1.2.3[.]4", "evil[.]com") are
+recognised too.
+
+Results use the same dict shape as the HuggingFace pipeline so they can be
+merged with model output: for IOC_CLASSES the pattern match wins wherever it
+overlaps a model entity.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any
+
+# Classes handled by the pattern extractor (all keys of ENTITY_META).
+IOC_CLASSES = frozenset({"IP", "MD5", "SHA1", "SHA2", "URL", "EMAIL", "DOM", "VULID"})
+
+_DOT = r"(?:\.|\[\.\]|\(\.\))"
+_OCTET = r"(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)"
+_LABEL = r"[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?"
+# Bare domains need a lowercase TLD, so product names such as "ASP.NET" or
+# "VB.NET" are left to the model. E-mail addresses are unambiguous with their
+# "@", so their TLD may be in any case.
+_TLD = (
+    r"(?:com|net|org|info|biz|gov|edu|mil|int|io|co|me|cc|ws|pw|tk|su|us|uk|de|"
+    r"fr|it|nl|pl|ru|ua|cn|hk|tw|jp|kr|kp|ir|in|br|top|xyz|online|site|club|onion)"
+)
+_TLD_ANY_CASE = f"(?i:{_TLD})"
+
+# A bare "name.tld" whose TLD is also a common file extension ("config.in",
+# "main.cc", "tool.pl", "setup.py") is taken for a file name. It only counts
+# as a domain when defanged or when it has more labels ("evil.co.in").
+_FILE_EXTENSION_TLDS = frozenset({"in", "cc", "pl", "ws", "py", "sh", "so", "md", "rs", "ps", "js", "ts"})
+
+# Alternatives are tried in order at each position, so longer / more specific
+# formats come first (URL before DOM, SHA2 before SHA1 before MD5).
+_IOC_RE = re.compile(
+    rf"(?P<URL>\b(?i:https?|hxxps?|ftp)(?::|\[:\])//[^\s<>\"'`]+)"
+    rf"|(?P<EMAIL>\b[A-Za-z0-9._%+-]+(?:@|\[@\]|\[at\])(?:{_LABEL}{_DOT})+{_TLD_ANY_CASE}\b)"
+    rf"|(?P<IP>(?<![\d.])(?:{_OCTET}{_DOT}){{3}}{_OCTET}(?![\d]|\.\d))"
+    r"|(?P<SHA2>(?<![A-Fa-f0-9])[A-Fa-f0-9]{64}(?![A-Fa-f0-9]))"
+    r"|(?P<SHA1>(?<![A-Fa-f0-9])[A-Fa-f0-9]{40}(?![A-Fa-f0-9]))"
+    r"|(?P<MD5>(?<![A-Fa-f0-9])[A-Fa-f0-9]{32}(?![A-Fa-f0-9]))"
+    r"|(?P<VULID>\b(?i:CVE)-\d{4}-\d{4,}\b|\bMS\d{2}-\d{3}\b)"
+    rf"|(?P<DOM>(?<![\w@.-])(?:{_LABEL}{_DOT})+{_TLD}\b(?![.-]?\w))"
+)
+
+# Every IOC contains a digit or one of ". @ : [". This pre-scan finds the
+# whitespace-delimited words that do, in one linear pass: the lookbehind pins
+# matches to word starts and the possessive quantifiers never backtrack, so
+# ordinary prose words are skipped at regex-engine speed. _IOC_RE then only
+# runs inside those candidate words.
+_CANDIDATE_RE = re.compile(
+    r"(?<![^\s<>\"'`])[^\s<>\"'`.@:\[\d]*+[.@:\[\d][^\s<>\"'`]*+"
+)
+
+# Sentence punctuation that a greedy URL match swallows at the end.
+_URL_TRAILING = ".,;:!?)]}"
+
+
+def extract_iocs(text: str) -> list[dict[str, Any]]:
+    """
+    Return every IOC in *text* as pipeline-style entity dicts
+    (entity_group, word, score, start, end), in document order.
+    """
+    entities: list[dict[str, Any]] = []
+    for candidate in _CANDIDATE_RE.finditer(text):
+        for match in _IOC_RE.finditer(text, *candidate.span()):
+            group = match.lastgroup
+            start, end = match.span()
+            if group == "URL":
+                while end > start and text[end - 1] in _URL_TRAILING:
+                    end -= 1
+            elif group == "DOM" and _looks_like_file(match.group()):
+                continue
+            entities.append({
+                "entity_group": group,
+                "word": text[start:end],
+                "score": 1.0,
+                "start": start,
+                "end": end,
+            })
+    return entities
+
+
+def _looks_like_file(domain: str) -> bool:
+    name, dot, tld = domain.rpartition(".")
+    return bool(dot) and "." not in name and tld in _FILE_EXTENSION_TLDS
+
+
+def merge_iocs(
+    model_entities: list[dict[str, Any]],
+    ioc_entities: list[dict[str, Any]],
+) -> list[dict[str, Any]]:
+    """
+    Combine model output with pattern matches from the same text.
+
+    Any model entity overlapping a pattern match is dropped — the match is
+    authoritative for its span. Model entities elsewhere are kept (including
+    IOC classes the patterns did not catch). Output is sorted by start offset.
+    """
+    if not ioc_entities:
+        return list(model_entities)
+
+    spans = [(e["start"], e["end"]) for e in ioc_entities]
+    kept = []
+    i = 0
+    for ent in sorted(model_entities, key=lambda e: e.get("start", 0)):
+        s, e = ent.get("start", 0), ent.get("end", 0)
+        # Skip pattern spans that end before this entity starts (both lists sorted).
+        while i < len(spans) and spans[i][1] <= s:
+            i += 1
+        # spans[i] is the first match ending after s; if it starts before e they overlap.
+        if not (i < len(spans) and spans[i][0] < e):
+            kept.append(ent)
+    return sorted(kept + list(ioc_entities), key=lambda e: e.get("start", 0))
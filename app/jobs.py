@@ -0,0 +1,230 @@
+"""
+jobs.py
+───────
+Asynchronous extraction jobs backed by a local sqlite queue.
+
+POST /jobs stores the text and returns at once. Background workers claim
+queued jobs, run them through the NER provider and store the raw entities,
+updating progress after every chunk. The queue is a sqlite file, so jobs
+outlive server restarts. A worker holds a lease on its job and a heartbeat
+thread renews it while the job runs, including while its chunks wait in the
+scheduler queue. When a worker dies, its job's lease expires and another
+worker picks the job up, even in another pre-forked process. A job whose
+lease has expired MAX_ATTEMPTS times is marked failed instead of being
+claimed again, so a job that keeps killing its worker is not retried forever.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any
+
+from cancellation import Cancelled, CancelToken
+
+LEASE_SECONDS = 120.0
+HEARTBEAT_SECONDS = LEASE_SECONDS / 4
+MAX_ATTEMPTS = 3
+POLL_SECONDS = 0.5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           TEXT PRIMARY KEY,
+    status       TEXT NOT NULL,          -- queued | running | done | failed | cancelled
+    text         TEXT NOT NULL,
+    ioc_only     INTEGER NOT NULL DEFAULT 0,
+    client       TEXT NOT NULL,
+    priority     TEXT NOT NULL,
+    chunks_done  INTEGER NOT NULL DEFAULT 0,
+    chunks_total INTEGER NOT NULL DEFAULT 0,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    lease_until  REAL,
+    created      REAL NOT NULL,
+    started      REAL,
+    finished     REAL,
+    result       TEXT,
+    error        TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created);
+"""
+
+
+class JobStore:
+    """Persistent job queue in the sqlite file *path*. Safe across threads and processes."""
+
+    def __init__(self, path: str, max_attempts: int = MAX_ATTEMPTS) -> None:
+        self._path = path
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def submit(self, text: str, ioc_only: bool = False, client: str = "default", priority: str = "bulk") -> str:
+        job_id = uuid.uuid4().hex
+        self._conn().execute(
+            "INSERT INTO jobs (id, status, text, ioc_only, client, priority, created) VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+            (job_id, text, int(ioc_only), client, priority, time.time()),
+        )
+        return job_id
+
+    def claim(self) -> sqlite3.Row | None:
+        """
+        Take the oldest queued job, or a running one whose worker's lease
+        expired. Expired jobs that have used up their attempts fail instead.
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished = ?, lease_until = NULL "
+                "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                (f"worker lost {self.max_attempts} times", now, now, self.max_attempts),
+            )
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY created LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, "
+                    "started = COALESCE(started, ?), chunks_done = 0 WHERE id = ?",
+                    (now + LEASE_SECONDS, now, row["id"]),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def progress(self, job_id: str, done: int, total: int) -> None:
+        self._conn().execute(
+            "UPDATE jobs SET chunks_done = ?, chunks_total = ?, lease_until = ? WHERE id = ? AND status = 'running'",
+            (done, total, time.time() + LEASE_SECONDS, job_id),
+        )
+
+    def renew(self, job_id: str) -> bool:
+        """Extend the lease of a running job; False once it is no longer running."""
+        cur = self._conn().execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running'",
+            (time.time() + LEASE_SECONDS, job_id),
+        )
+        return cur.rowcount > 0
+
+    def finish(self, job_id: str, entities: list[dict[str, Any]]) -> None:
+        self._conn().execute(
+            "UPDATE jobs SET status = 'done', result = ?, finished = ?, lease_until = NULL "
+            "WHERE id = ? AND status = 'running'",
+            (json.dumps(entities), time.time(), job_id),
+        )
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._conn().execute(
+            "UPDATE jobs SET status = 'failed', error = ?, finished = ?, lease_until = NULL "
+            "WHERE id = ? AND status = 'running'",
+            (error, time.time(), job_id),
+        )
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; False if it had already ended."""
+        cur = self._conn().execute(
+            "UPDATE jobs SET status = 'cancelled', finished = ?, lease_until = NULL "
+            "WHERE id = ? AND status IN ('queued', 'running')",
+            (time.time(), job_id),
+        )
+        return cur.rowcount > 0
+
+    def status(self, job_id: str) -> str | None:
+        row = self._conn().execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["status"] if row else None
+
+    def get(self, job_id: str) -> dict[str, Any] | None:
+        """Job metadata and, once done, the raw entity list under "entities"."""
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {k: row[k] for k in row.keys() if k not in ("text", "result", "lease_until")}
+        job["ioc_only"] = bool(job["ioc_only"])
+        job["chars"] = len(row["text"])
+        job["entities"] = json.loads(row["result"]) if row["result"] else None
+        return job
+
+
+class JobWorkers:
+    """
+    *workers* threads that claim jobs from *store* and run them through
+    *providers*: a (model provider, IOC-only provider) pair.
+    """
+
+    def __init__(self, store: JobStore, providers: tuple[Any, Any], workers: int = 1) -> None:
+        self._store = store
+        self._providers = providers
+        self._workers = workers
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self) -> None:
+        for _ in range(self._workers):
+            thread = threading.Thread(target=self._loop, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            job = self._store.claim()
+            if job is None:
+                self._stop.wait(POLL_SECONDS)
+                continue
+            self._run(job)
+
+    def _heartbeat(self, job_id: str, done: threading.Event) -> None:
+        while not done.wait(HEARTBEAT_SECONDS) and self._store.renew(job_id):
+            pass
+
+    def _run(self, job: sqlite3.Row) -> None:
+        job_id = job["id"]
+        done = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job_id, done), daemon=True).start()
+        try:
+            self._execute(job)
+        finally:
+            done.set()
+
+    def _execute(self, job: sqlite3.Row) -> None:
+        job_id = job["id"]
+        # DELETE /jobs/{id} marks the row cancelled; the provider sees it between chunks.
+        cancel = CancelToken(probe=lambda: self._store.status(job_id) != "running", probe_reason="cancelled")
+        model, ioc = self._providers
+        try:
+            if job["ioc_only"]:
+                entities = ioc.extract(job["text"], cancel=cancel)
+            else:
+                entities = model.extract(
+                    job["text"],
+                    on_chunk=lambda done, total: self._store.progress(job_id, done, total),
+                    cancel=cancel,
+                    client=job["client"],
+                    priority=job["priority"],
+                )
+        except Cancelled:
+            return
+        except Exception as exc:
+            self._store.fail(job_id, str(exc))
+            return
+        self._store.finish(job_id, [{**e, "score": float(e.get("score", 0.0))} for e in entities])
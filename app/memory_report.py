@@ -0,0 +1,62 @@
+"""
+memory_report.py
+────────────────
+Per-process memory accounting from /proc/<pid>/smaps (Linux only).
+
+Used to check that pre-forked server workers really share the model weights:
+for the mappings that hold the weight buffers, Private_Dirty should stay at 0
+in every worker — any copy-on-write copy of a weight page would show up there.
+"""
+
+from __future__ import annotations
+
+import os
+
+_KB = 1024
+_MB = 1024 * 1024
+
+
+def _read_smaps(pid: int) -> list[tuple[int, int, dict[str, int]]]:
+    """[(start, end, {field: bytes})] for every mapping of *pid*."""
+    mappings: list[tuple[int, int, dict[str, int]]] = []
+    with open(f"/proc/{pid}/smaps", encoding="utf-8") as f:
+        for line in f:
+            head = line.split(None, 1)[0]
+            if "-" in head and not head.endswith(":"):
+                start, end = (int(x, 16) for x in head.split("-"))
+                mappings.append((start, end, {}))
+            elif head.endswith(":") and mappings and line.rstrip().endswith("kB"):
+                mappings[-1][2][head[:-1]] = int(line.split()[1]) * _KB
+    return mappings
+
+
+def _totals(fields: list[dict[str, int]]) -> dict[str, float]:
+    def total(key: str) -> float:
+        return sum(f.get(key, 0) for f in fields) / _MB
+
+    return {
+        "rss_mb": round(total("Rss"), 1),
+        "pss_mb": round(total("Pss"), 1),
+        "shared_mb": round(total("Shared_Clean") + total("Shared_Dirty"), 1),
+        "private_mb": round(total("Private_Clean") + total("Private_Dirty"), 1),
+        "private_dirty_mb": round(total("Private_Dirty"), 1),
+    }
+
+
+def process_memory(pid: int | None = None, weight_ranges: list[tuple[int, int]] | None = None) -> dict:
+    """
+    Memory totals for *pid* (default: this process). When *weight_ranges*
+    [(address, nbytes)] is given, the mappings containing those buffers are
+    also reported separately under "weights".
+    """
+    pid = pid or os.getpid()
+    mappings = _read_smaps(pid)
+    report: dict = {"pid": pid, **_totals([m[2] for m in mappings])}
+    if weight_ranges:
+        hits = [
+            fields
+            for start, end, fields in mappings
+            if any(addr < end and start < addr + size for addr, size in weight_ranges)
+        ]
+        report["weights"] = _totals(hits)
+    return report
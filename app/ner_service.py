@@ -1,13 +1,19 @@
 """
 ner_service.py
 ──────────────
-Defines the NER abstraction layer and provides both Local and Remote implementations.
+Defines the NER abstraction layer, the light providers (IOC-only and Remote)
+and a registry that imports the model-backed providers only when asked for.
+
+Nothing here imports torch or transformers: the Streamlit frontend only needs
+RemoteNERProvider. SecureBertNERProvider lives in securebert_provider.py and is
+loaded by create_provider("securebert") (or ner_service.SecureBertNERProvider).
 
 SOLID notes
 ───────────
-S – Single Responsibility: this module owns only model loading and inference.
-O – Open / Closed: to add a new model (e.g. CyNER), subclass NERProvider and
-    register it — existing code stays untouched.
+S – Single Responsibility: this module owns only the provider contract and
+    the providers that need no model.
+O – Open / Closed: to add a new model (e.g. CyNER), subclass NERProvider in
+    its own module and add it to PROVIDERS — existing code stays untouched.
 L – Liskov Substitution: any NERProvider subclass can replace another without
     the caller noticing.
 D – Dependency Inversion: app.py depends on NERProvider (the abstraction),
@@ -17,15 +23,16 @@ D – Dependency Inversion: app.py depends on NERProvider (the abstraction),
 from __future__ import annotations
 
 import abc
+import importlib
+import time
 from collections.abc import Callable
 from typing import Any
 
-import torch
 import requests
-import streamlit as st
-from transformers import AutoModelForTokenClassification, AutoTokenizer, pipeline
 
-from config import MAX_CHUNK_CHARS, MODEL_PATH, BACKEND_URL
+from config import BACKEND_URL, MAX_CHUNK_CHARS, REMOTE_JOB_MIN_CHUNKS
+from cancellation import Cancelled, CancelToken
+from ioc_extractor import extract_iocs
 
 
 # ── Abstract interface ─────────────────────────────────────────────────────────
@@ -38,6 +45,7 @@ class NERProvider(abc.ABC):
         self,
         text: str,
         on_chunk: Callable[[int, int], None] | None = None,
+        cancel: CancelToken | None = None,
     ) -> list[dict[str, Any]]:
         """
         Run named-entity recognition on *text* and return a list of entity
@@ -48,81 +56,93 @@ class NERProvider(abc.ABC):
 
         *on_chunk(current, total)* is called after each chunk is processed so
         callers can drive a progress bar without knowing about chunking internals.
+
+        *cancel* is checked between chunks; once it fires, the remaining work
+        is dropped and Cancelled is raised.
         """
 
 
 # ── Text chunking helper (shared by any provider that needs it) ────────────────
 
-def _chunk_text(text: str, max_chars: int = MAX_CHUNK_CHARS) -> list[str]:
+def _chunk_spans(text: str, max_chars: int = MAX_CHUNK_CHARS) -> list[tuple[int, int]]:
     """
-    Split *text* into chunks that stay within *max_chars* so that the model's
-    512-token context window is never exceeded.
+    Split *text* into (start, end) spans of at most *max_chars* characters so
+    that the model's 512-token context window is never exceeded. Spans index
+    the original text: nothing is copied, and an offset inside a chunk maps to
+    the document by adding the span's start.
 
-    Strategy: greedily accumulate sentences (split on '. ') until the next
-    sentence would overflow, then start a new chunk.
+    Strategy: greedily accumulate sentences (ending at '. ') until the next
+    sentence would overflow, then start a new span. A sentence longer than
+    *max_chars* on its own is cut at its last whitespace before the limit.
+    One pass over the text.
     """
-    if len(text) <= max_chars:
-        return [text]
+    n = len(text)
+    if n <= max_chars:
+        return [(0, n)]
+
+    spans: list[tuple[int, int]] = []
+    start = pos = 0  # start of the current span; end of its last whole sentence
+    while pos < n:
+        cut = text.find(". ", pos)
+        end = n if cut < 0 else cut + 2
+        if end - start > max_chars:
+            if pos > start:
+                _add_span(text, start, pos, spans)
+                start = pos
+            while end - start > max_chars:
+                limit = start + max_chars
+                split = max(text.rfind(" ", start + 1, limit), text.rfind("\n", start + 1, limit))
+                if split < 0:
+                    split = limit
+                _add_span(text, start, split, spans)
+                start = split
+        pos = end
+    _add_span(text, start, pos, spans)
+
+    return spans or [(0, max_chars)]
+
+
+def _add_span(text: str, start: int, end: int, spans: list[tuple[int, int]]) -> None:
+    """Append [start, end) without its surrounding whitespace, unless nothing is left."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    if start < end:
+        spans.append((start, end))
 
-    chunks: list[str] = []
-    current = ""
-    for sentence in text.replace("\n", " \n ").split(". "):
-        candidate = current + sentence + ". "
-        if len(candidate) <= max_chars:
-            current = candidate
-        else:
-            if current.strip():
-                chunks.append(current.strip())
-            current = sentence + ". "
-    if current.strip():
-        chunks.append(current.strip())
 
-    return chunks or [text[:max_chars]]
+def _chunk_text(text: str, max_chars: int = MAX_CHUNK_CHARS) -> list[str]:
+    """The chunks of _chunk_spans() as strings."""
+    return [text[s:e] for s, e in _chunk_spans(text, max_chars)]
+
 
+def _rebase(entities: list[dict[str, Any]], offset: int) -> list[dict[str, Any]]:
+    """Shift chunk-relative entity offsets by the chunk's *offset* in the document."""
+    if not offset:
+        return entities
+    return [{**e, "start": e.get("start", 0) + offset, "end": e.get("end", 0) + offset} for e in entities]
 
-# ── SecureBERT implementation (Local) ──────────────────────────────────────────
 
-class SecureBertNERProvider(NERProvider):
+# ── IOC-only implementation ────────────────────────────────────────────────────
+
+class IOCNERProvider(NERProvider):
     """
-    NER provider backed by the local SecureBERT-NER model.
-    Used by the backend server.
+    Pattern-only provider for feeds that need indicators (IP, hashes, URL,
+    EMAIL, DOM, VULID) and nothing else. Never loads a model.
     """
 
-    def __init__(self, model_path: str = MODEL_PATH) -> None:
-        self._model_path = model_path
-        self._pipeline = self._load_pipeline()
-
-    def _load_pipeline(self) -> Any:
-        device = 0 if torch.cuda.is_available() else -1
-        tokenizer = AutoTokenizer.from_pretrained(self._model_path)
-        model = AutoModelForTokenClassification.from_pretrained(self._model_path)
-        return pipeline(
-            "ner",
-            model=model,
-            tokenizer=tokenizer,
-            aggregation_strategy="simple",
-            device=device,
-        )
-
     def extract(
         self,
         text: str,
         on_chunk: Callable[[int, int], None] | None = None,
+        cancel: CancelToken | None = None,
     ) -> list[dict[str, Any]]:
-        """
-        Chunk *text* into model-safe pieces, run the pipeline on each, and
-        return the concatenated list of raw entity dicts.
-        """
-        chunks = _chunk_text(text)
-        total = len(chunks)
-        results: list[dict[str, Any]] = []
-        for i, chunk in enumerate(chunks, start=1):
-            try:
-                results.extend(self._pipeline(chunk))
-            except Exception:
-                pass
-            if on_chunk:
-                on_chunk(i, total)
+        if cancel is not None:
+            cancel.check()
+        results = extract_iocs(text)
+        if on_chunk:
+            on_chunk(1, 1)
         return results
 
 
@@ -132,33 +152,191 @@ class RemoteNERProvider(NERProvider):
     """
     NER provider that communicates with a remote FastAPI backend.
     Used by the Streamlit frontend.
+
+    Each request carries its timeout in the X-Request-Timeout header, so the
+    backend stops working on a chunk this client has already given up on, and
+    is marked X-Priority: interactive so it is not stuck behind bulk jobs.
+
+    Documents of at least *job_min_chunks* chunks are submitted as one async
+    job (POST /jobs) and polled instead, so they are not bound by the
+    per-request timeout.
+
+    summarize() asks the backend for the aggregated table instead of the raw
+    mentions, which is all the UI shows.
     """
-    def __init__(self, backend_url: str = BACKEND_URL) -> None:
+    def __init__(
+        self,
+        backend_url: str = BACKEND_URL,
+        ioc_only: bool = False,
+        timeout: float = 60,
+        job_min_chunks: int = REMOTE_JOB_MIN_CHUNKS,
+    ) -> None:
         self._backend_url = backend_url
+        self._ioc_only = ioc_only
+        self._timeout = timeout
+        self._job_min_chunks = job_min_chunks
+
+    def _extract_job(
+        self,
+        text: str,
+        on_chunk: Callable[[int, int], None] | None = None,
+        cancel: CancelToken | None = None,
+        format: str = "raw",
+        poll_seconds: float = 1.0,
+    ) -> dict[str, Any]:
+        """The finished job, with its result in *format* (see GET /jobs/{id})."""
+        response = requests.post(
+            f"{self._backend_url}/jobs",
+            json={"text": text, "ioc_only": self._ioc_only},
+            headers={"X-Priority": "interactive"},
+            timeout=self._timeout,
+        )
+        response.raise_for_status()
+        job_url = f"{self._backend_url}/jobs/{response.json()['id']}"
+        try:
+            while True:
+                if cancel is not None:
+                    cancel.check()
+                job = requests.get(job_url, params={"format": format}, timeout=self._timeout).json()
+                if on_chunk and job["chunks_total"]:
+                    on_chunk(job["chunks_done"], job["chunks_total"])
+                if job["status"] == "done":
+                    return job
+                if job["status"] in ("failed", "cancelled"):
+                    raise RuntimeError(f"Extraction job {job['status']}: {job.get('error') or ''}")
+                time.sleep(poll_seconds)
+        except Cancelled:
+            requests.delete(job_url, timeout=self._timeout)
+            raise
 
     def extract(
         self,
         text: str,
         on_chunk: Callable[[int, int], None] | None = None,
+        cancel: CancelToken | None = None,
     ) -> list[dict[str, Any]]:
-        chunks = _chunk_text(text)
-        total = len(chunks)
+        spans = _chunk_spans(text)
+        total = len(spans)
         results: list[dict[str, Any]] = []
+
+        if total >= self._job_min_chunks:
+            try:
+                return self._extract_job(text, on_chunk, cancel)["entities"]
+            except Cancelled:
+                raise
+            except Exception as e:
+                _show_error(f"Error communicating with backend: {e}")
+                return results
         
-        for i, chunk in enumerate(chunks, start=1):
+        for i, (start, end) in enumerate(spans, start=1):
+            timeout = self._timeout
+            if cancel is not None:
+                cancel.check()
+                remaining = cancel.remaining()
+                if remaining is not None:
+                    timeout = min(timeout, remaining)
             try:
                 response = requests.post(
                     f"{self._backend_url}/extract",
-                    json={"text": chunk},
-                    timeout=60
+                    json={"text": text[start:end], "ioc_only": self._ioc_only},
+                    headers={"X-Request-Timeout": f"{timeout:.3f}", "X-Priority": "interactive"},
+                    timeout=timeout
                 )
                 response.raise_for_status()
-                results.extend(response.json()["entities"])
+                results.extend(_rebase(response.json()["entities"], start))
             except Exception as e:
                 # We use st.error here as it's intended for the Streamlit UI
-                st.error(f"Error communicating with backend: {e}")
+                _show_error(f"Error communicating with backend: {e}")
             
             if on_chunk:
                 on_chunk(i, total)
                 
         return results
+
+
+    def summarize(
+        self,
+        text: str,
+        on_chunk: Callable[[int, int], None] | None = None,
+        cancel: CancelToken | None = None,
+    ) -> dict[str, Any]:
+        """
+        The aggregated result, computed by the backend: {"summary": rows of
+        entity_processor.aggregate, "stats": summary_stats}. The document is
+        sent whole, in one /extract?format=aggregated request or, when long,
+        as a job, so no raw mentions cross the network.
+        """
+        result: dict[str, Any] = {
+            "summary": [],
+            "stats": {"unique_classes": 0, "unique_entities": 0, "total_mentions": 0},
+        }
+        total = len(_chunk_spans(text))
+        try:
+            if total >= self._job_min_chunks:
+                body = self._extract_job(text, on_chunk, cancel, format="aggregated")
+            else:
+                timeout = self._timeout
+                if cancel is not None:
+                    cancel.check()
+                    remaining = cancel.remaining()
+                    if remaining is not None:
+                        timeout = min(timeout, remaining)
+                response = requests.post(
+                    f"{self._backend_url}/extract",
+                    params={"format": "aggregated"},
+                    json={"text": text, "ioc_only": self._ioc_only},
+                    headers={"X-Request-Timeout": f"{timeout:.3f}", "X-Priority": "interactive"},
+                    timeout=timeout,
+                )
+                response.raise_for_status()
+                body = response.json()
+                if on_chunk:
+                    on_chunk(total, total)
+        except Cancelled:
+            raise
+        except Exception as e:
+            _show_error(f"Error communicating with backend: {e}")
+            return result
+        result.update(summary=body["summary"], stats=body["stats"])
+        return result
+
+def _show_error(message: str) -> None:
+    # Streamlit is imported here so that the backend never loads it.
+    import streamlit as st
+
+    st.error(message)
+
+
+# ── Provider registry ──────────────────────────────────────────────────────────
+# name → "module:Class". The module is imported on first use, so a process only
+# pays for the dependencies of the providers it actually creates.
+PROVIDERS: dict[str, str] = {
+    "securebert": "securebert_provider:SecureBertNERProvider",
+    "ensemble":   "ensemble:EnsembleNERProvider",
+    "ioc":        "ner_service:IOCNERProvider",
+    "remote":     "ner_service:RemoteNERProvider",
+}
+
+
+def register_provider(name: str, target: str) -> None:
+    """Register the provider class at *target* ("module:Class") under *name*, without importing it."""
+    PROVIDERS[name] = target
+
+
+def get_provider_class(name: str) -> type[NERProvider]:
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown NER provider {name!r}; expected one of {sorted(PROVIDERS)}")
+    module_name, _, class_name = PROVIDERS[name].partition(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def create_provider(name: str, **kwargs: Any) -> NERProvider:
+    """Instantiate the provider registered as *name*."""
+    return get_provider_class(name)(**kwargs)
+
+
+def __getattr__(name: str) -> Any:
+    # `from ner_service import SecureBertNERProvider` keeps working, lazily.
+    if name == "SecureBertNERProvider":
+        return get_provider_class("securebert")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
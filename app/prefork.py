@@ -0,0 +1,142 @@
+"""
+prefork.py
+──────────
+Pre-fork launcher for the FastAPI backend.
+
+`uvicorn --workers N` starts every worker from scratch, so each one imports
+server.py and loads its own copy of the model weights and tokenizer. Here the
+parent imports server.py once, moves the weights into shared memory, freezes
+the garbage collector's view of the loaded objects, binds the listening socket
+and only then forks N workers. The workers inherit the model pages instead of
+copying them, so each extra worker costs little more than its Python heap.
+
+This does not combine with NER_REPLICAS > 1. The model then lives in replica
+processes that the parent starts with their own queues, and forked workers
+would inherit a pool they cannot use. In that case the launcher serves from
+a single process and ignores --workers.
+
+Each worker gets its index and the worker count in PREFORK_WORKER_INDEX and
+PREFORK_WORKERS (see replica_pool.worker_slot), so replica pools a worker
+starts later, such as the ensemble's, pin themselves to cores no other worker
+uses. A replacement worker takes over the index of the one it replaces.
+
+Run with:
+    python app/prefork.py --workers 4 --port 8000 --memory-report 60
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from config import REPLICAS
+from memory_report import process_memory
+
+
+def _serve(sock: socket.socket, threads: int | None) -> None:
+    """Worker body: run uvicorn on the inherited socket."""
+    import torch
+
+    import server
+
+    if threads:
+        torch.set_num_threads(threads)
+    config = uvicorn.Config(server.app, log_level="info")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn(sock: socket.socket, threads: int | None, index: int, count: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        os.environ["PREFORK_WORKER_INDEX"] = str(index)
+        os.environ["PREFORK_WORKERS"] = str(count)
+        try:
+            _serve(sock, threads)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the NER API from pre-forked workers sharing one model.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS", "1")))
+    parser.add_argument("--threads", type=int, default=None, help="Torch intra-op threads per worker")
+    parser.add_argument("--memory-report", type=float, default=0, metavar="SECONDS",
+                        help="Log per-worker memory every SECONDS (0 = off)")
+    args = parser.parse_args()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    if REPLICAS > 1:
+        if args.workers > 1:
+            print(
+                f"NER_REPLICAS={REPLICAS} does not combine with pre-forked workers; "
+                f"serving from one process instead of {args.workers}",
+                file=sys.stderr,
+                flush=True,
+            )
+        _serve(sock, args.threads)
+        return
+
+    # Load the model once, in the parent. Nothing may run inference here:
+    # forking after OpenMP worker threads have started is not safe.
+    import server
+
+    weight_ranges = server.ner_provider.share_memory()
+    # Keep the collector from touching (and thereby copying) inherited objects.
+    gc.collect()
+    gc.freeze()
+
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+    workers = {_spawn(sock, threads, i, args.workers): i for i in range(args.workers)}
+    print(f"Pre-forked {len(workers)} workers on {args.host}:{args.port} ({threads} threads each)", flush=True)
+
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    next_report = time.monotonic() + args.memory_report if args.memory_report else None
+    while workers:
+        pid, _ = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            index = workers.pop(pid, None)
+            if not stopping and index is not None:
+                print(f"Worker {pid} exited, starting a replacement", file=sys.stderr, flush=True)
+                workers[_spawn(sock, threads, index, args.workers)] = index
+            continue
+        if next_report and time.monotonic() >= next_report:
+            rows = [process_memory(os.getpid(), weight_ranges)]
+            rows += [process_memory(w, weight_ranges) for w in sorted(workers)]
+            print(json.dumps({"memory": rows}), flush=True)
+            next_report = time.monotonic() + args.memory_report
+        time.sleep(0.5)
+
+
+if __name__ == "__main__":
+    main()
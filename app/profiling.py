@@ -0,0 +1,189 @@
+"""
+profiling.py
+────────────
+Opt-in per-request profiling for the backend.
+
+A request is profiled when it carries X-Profile: 1 together with a valid
+X-Admin-Token, or when it is picked by random sampling (PROFILE_SAMPLE_RATE).
+Two profiles are captured:
+
+  python.prof   cProfile of the endpoint thread plus the scheduler batches
+                that ran the request's chunks (load with pstats or snakeviz)
+  torch.json    torch.profiler operator trace of those batches, in Chrome
+                trace format (open in Perfetto or chrome://tracing)
+
+They are saved under PROFILE_DIR/<id>/ with meta.json (request metadata and
+the top functions by cumulative time). Both profilers only record in the
+thread that started them, so the scheduler runs a profiled request's batches
+through ProfileSession.run(). With model replicas, inference happens in other
+processes and only the parent's share is captured.
+
+When a request is not profiled, the only cost is the sampling check.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import random
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections.abc import Callable, Mapping
+from typing import Any
+
+from config import PROFILE_ADMIN_TOKEN, PROFILE_DIR, PROFILE_KEEP, PROFILE_SAMPLE_RATE
+
+# The session of the request being handled in this thread; read by the
+# scheduler when the request submits its chunks.
+ACTIVE: contextvars.ContextVar[ProfileSession | None] = contextvars.ContextVar("profile_session", default=None)
+
+PROFILE_FILES = {"python": "python.prof", "torch": "torch.json", "meta": "meta.json"}
+
+
+def is_admin(headers: Mapping[str, str]) -> bool:
+    return bool(PROFILE_ADMIN_TOKEN) and headers.get("x-admin-token") == PROFILE_ADMIN_TOKEN
+
+
+def should_profile(headers: Mapping[str, str]) -> str | None:
+    """The trigger ("header" or "sample") if this request is to be profiled, else None."""
+    if headers.get("x-profile") == "1" and is_admin(headers):
+        return "header"
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return "sample"
+    return None
+
+
+class ProfileSession:
+    """Profiles collected for one request, across the threads that worked on it."""
+
+    def __init__(self, trigger: str, meta: dict[str, Any]) -> None:
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.meta = {"id": self.id, "trigger": trigger, "started": time.time(), **meta}
+        self._lock = threading.Lock()
+        self._python: list[cProfile.Profile] = []
+        self._torch: list[Any] = []
+        self._main: cProfile.Profile | None = cProfile.Profile()
+        self._t0 = time.perf_counter()
+        self._token: contextvars.Token | None = None
+
+    def start(self) -> ProfileSession:
+        self._token = ACTIVE.set(self)
+        if not _enable(self._main):
+            self._main = None
+        return self
+
+    def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Call *fn* under both profilers in the current (worker) thread."""
+        from torch.profiler import ProfilerActivity, profile
+
+        prof = cProfile.Profile()
+        with profile(activities=[ProfilerActivity.CPU], record_shapes=True) as torch_prof:
+            enabled = _enable(prof)
+            try:
+                return fn(*args)
+            finally:
+                if enabled:
+                    prof.disable()
+                with self._lock:
+                    if enabled:
+                        self._python.append(prof)
+                    self._torch.append(torch_prof)
+
+    def finish(self, **meta: Any) -> str:
+        """Stop profiling, write the files and return the profile id."""
+        if self._main is not None:
+            self._main.disable()
+        if self._token is not None:
+            ACTIVE.reset(self._token)
+        self.meta.update(meta, duration_s=time.perf_counter() - self._t0)
+
+        out_dir = os.path.join(PROFILE_DIR, self.id)
+        os.makedirs(out_dir, exist_ok=True)
+        with self._lock:
+            python_profs = ([self._main] if self._main is not None else []) + self._python
+            torch_profs = list(self._torch)
+        if python_profs:
+            stats = pstats.Stats(python_profs[0])
+            for prof in python_profs[1:]:
+                stats.add(prof)
+            stats.dump_stats(os.path.join(out_dir, PROFILE_FILES["python"]))
+            self.meta["top_functions"] = _top_functions(stats)
+        self.meta["model_batches"] = len(torch_profs)
+        if torch_profs:
+            _write_torch_trace(torch_profs, os.path.join(out_dir, PROFILE_FILES["torch"]))
+        with open(os.path.join(out_dir, PROFILE_FILES["meta"]), "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2)
+        _prune(PROFILE_KEEP)
+        return self.id
+
+
+def _enable(prof: cProfile.Profile) -> bool:
+    # Python 3.12+ allows one active profiler per interpreter; a concurrent
+    # profiled request then gets no Python profile for this thread.
+    try:
+        prof.enable()
+    except ValueError:
+        return False
+    return True
+
+
+def _top_functions(stats: pstats.Stats, n: int = 25) -> list[dict[str, Any]]:
+    rows = []
+    for (filename, line, name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{line}({name})",
+            "calls": ncalls,
+            "tottime_s": round(tottime, 6),
+            "cumtime_s": round(cumtime, 6),
+        })
+    rows.sort(key=lambda r: -r["cumtime_s"])
+    return rows[:n]
+
+
+def _write_torch_trace(profs: list[Any], path: str) -> None:
+    """Merge the per-batch Chrome traces into one file."""
+    events: list[dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, prof in enumerate(profs):
+            part = os.path.join(tmp, f"{i}.json")
+            prof.export_chrome_trace(part)
+            with open(part, encoding="utf-8") as f:
+                events.extend(json.load(f).get("traceEvents", []))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events}, f)
+
+
+def _prune(keep: int) -> None:
+    for profile_id in list_profiles()[keep:]:
+        shutil.rmtree(os.path.join(PROFILE_DIR, profile_id["id"]), ignore_errors=True)
+
+
+def list_profiles() -> list[dict[str, Any]]:
+    """Saved profiles' metadata (without the function table), newest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        try:
+            with open(os.path.join(PROFILE_DIR, name, PROFILE_FILES["meta"]), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        meta.pop("top_functions", None)
+        meta["files"] = [k for k, v in PROFILE_FILES.items() if os.path.exists(os.path.join(PROFILE_DIR, name, v))]
+        profiles.append(meta)
+    return profiles
+
+
+def profile_path(profile_id: str, kind: str) -> str | None:
+    """Path of one saved file (*kind* in PROFILE_FILES), or None."""
+    if kind not in PROFILE_FILES or os.path.basename(profile_id) != profile_id:
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id, PROFILE_FILES[kind])
+    return path if os.path.exists(path) else None
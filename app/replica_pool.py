@@ -0,0 +1,380 @@
+"""
+replica_pool.py
+───────────────
+Pool of model replicas, each in its own process, pinned to a disjoint set of
+CPU cores with its own intra-op thread count.
+
+One RoBERTa-base replica with PyTorch's default threading scales poorly past a
+handful of cores. Several smaller replicas side by side use a large CPU box
+better. Chunks wait in the parent and are handed out only as replicas become
+idle, so each chunk goes to whichever replica frees up first and a chunk
+whose future was cancelled before dispatch is never run.
+
+Auto-tuning picks the (replicas × threads) split with the highest throughput
+whose p99 chunk latency stays under a target, for a given set of chunks:
+
+    python app/replica_pool.py reports/ --target-p99 2.0
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any
+
+from config import MODEL_PATH
+
+_READY = "__ready__"
+LOAD_TIMEOUT = 600.0
+
+
+# ── Core partitioning ──────────────────────────────────────────────────────────
+
+def available_cores() -> list[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def partition_cores(replicas: int, threads: int, first: int = 0) -> list[list[int] | None]:
+    """
+    Disjoint core sets of size *threads*, starting at the *first* available
+    core, or None (no pinning) if too few cores.
+    """
+    cores = available_cores()[first:]
+    if not hasattr(os, "sched_setaffinity") or replicas * threads > len(cores):
+        return [None] * replicas
+    return [cores[i * threads:(i + 1) * threads] for i in range(replicas)]
+
+
+def worker_slot() -> tuple[int, int]:
+    """
+    (index, count) of this server worker among those pre-forked by prefork.py,
+    or (0, 1) in a single-process server. Pools started lazily in a worker
+    use it to stay off the other workers' cores.
+    """
+    return int(os.getenv("PREFORK_WORKER_INDEX", "0")), int(os.getenv("PREFORK_WORKERS", "1"))
+
+
+# ── Worker process ─────────────────────────────────────────────────────────────
+
+def _worker(
+    index: int,
+    model_path: str,
+    threads: int,
+    cores: list[int] | None,
+    tasks: Any,
+    results: Any,
+) -> None:
+    # Pin and size thread pools before torch is imported in this process.
+    if cores:
+        os.sched_setaffinity(0, cores)
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+
+    import torch
+
+    from decoding import TokenClassifier
+
+    torch.set_num_threads(threads)
+    try:
+        nlp = TokenClassifier(model_path, device="cpu")
+    except Exception as exc:
+        results.put((index, _READY, f"{type(exc).__name__}: {exc}", 0.0))
+        return
+    results.put((index, _READY, None, 0.0))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        job_id, text = task
+        t0 = time.perf_counter()
+        try:
+            out: Any = nlp(text)
+        except Exception as exc:  # surfaced to the caller through the future
+            out = exc
+        results.put((index, job_id, out, time.perf_counter() - t0))
+
+
+# ── Pool ───────────────────────────────────────────────────────────────────────
+
+class ReplicaPool:
+    """
+    *replicas* model processes with *threads* intra-op threads each, pinned
+    to cores from *first_core* on (pools sharing a machine use disjoint ones).
+
+    submit(text) returns a Future resolving to the chunk's entity list; the
+    per-chunk service time (excluding queueing) is recorded in service_times.
+    Cancelling a future that has not been dispatched yet drops its chunk.
+
+    Construction waits up to *load_timeout* seconds for every replica to load
+    its model. It raises RuntimeError if a replica reports a load error, exits
+    or does not get ready in time.
+
+    A replica that dies while running a chunk fails that chunk's future and is
+    restarted on the same cores; a replacement that cannot load stays down.
+    Once no replica is left, every pending future fails and so does every
+    later submit().
+    """
+
+    def __init__(
+        self,
+        model_path: str = MODEL_PATH,
+        replicas: int = 2,
+        threads: int | None = None,
+        first_core: int = 0,
+        load_timeout: float = LOAD_TIMEOUT,
+    ) -> None:
+        threads = threads or max(1, len(available_cores()) // replicas)
+        self.replicas = replicas
+        self.threads = threads
+        self.service_times: list[float] = []
+        self.restarts = 0
+
+        self._model_path = model_path
+        self._ctx = mp.get_context("spawn")
+        self._results = self._ctx.Queue()
+        self._cores = partition_cores(replicas, threads, first_core)
+        self._procs: list[Any] = [None] * replicas
+        self._tasks: list[Any] = [None] * replicas
+        self._state = ["loading"] * replicas  # loading | idle | busy | dead
+        self._running: list[int | None] = [None] * replicas  # job id per replica
+        self._futures: dict[int, Future] = {}
+        self._pending: deque[tuple[int, str, Future]] = deque()
+        self._closed = False
+        self._error: RuntimeError | None = None
+        self.dropped = 0
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        for i in range(replicas):
+            self._start(i)
+        try:
+            self._wait_ready(load_timeout)
+        except RuntimeError:
+            for proc in self._procs:
+                proc.terminate()
+            raise
+
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    def _start(self, i: int) -> None:
+        """(Re)start replica *i* with a fresh task queue."""
+        self._tasks[i] = self._ctx.Queue()
+        self._procs[i] = self._ctx.Process(
+            target=_worker,
+            args=(i, self._model_path, self.threads, self._cores[i], self._tasks[i], self._results),
+            daemon=True,
+        )
+        self._state[i] = "loading"
+        self._procs[i].start()
+
+    def _wait_ready(self, timeout: float) -> None:
+        """Block until every replica has loaded the model."""
+        deadline = time.monotonic() + timeout
+        while "loading" in self._state:
+            try:
+                i, _, error, _ = self._results.get(timeout=0.5)
+            except queue.Empty:
+                dead = [p.exitcode for p in self._procs if p.exitcode is not None]
+                if dead:
+                    raise RuntimeError(f"A replica for {self._model_path} exited while loading (exit code {dead[0]})")
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Replicas for {self._model_path} not ready after {timeout:.0f}s")
+                continue
+            if error is not None:
+                raise RuntimeError(f"A replica failed to load {self._model_path}: {error}")
+            self._state[i] = "idle"
+
+    def _collect(self) -> None:
+        while True:
+            try:
+                i, job_id, out, elapsed = self._results.get(timeout=0.5)
+            except queue.Empty:
+                i = job_id = None  # also close()'s sentinel
+            resolved: list[tuple[Future, Any]] = []
+            with self._lock:
+                if self._closed:
+                    return
+                if job_id == _READY:
+                    if self._state[i] == "loading":
+                        self._state[i] = "dead" if out is not None else "idle"
+                elif job_id is not None:
+                    self.service_times.append(elapsed)
+                    fut = self._futures.pop(job_id, None)
+                    if fut is not None:
+                        resolved.append((fut, out))
+                    if self._running[i] == job_id:
+                        self._running[i] = None
+                        self._state[i] = "idle"
+                resolved += self._reap()
+                self._dispatch()
+                done = self._error is not None
+            for fut, out in resolved:
+                if isinstance(out, Exception):
+                    fut.set_exception(out)
+                else:
+                    fut.set_result(out)
+            if done:
+                return
+
+    def _reap(self) -> list[tuple[Future, Any]]:
+        """
+        Handle replicas that exited. Caller holds self._lock. Returns the
+        futures to fail: the chunk a dead replica was running, and every
+        pending chunk once no replica is left.
+        """
+        failed: list[tuple[Future, Any]] = []
+        for i, proc in enumerate(self._procs):
+            if self._state[i] == "dead" or proc.exitcode is None:
+                continue
+            job_id = self._running[i]
+            self._running[i] = None
+            if job_id is not None:
+                fut = self._futures.pop(job_id, None)
+                if fut is not None:
+                    failed.append((fut, RuntimeError(f"Replica {i} died (exit code {proc.exitcode}) while running this chunk")))
+            if self._state[i] == "loading":
+                self._state[i] = "dead"  # a replacement that cannot start stays down
+            else:
+                self.restarts += 1
+                self._start(i)
+        if all(state == "dead" for state in self._state):
+            self._error = RuntimeError(f"All replicas for {self._model_path} are dead")
+            for fut in self._futures.values():
+                failed.append((fut, self._error))
+            self._futures.clear()
+            while self._pending:
+                _, _, fut = self._pending.popleft()
+                if fut.set_running_or_notify_cancel():
+                    failed.append((fut, self._error))
+        return failed
+
+    def _dispatch(self) -> None:
+        """Hand pending chunks to idle replicas. Caller holds self._lock."""
+        for i, state in enumerate(self._state):
+            if state != "idle":
+                continue
+            while self._pending:
+                job_id, text, fut = self._pending.popleft()
+                if fut.set_running_or_notify_cancel():
+                    break
+                self.dropped += 1
+            else:
+                return
+            self._futures[job_id] = fut
+            self._running[i] = job_id
+            self._state[i] = "busy"
+            self._tasks[i].put((job_id, text))
+
+    def submit(self, text: str) -> Future:
+        fut: Future = Future()
+        with self._lock:
+            if self._error is not None:
+                fut.set_exception(self._error)
+                return fut
+            self._pending.append((next(self._ids), text, fut))
+            self._dispatch()
+        return fut
+
+    def __call__(self, text: str) -> list[dict[str, Any]]:
+        return self.submit(text).result()
+
+    def map(self, texts: list[str]) -> list[list[dict[str, Any]]]:
+        futures = [self.submit(t) for t in texts]
+        return [f.result() for f in futures]
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+        for tasks in self._tasks:
+            tasks.put(None)
+        for proc in self._procs:
+            proc.join(timeout=10)
+        self._results.put((None, None, None, 0.0))
+
+
+# ── Auto-tuning ────────────────────────────────────────────────────────────────
+
+def candidate_splits(cores: int) -> list[tuple[int, int]]:
+    """(replicas, threads) pairs with replicas × threads ≤ cores, threads a power of two."""
+    splits = []
+    threads = 1
+    while threads <= cores:
+        splits.append((cores // threads, threads))
+        threads *= 2
+    return splits
+
+
+def autotune(
+    chunks: list[str],
+    target_p99: float,
+    model_path: str = MODEL_PATH,
+    splits: list[tuple[int, int]] | None = None,
+) -> tuple[int, int] | None:
+    """
+    Benchmark every split on *chunks* and return the (replicas, threads) with
+    the best throughput whose p99 service time is ≤ *target_p99* seconds.
+    """
+    import numpy as np
+
+    splits = splits or candidate_splits(len(available_cores()))
+    print(f"{'replicas':>8} × {'threads':<7} | {'chunks/s':>9} | {'p50 (s)':>8} | {'p99 (s)':>8}")
+    print("-" * 52)
+    best, best_tput = None, 0.0
+    for replicas, threads in splits:
+        pool = ReplicaPool(model_path, replicas, threads)
+        try:
+            pool.map(chunks[: replicas * 2])  # warm-up
+            pool.service_times.clear()
+            t0 = time.perf_counter()
+            pool.map(chunks)
+            wall = time.perf_counter() - t0
+            times = np.array(pool.service_times)
+        finally:
+            pool.close()
+        tput = len(chunks) / wall
+        p50, p99 = np.percentile(times, [50, 99])
+        ok = p99 <= target_p99
+        print(f"{replicas:>8} × {threads:<7} | {tput:>9.2f} | {p50:>8.3f} | {p99:>8.3f}{'' if ok else '  (over target)'}")
+        if ok and tput > best_tput:
+            best, best_tput = (replicas, threads), tput
+    return best
+
+
+def main() -> None:
+    import glob
+
+    from ner_service import _chunk_text
+
+    parser = argparse.ArgumentParser(description="Find the replicas × threads split with the best throughput.")
+    parser.add_argument("corpus", help="Directory of .txt reports whose chunks form the benchmark load")
+    parser.add_argument("--target-p99", type=float, default=2.0, help="Max p99 seconds per chunk")
+    parser.add_argument("--max-chunks", type=int, default=256)
+    args = parser.parse_args()
+
+    chunks: list[str] = []
+    for path in sorted(glob.glob(os.path.join(args.corpus, "*.txt"))):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            chunks.extend(_chunk_text(f.read()))
+    chunks = chunks[: args.max_chunks]
+    if not chunks:
+        raise SystemExit(f"No .txt reports found in {args.corpus}")
+
+    best = autotune(chunks, args.target_p99)
+    if best is None:
+        print("\nNo split met the p99 target.")
+    else:
+        print(f"\nBest: NER_REPLICAS={best[0]} NER_THREADS_PER_REPLICA={best[1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+scheduler.py
+────────────
+Chunk-level scheduler shared by all concurrent extraction requests.
+
+Without it, the request that arrives first keeps the model busy with every
+one of its chunks, and a 200-byte alert waits behind a 2 MB report. Here every
+request submits its chunks to one queue, and the model workers take the next
+chunk (or batch of chunks, possibly from different requests) by policy:
+
+  fair      weighted fair queuing across clients: a chunk's virtual finish
+            time is its client's previous one (or the current virtual time,
+            if later) plus its length / the weight of its priority class
+  srpt      shortest remaining processing time: the request with the fewest
+            characters not yet dispatched goes first, its chunks in document
+            order; a request's key shrinks as each of its chunks dispatches
+  priority  strict priority by class weight, fair queuing within a class
+  fifo      arrival order (the old behaviour)
+
+Queueing delay (submit → dispatch) is recorded per priority class.
+
+Clients choose both their client id and their priority class. A priority
+class without a weight is therefore counted as "default". Per-client state is
+dropped once the virtual time passes the client's last finish time. As a
+result, state stays bounded however many distinct values clients send.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Future
+from typing import Any
+
+import numpy as np
+
+from profiling import ACTIVE
+
+POLICIES = ("fair", "srpt", "priority", "fifo")
+_DELAY_WINDOW = 1024
+
+
+class _Job:
+    __slots__ = ("text", "future", "priority", "enqueued", "profile")
+
+    def __init__(self, text: str, priority: str, profile: Any = None) -> None:
+        self.text = text
+        self.future: Future = Future()
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.profile = profile
+
+
+class ChunkScheduler:
+    """
+    *workers* threads each call *run_batch(texts) -> outputs* on up to
+    *batch_size* chunks at a time. *weights* maps priority class → weight;
+    classes not in it are scheduled and counted as "default" (weight 1
+    unless given).
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[list[str]], list[Any]],
+        workers: int = 1,
+        batch_size: int = 1,
+        policy: str = "fair",
+        weights: dict[str, float] | None = None,
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown scheduling policy {policy!r}; expected one of {POLICIES}")
+        self.policy = policy
+        self.weights = dict(weights or {})
+        self._run_batch = run_batch
+        self._workers = workers
+        self._batch_size = batch_size
+
+        self._cond = threading.Condition()
+        # (key, seq, job), or for srpt (remaining chars, seq, the request's jobs).
+        self._heap: list[tuple[Any, int, Any]] = []
+        self._seq = itertools.count()
+        self._vtime = 0.0
+        self._finish: dict[str, float] = {}
+        self._delays: dict[str, deque[float]] = {}
+        self._counts: dict[str, dict[str, int]] = {}
+        # Worker threads do not survive fork(): start them in the process that
+        # first submits work.
+        self._pid: int | None = None
+
+    # ── Submission ────────────────────────────────────────────────────────────
+
+    def _weight(self, priority: str) -> float:
+        return max(1e-6, float(self.weights.get(priority, 1.0)))
+
+    def _key(self, job: _Job, client: str) -> Any:
+        if self.policy == "fifo":
+            return 0
+        flow = f"{client}\0{job.priority}"
+        start = max(self._vtime, self._finish.get(flow, 0.0))
+        finish = start + max(1, len(job.text)) / self._weight(job.priority)
+        self._finish[flow] = finish
+        if self.policy == "priority":
+            return (-self._weight(job.priority), finish)
+        return finish
+
+    def submit(self, chunks: list[str], client: str = "default", priority: str = "default") -> list[Future]:
+        """Queue the chunks of one request; returns one Future per chunk, in order."""
+        self._ensure_started()
+        if priority not in self.weights:
+            priority = "default"
+        profile = ACTIVE.get()
+        jobs = [_Job(text, priority, profile) for text in chunks]
+        with self._cond:
+            counts = self._counts.setdefault(priority, {"submitted": 0, "dispatched": 0, "dropped": 0})
+            counts["submitted"] += len(jobs)
+            if self.policy == "srpt":
+                # One heap entry per request, re-keyed by _next_batch as its
+                # chunks leave in document order.
+                if jobs:
+                    heapq.heappush(self._heap, (sum(len(t) for t in chunks), next(self._seq), deque(jobs)))
+            else:
+                for job in jobs:
+                    heapq.heappush(self._heap, (self._key(job, client), next(self._seq), job))
+            self._cond.notify(len(jobs))
+        return [job.future for job in jobs]
+
+    # ── Workers ───────────────────────────────────────────────────────────────
+
+    def _ensure_started(self) -> None:
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        for _ in range(self._workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def _next_batch(self) -> list[_Job]:
+        with self._cond:
+            while not self._heap:
+                self._cond.wait()
+            batch: list[_Job] = []
+            now = time.monotonic()
+            while self._heap and len(batch) < self._batch_size:
+                key, seq, job = heapq.heappop(self._heap)
+                if isinstance(job, deque):
+                    request, job = job, job.popleft()
+                    if request:
+                        heapq.heappush(self._heap, (key - len(job.text), seq, request))
+                counts = self._counts[job.priority]
+                if not job.future.set_running_or_notify_cancel():
+                    counts["dropped"] += 1
+                    continue
+                if self.policy in ("fair", "priority"):
+                    self._vtime = max(self._vtime, key[1] if isinstance(key, tuple) else key)
+                counts["dispatched"] += 1
+                self._delays.setdefault(job.priority, deque(maxlen=_DELAY_WINDOW)).append(now - job.enqueued)
+                batch.append(job)
+            if self._finish and self.policy in ("fair", "priority"):
+                # A flow that finished before the virtual time would restart
+                # from it anyway, so its entry can go.
+                self._finish = {f: t for f, t in self._finish.items() if t > self._vtime}
+            return batch
+
+    def _work(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            texts = [job.text for job in batch]
+            # A batch holding chunks of a profiled request runs under its profiler.
+            profile = next((job.profile for job in batch if job.profile is not None), None)
+            try:
+                if profile is None:
+                    outputs = self._run_batch(texts)
+                else:
+                    outputs = profile.run(self._run_batch, texts)
+            except Exception as exc:
+                for job in batch:
+                    job.future.set_exception(exc)
+                continue
+            for job, out in zip(batch, outputs):
+                job.future.set_result(out)
+
+    # ── Stats ─────────────────────────────────────────────────────────────────
+
+    def stats(self) -> dict[str, Any]:
+        """Per priority class: chunk counts and queueing delay (seconds) over recent chunks."""
+        with self._cond:
+            queued: dict[str, int] = {}
+            for _, _, item in self._heap:
+                for job in item if isinstance(item, deque) else (item,):
+                    queued[job.priority] = queued.get(job.priority, 0) + 1
+            classes = {}
+            for priority, counts in self._counts.items():
+                delays = np.array(self._delays.get(priority, ()))
+                classes[priority] = {
+                    **counts,
+                    "queued": queued.get(priority, 0),
+                    "weight": self._weight(priority),
+                    "delay_mean_s": float(delays.mean()) if len(delays) else 0.0,
+                    "delay_p50_s": float(np.percentile(delays, 50)) if len(delays) else 0.0,
+                    "delay_p95_s": float(np.percentile(delays, 95)) if len(delays) else 0.0,
+                    "delay_max_s": float(delays.max()) if len(delays) else 0.0,
+                }
+        return {"policy": self.policy, "classes": classes}
@@ -0,0 +1,247 @@
+"""
+securebert_provider.py
+──────────────────────
+SecureBERT-NER provider: runs the local model, in this process or in a pool
+of replica processes, behind the shared chunk scheduler.
+
+This is the heavy half of the provider layer: importing it loads torch and
+transformers. ner_service imports it on demand through its provider registry,
+so the frontend, which only talks to the backend, never does.
+"""
+
+from __future__ import annotations
+
+import itertools
+from collections.abc import Callable, Iterator
+from concurrent.futures import wait
+from typing import Any
+
+from config import (
+    CASCADE_MODEL_PATH,
+    CASCADE_SHADOW_RATE,
+    CASCADE_THRESHOLD,
+    CASCADE_THRESHOLDS,
+    DECODE_PACK,
+    IOC_FAST_PATH,
+    MODEL_PATH,
+    NEAR_DUP_CACHE,
+    NEAR_DUP_THRESHOLD,
+    NER_CASCADE,
+    REPLICAS,
+    SCHED_POLICY,
+    SCHED_WEIGHTS,
+    THREADS_PER_REPLICA,
+)
+from cancellation import CANCEL_STATS, Cancelled, CancelToken
+from cascade import ModelCascade, load_first_stage
+from decoding import EncodedChunk, TokenClassifier, encode_spans
+from dedup import NearDuplicateCache
+from ioc_extractor import extract_iocs, merge_iocs
+from ner_service import NERProvider, _chunk_spans, _rebase
+from replica_pool import ReplicaPool
+from scheduler import ChunkScheduler
+
+
+# ── SecureBERT implementation (Local) ──────────────────────────────────────────
+
+class SecureBertNERProvider(NERProvider):
+    """
+    NER provider backed by the local SecureBERT-NER model.
+    Used by the backend server.
+
+    With *replicas* > 1 the model runs in a ReplicaPool of core-pinned
+    processes instead of in this process, and the chunks of one document are
+    spread over the idle replicas.
+
+    Chunks of all concurrent extract() calls share one ChunkScheduler, which
+    decides by *sched_policy* whose chunk runs next (see scheduler.py).
+
+    With *cascade* (default: NER_CASCADE), a cheap first-stage model runs on
+    every chunk and only low-confidence chunks reach the full model (see
+    cascade.py).
+    """
+
+    def __init__(
+        self,
+        model_path: str = MODEL_PATH,
+        ioc_fast_path: bool = IOC_FAST_PATH,
+        dedup: NearDuplicateCache | None = None,
+        replicas: int = REPLICAS,
+        threads_per_replica: int = THREADS_PER_REPLICA,
+        sched_policy: str = SCHED_POLICY,
+        sched_weights: dict[str, float] | None = None,
+        cascade: bool = NER_CASCADE,
+    ) -> None:
+        self._model_path = model_path
+        self._ioc_fast_path = ioc_fast_path
+        if dedup is None and NEAR_DUP_CACHE:
+            dedup = NearDuplicateCache(threshold=NEAR_DUP_THRESHOLD)
+        self._dedup = dedup
+        self._pool: ReplicaPool | None = None
+        if replicas > 1:
+            self._pool = ReplicaPool(model_path, replicas, threads_per_replica or None)
+            self._pipeline = self._pool
+            self._encode_spans = self._load_encoder()
+        else:
+            self._pipeline = self._load_pipeline()
+            self._encode_spans = self._pipeline.encode_spans
+        self._cascade: ModelCascade | None = None
+        if cascade:
+            first_stage = load_first_stage(CASCADE_MODEL_PATH, model_path)
+            self._cascade = ModelCascade(
+                first_stage,
+                self._full_batch,
+                threshold=CASCADE_THRESHOLD,
+                thresholds=CASCADE_THRESHOLDS,
+                shadow_rate=CASCADE_SHADOW_RATE,
+            )
+        self._scheduler = ChunkScheduler(
+            self._run_batch,
+            workers=replicas if self._pool is not None else 1,
+            batch_size=1 if self._pool is not None or self._dedup else self._pipeline.batch_size,
+            policy=sched_policy,
+            weights=SCHED_WEIGHTS if sched_weights is None else sched_weights,
+        )
+
+    def _load_pipeline(self) -> TokenClassifier:
+        return TokenClassifier(self._model_path, pack=DECODE_PACK)
+
+    def _load_encoder(self) -> Callable[[str, list[tuple[int, int]]], tuple[list[tuple[int, int]], list[EncodedChunk]]]:
+        """encode_spans for the replicas' model, from its tokenizer alone."""
+        from transformers import AutoConfig, AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(self._model_path)
+        max_length = min(
+            tokenizer.model_max_length,
+            AutoConfig.from_pretrained(self._model_path).max_position_embeddings - 2,
+        )
+        max_tokens = max_length - tokenizer.num_special_tokens_to_add()
+        return lambda text, spans: encode_spans(tokenizer, text, spans, max_tokens)
+
+    def _predict(self, text: str) -> list[dict[str, Any]]:
+        try:
+            return self._pipeline(text)
+        except Exception:
+            return []
+
+    def _predict_batch(self, chunks: list[str]) -> list[list[dict[str, Any]]]:
+        try:
+            return self._pipeline(chunks)
+        except Exception:
+            # Fall back to one chunk at a time so one bad chunk loses only itself.
+            return [self._predict(chunk) for chunk in chunks]
+
+    def _run_batch(self, chunks: list[str]) -> list[list[dict[str, Any]]]:
+        """Scheduler worker body: model entities for a batch of chunks."""
+        if self._cascade is not None:
+            return self._cascade(chunks)
+        return self._full_batch(chunks)
+
+    def _full_batch(self, chunks: list[str]) -> list[list[dict[str, Any]]]:
+        if self._dedup:
+            return [self._dedup.run(chunk, self._predict) for chunk in chunks]
+        if self._pool is not None:
+            return [self._predict(chunk) for chunk in chunks]
+        return self._predict_batch(chunks)
+
+    def _model_outputs(
+        self,
+        chunks: list[str],
+        cancel: CancelToken | None = None,
+        client: str = "default",
+        priority: str = "default",
+    ) -> Iterator[list[dict[str, Any]]]:
+        """
+        Model entities per chunk, in order, yielded as each one is ready.
+        While waiting, *cancel* is checked; on Cancelled, chunks still queued
+        in the scheduler are dropped and counted in CANCEL_STATS.
+        """
+        done = 0
+        futures = self._scheduler.submit(chunks, client=client, priority=priority)
+        try:
+            for fut in futures:
+                while cancel is not None:
+                    cancel.check()
+                    if wait([fut], timeout=0.1).done:
+                        break
+                try:
+                    out = fut.result()
+                except Exception:
+                    out = []
+                done += 1
+                yield out
+        except Cancelled as exc:
+            # Running batches cannot be interrupted: their chunks still run.
+            started = done + sum(not f.cancel() for f in futures[done:])
+            CANCEL_STATS.request_cancelled(exc.reason, wasted=started, dropped=len(chunks) - started)
+            raise
+        finally:
+            CANCEL_STATS.chunk_done(done)
+
+    def weight_ranges(self) -> list[tuple[int, int]]:
+        """(address, nbytes) of every weight buffer of the in-process model."""
+        if self._pool is not None:
+            return []
+        model = self._pipeline.model
+        return [
+            (t.untyped_storage().data_ptr(), t.untyped_storage().nbytes())
+            for t in itertools.chain(model.parameters(), model.buffers())
+        ]
+
+    def share_memory(self) -> list[tuple[int, int]]:
+        """
+        Move the model's weights into shared memory so that forked server
+        workers map the same pages instead of copying them. Returns the
+        weight_ranges() for memory reporting.
+        """
+        if self._pool is not None:
+            raise RuntimeError("share_memory is not available with model replicas")
+        self._pipeline.model.share_memory()
+        return self.weight_ranges()
+
+    def scheduler_stats(self) -> dict[str, Any]:
+        """Per priority class chunk counts and queueing delays."""
+        return self._scheduler.stats()
+
+    def cascade_stats(self) -> dict[str, Any] | None:
+        """Escalation rate, estimated time saved and shadow agreement, or None without a cascade."""
+        return self._cascade.stats() if self._cascade else None
+
+    def dedup_stats(self) -> dict[str, float] | None:
+        """Near-duplicate cache counters, or None when the cache is disabled."""
+        return self._dedup.stats() if self._dedup else None
+
+    def extract(
+        self,
+        text: str,
+        on_chunk: Callable[[int, int], None] | None = None,
+        cancel: CancelToken | None = None,
+        client: str = "default",
+        priority: str = "default",
+    ) -> list[dict[str, Any]]:
+        """
+        Chunk *text* into model-safe pieces, run the pipeline on each, and
+        return the concatenated list of raw entity dicts, with start / end
+        offsets into *text*. *client* and *priority* place the chunks in the
+        scheduler.
+
+        The document is tokenised once. Each chunk carries its slice of that
+        encoding, so the model does not tokenise it again, and a chunk longer
+        than the model window is split rather than truncated.
+
+        With the near-duplicate cache enabled, chunks resembling earlier ones
+        only run the model on their changed parts. With the IOC fast path
+        enabled, pattern matches replace the model's output wherever they
+        overlap it.
+        """
+        spans, chunks = self._encode_spans(text, _chunk_spans(text))
+        total = len(spans)
+        results: list[dict[str, Any]] = []
+        outputs = self._model_outputs(chunks, cancel, client, priority)
+        for i, ((start, _), chunk, entities) in enumerate(zip(spans, chunks, outputs), start=1):
+            if self._ioc_fast_path:
+                entities = merge_iocs(entities, extract_iocs(chunk))
+            results.extend(_rebase(entities, start))
+            if on_chunk:
+                on_chunk(i, total)
+        return results
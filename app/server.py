@@ -1,17 +1,40 @@
 import os
-from typing import List, Any
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from ner_service import SecureBertNERProvider
+import threading
+from typing import List, Any, Optional
+from anyio import from_thread
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse
+from pydantic import BaseModel, Field
+from cancellation import CANCEL_STATS, Cancelled, CancelToken
+from config import JOB_WORKERS, JOBS_DB
+from entity_processor import aggregate, summary_stats
+from jobs import JobStore, JobWorkers
+from memory_report import process_memory
+from ner_service import create_provider
+from profiling import ProfileSession, is_admin, list_profiles, profile_path, should_profile
 
 app = FastAPI(title="SecureBERT NER API")
 
 # Initialize the NER provider
 # We assume the model is available at the path defined in config.py or relative to this file
-ner_provider = SecureBertNERProvider()
+ner_provider = create_provider("securebert")
+ioc_provider = create_provider("ioc")
+
+# Opened on startup, i.e. in each pre-forked worker, never in the parent:
+# sqlite connections must not cross fork().
+job_store: Optional[JobStore] = None
+
+@app.on_event("startup")
+def start_job_workers():
+    global job_store
+    job_store = JobStore(JOBS_DB)
+    if JOB_WORKERS > 0:
+        JobWorkers(job_store, (ner_provider, ioc_provider), JOB_WORKERS).start()
 
 class NERRequest(BaseModel):
     text: str
+    # Skip the model and return only pattern-matched indicators
+    ioc_only: bool = False
 
 class NEREntity(BaseModel):
     entity_group: str
@@ -20,29 +43,225 @@ class NEREntity(BaseModel):
     start: int
     end: int
 
+class SummaryRow(BaseModel):
+    Class: str
+    Description: str
+    Entity: str
+    Count: int
+
 class NERResponse(BaseModel):
-    entities: List[NEREntity]
+    # format=raw (default): entities; aggregated: summary + stats; both: all three
+    entities: Optional[List[NEREntity]] = None
+    summary: Optional[List[SummaryRow]] = None
+    stats: Optional[dict[str, int]] = None
+
+# ?format= on /extract, /extract/ensemble and GET /jobs/{id}
+FORMAT_PATTERN = "^(raw|aggregated|both)$"
 
-@app.post("/extract", response_model=NERResponse)
-async def extract_entities(request: NERRequest):
+def _shape(raw_entities: list, format: str) -> dict:
+    """Response body for *format*: raw mentions, the aggregated summary, or both."""
+    body = {}
+    if format in ("raw", "both"):
+        body["entities"] = raw_entities
+    if format in ("aggregated", "both"):
+        # The entity_processor.aggregate table, computed here next to the
+        # model instead of in every client.
+        df = aggregate(raw_entities)
+        body["summary"] = df.to_dict(orient="records")
+        body["stats"] = summary_stats(df)
+    return body
+
+# Status codes for cancelled requests: the deadline from X-Request-Timeout
+# passed (504), or the client disconnected (499, nginx's "client closed").
+CANCEL_STATUS = {"deadline": 504, "disconnect": 499}
+
+# Plain def: FastAPI runs it in its threadpool, so concurrent requests can
+# keep several model replicas busy instead of queueing on the event loop.
+# Between chunks the provider checks the deadline and whether the client is
+# still connected, and drops the rest of the document if not.
+@app.post("/extract", response_model=NERResponse, response_model_exclude_none=True)
+def extract_entities(
+    request: NERRequest,
+    http_request: Request,
+    response: Response,
+    format: str = Query(default="raw", pattern=FORMAT_PATTERN),
+    x_request_timeout: Optional[float] = Header(default=None),
+    x_client_id: Optional[str] = Header(default=None),
+    x_priority: str = Header(default="default"),
+):
     if not request.text.strip():
-        return NERResponse(entities=[])
-    
+        return _shape([], format)
+
+    # Profiled requests (admin X-Profile header or sampling) report the saved
+    # profile's id in the X-Profile-Id response header.
+    trigger = should_profile(http_request.headers)
+    if trigger is None:
+        return _extract(request, http_request, format, x_request_timeout, x_client_id, x_priority)
+    session = ProfileSession(trigger, {
+        "path": "/extract", "chars": len(request.text), "ioc_only": request.ioc_only,
+        "client": x_client_id, "priority": x_priority, "format": format,
+    }).start()
+    status = 200
+    try:
+        return _extract(request, http_request, format, x_request_timeout, x_client_id, x_priority)
+    except HTTPException as e:
+        status = e.status_code
+        raise
+    finally:
+        response.headers["X-Profile-Id"] = session.finish(status=status)
+
+def _extract(request, http_request, format, x_request_timeout, x_client_id, x_priority):
+    cancel = CancelToken(
+        timeout=x_request_timeout,
+        probe=lambda: from_thread.run(http_request.is_disconnected),
+    )
     try:
-        raw_entities = ner_provider.extract(request.text)
+        if request.ioc_only:
+            raw_entities = ioc_provider.extract(request.text, cancel=cancel)
+        else:
+            # Chunks are scheduled fairly across clients (X-Client-Id, else the
+            # peer address) and weighted by the X-Priority class.
+            client = x_client_id or (http_request.client.host if http_request.client else "default")
+            raw_entities = ner_provider.extract(
+                request.text, cancel=cancel, client=client, priority=x_priority
+            )
         # Ensure all required fields are present for the response model
         formatted_entities = []
         for ent in raw_entities:
-            formatted_entities.append(NEREntity(
+            formatted_entities.append(dict(
                 entity_group=ent.get("entity_group", "UNKNOWN"),
                 word=ent.get("word", ""),
                 score=float(ent.get("score", 0.0)),
                 start=ent.get("start", 0),
                 end=ent.get("end", 0)
             ))
-        return NERResponse(entities=formatted_entities)
+        return _shape(formatted_entities, format)
+    except Cancelled as e:
+        raise HTTPException(status_code=CANCEL_STATUS.get(e.reason, 503), detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ── Async jobs ────────────────────────────────────────────────────────────────
+# For documents that take longer than a client wants to hold a connection:
+# submit, then poll GET /jobs/{id} for progress and results.
+
+@app.post("/jobs", status_code=202)
+def submit_job(
+    request: NERRequest,
+    http_request: Request,
+    x_client_id: Optional[str] = Header(default=None),
+    x_priority: str = Header(default="bulk"),
+):
+    client = x_client_id or (http_request.client.host if http_request.client else "default")
+    job_id = job_store.submit(request.text, request.ioc_only, client=client, priority=x_priority)
+    return {"id": job_id, "status": "queued"}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, format: str = Query(default="aggregated", pattern=FORMAT_PATTERN)):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    entities = job.pop("entities")
+    if entities is not None:
+        job.update(_shape(entities, format))
+    return job
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    if job_store.status(job_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return {"id": job_id, "cancelled": job_store.cancel(job_id), "status": job_store.status(job_id)}
+
+# ── Model ensemble ──────────────────────────────────────────────────────────
+# CyNER + SecureBERT on the same chunks, concurrently, merged by label vote.
+# The models are loaded on the first ensemble request, not at startup.
+
+class EnsembleRequest(BaseModel):
+    text: str
+    # "union" or "vote"; defaults to ENSEMBLE_POLICY
+    policy: Optional[str] = Field(default=None, pattern="^(union|vote)$")
+    min_votes: Optional[int] = Field(default=None, ge=1)
+
+class EnsembleEntity(NEREntity):
+    models: List[str]
+
+class EnsembleResponse(BaseModel):
+    entities: Optional[List[EnsembleEntity]] = None
+    summary: Optional[List[SummaryRow]] = None
+    stats: Optional[dict[str, int]] = None
+    # Wall seconds per model until its last chunk finished, plus "total"
+    timings: dict[str, float]
+
+ensemble_provider = None
+_ensemble_lock = threading.Lock()
+
+def _ensemble():
+    global ensemble_provider
+    with _ensemble_lock:
+        if ensemble_provider is None:
+            ensemble_provider = create_provider("ensemble")
+    return ensemble_provider
+
+@app.post("/extract/ensemble", response_model=EnsembleResponse, response_model_exclude_none=True)
+def extract_ensemble(
+    request: EnsembleRequest,
+    http_request: Request,
+    format: str = Query(default="raw", pattern=FORMAT_PATTERN),
+    x_request_timeout: Optional[float] = Header(default=None),
+):
+    if not request.text.strip():
+        return {**_shape([], format), "timings": {}}
+    cancel = CancelToken(
+        timeout=x_request_timeout,
+        probe=lambda: from_thread.run(http_request.is_disconnected),
+    )
+    try:
+        entities, timings = _ensemble().extract_timed(
+            request.text, cancel=cancel, policy=request.policy, min_votes=request.min_votes
+        )
+    except Cancelled as e:
+        raise HTTPException(status_code=CANCEL_STATUS.get(e.reason, 503), detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return {**_shape(entities, format), "timings": timings}
+
+# ── Admin: saved request profiles ────────────────────────────────────────────
+
+def _require_admin(http_request: Request) -> None:
+    if not is_admin(http_request.headers):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.get("/admin/profiles")
+def get_profiles(http_request: Request):
+    _require_admin(http_request)
+    return {"profiles": list_profiles()}
+
+@app.get("/admin/profiles/{profile_id}/{kind}")
+def download_profile(profile_id: str, kind: str, http_request: Request):
+    # kind: "python" (cProfile/pstats), "torch" (Chrome trace) or "meta"
+    _require_admin(http_request)
+    path = profile_path(profile_id, kind)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Unknown profile or file")
+    return FileResponse(path, filename=f"{profile_id}-{os.path.basename(path)}")
+
+@app.get("/stats")
+async def stats():
+    return {
+        "dedup": ner_provider.dedup_stats(),
+        "cancellation": CANCEL_STATS.snapshot(),
+        "scheduler": ner_provider.scheduler_stats(),
+        "cascade": ner_provider.cascade_stats(),
+    }
+
+@app.get("/memory")
+async def memory():
+    # RSS / PSS of this worker, with the model weight mappings broken out
+    # (Private_Dirty there means copy-on-write copies of the weights).
+    try:
+        return process_memory(weight_ranges=ner_provider.weight_ranges())
+    except OSError as e:
+        raise HTTPException(status_code=501, detail=f"Memory report unavailable: {e}")
 
 @app.get("/health")
 async def health_check():